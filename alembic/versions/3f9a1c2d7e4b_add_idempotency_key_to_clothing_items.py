@@ -0,0 +1,35 @@
+"""Add idempotency_key to clothing_items
+
+Revision ID: 3f9a1c2d7e4b
+Revises: firebase_auth_001
+Create Date: 2025-09-02 11:20:41.218334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7e4b'
+down_revision: Union[str, None] = 'firebase_auth_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('clothing_items', sa.Column('idempotency_key', sa.String(), nullable=True))
+    # NULLs are distinct, so manually created items are not affected
+    op.create_unique_constraint(
+        'uq_clothing_items_owner_idempotency_key',
+        'clothing_items',
+        ['owner_id', 'idempotency_key']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_clothing_items_owner_idempotency_key', 'clothing_items', type_='unique')
+    op.drop_column('clothing_items', 'idempotency_key')
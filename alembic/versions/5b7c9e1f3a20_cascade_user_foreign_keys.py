@@ -0,0 +1,47 @@
+"""Cascade deletes from users to clothing_items and body_analyses
+
+Revision ID: 5b7c9e1f3a20
+Revises: 8d2e4b6a1c07
+Create Date: 2025-09-05 11:24:37.316402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7c9e1f3a20'
+down_revision: Union[str, None] = '8d2e4b6a1c07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column) pairs referencing users.id
+USER_FOREIGN_KEYS = [
+    ('clothing_items', 'owner_id'),
+    ('body_analyses', 'user_id'),
+]
+
+
+def _recreate_user_fk(table: str, column: str, ondelete: Union[str, None]) -> None:
+    inspector = sa.inspect(op.get_bind())
+    # body_analyses may only exist where it was created by create_tables.py
+    if table not in inspector.get_table_names():
+        return
+    for fk in inspector.get_foreign_keys(table):
+        if fk['referred_table'] == 'users' and fk['constrained_columns'] == [column]:
+            op.drop_constraint(fk['name'], table, type_='foreignkey')
+    op.create_foreign_key(f'{table}_{column}_fkey', table, 'users', [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in USER_FOREIGN_KEYS:
+        _recreate_user_fk(table, column, 'CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in USER_FOREIGN_KEYS:
+        _recreate_user_fk(table, column, None)
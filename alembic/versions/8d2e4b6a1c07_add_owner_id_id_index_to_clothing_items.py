@@ -0,0 +1,28 @@
+"""Add (owner_id, id) index to clothing_items
+
+Revision ID: 8d2e4b6a1c07
+Revises: 3f9a1c2d7e4b
+Create Date: 2025-09-04 16:02:13.874519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e4b6a1c07'
+down_revision: Union[str, None] = '3f9a1c2d7e4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_clothing_items_owner_id_id', 'clothing_items', ['owner_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_clothing_items_owner_id_id', table_name='clothing_items')
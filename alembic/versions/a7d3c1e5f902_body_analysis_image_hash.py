@@ -0,0 +1,60 @@
+"""Store body analyses keyed by image hash
+
+Revision ID: a7d3c1e5f902
+Revises: e1f5a7b9c3d2
+Create Date: 2025-09-10 09:41:18.204517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3c1e5f902'
+down_revision: Union[str, None] = 'e1f5a7b9c3d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # body_analyses was so far only created by create_tables.py
+    if 'body_analyses' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('body_analyses',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('photo_url', sa.String(), nullable=False),
+        sa.Column('compressed_photo_url', sa.String(), nullable=True),
+        sa.Column('body_type', sa.String(), nullable=True),
+        sa.Column('recommended_colors', sa.JSON(), nullable=True),
+        sa.Column('style_recommendations', sa.JSON(), nullable=True),
+        sa.Column('leg_to_body_ratio', sa.Float(), nullable=True),
+        sa.Column('shoulder_to_hip_ratio', sa.Float(), nullable=True),
+        sa.Column('waist_to_hip_ratio', sa.Float(), nullable=True),
+        sa.Column('confidence', sa.Float(), nullable=True),
+        sa.Column('fashion_tips', sa.JSON(), nullable=True),
+        sa.Column('best_silhouettes', sa.JSON(), nullable=True),
+        sa.Column('avoid_patterns', sa.JSON(), nullable=True),
+        sa.Column('accessory_tips', sa.JSON(), nullable=True),
+        sa.Column('analysis_version', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_body_analyses_id'), 'body_analyses', ['id'], unique=False)
+
+    op.add_column('body_analyses', sa.Column('image_hash', sa.String(length=64), nullable=True))
+    op.add_column('body_analyses', sa.Column('analysis_data', sa.JSON(), nullable=True))
+    op.create_index('ix_body_analyses_user_id_image_hash', 'body_analyses', ['user_id', 'image_hash'], unique=False)
+    op.create_index('ix_body_analyses_user_id_created_at', 'body_analyses', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_body_analyses_user_id_created_at', table_name='body_analyses')
+    op.drop_index('ix_body_analyses_user_id_image_hash', table_name='body_analyses')
+    op.drop_column('body_analyses', 'analysis_data')
+    op.drop_column('body_analyses', 'image_hash')
@@ -0,0 +1,49 @@
+"""Convert clothing_items tag columns to JSONB with GIN indexes
+
+Revision ID: c4a8f2d6e913
+Revises: 5b7c9e1f3a20
+Create Date: 2025-09-05 15:48:02.640173
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8f2d6e913'
+down_revision: Union[str, None] = '5b7c9e1f3a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TAG_COLUMNS = ['tags', 'occasions', 'weather_suitability']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for column in TAG_COLUMNS:
+        op.alter_column(
+            'clothing_items', column,
+            type_=postgresql.JSONB(),
+            existing_type=sa.JSON(),
+            postgresql_using=f'{column}::jsonb'
+        )
+        op.create_index(f'ix_clothing_items_{column}_gin', 'clothing_items', [column], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for column in TAG_COLUMNS:
+        op.drop_index(f'ix_clothing_items_{column}_gin', table_name='clothing_items')
+        op.alter_column(
+            'clothing_items', column,
+            type_=sa.JSON(),
+            existing_type=postgresql.JSONB(),
+            postgresql_using=f'{column}::json'
+        )
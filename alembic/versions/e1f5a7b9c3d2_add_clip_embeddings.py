@@ -0,0 +1,76 @@
+"""Add CLIP embedding vectors for clothing items and the catalog
+
+Revision ID: e1f5a7b9c3d2
+Revises: c4a8f2d6e913
+Create Date: 2025-09-08 10:12:45.918230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+try:
+    from pgvector.sqlalchemy import Vector
+except ImportError:
+    Vector = None
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f5a7b9c3d2'
+down_revision: Union[str, None] = 'c4a8f2d6e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_DIM = 512
+
+
+def _vector_available() -> bool:
+    # Without the extension embeddings use the numpy index (VECTOR_BACKEND=numpy, the default);
+    # once the columns exist the app uses them with VECTOR_BACKEND=pgvector
+    bind = op.get_bind()
+    if Vector is None or bind.dialect.name != 'postgresql':
+        return False
+    return bool(bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")).scalar())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _vector_available():
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+    op.add_column('clothing_items', sa.Column('embedding', Vector(EMBEDDING_DIM), nullable=True))
+    op.create_table('catalog_embeddings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_url', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=True),
+    sa.Column('image_url', sa.String(), nullable=True),
+    sa.Column('gender', sa.String(), nullable=True),
+    sa.Column('piece_type', sa.String(), nullable=True),
+    sa.Column('main_color', sa.String(), nullable=True),
+    sa.Column('embedding', Vector(EMBEDDING_DIM), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('product_url')
+    )
+    op.create_index(op.f('ix_catalog_embeddings_id'), 'catalog_embeddings', ['id'], unique=False)
+    # HNSW with cosine distance (embeddings are L2-normalised CLIP vectors)
+    op.execute(
+        'CREATE INDEX ix_clothing_items_embedding_hnsw ON clothing_items '
+        'USING hnsw (embedding vector_cosine_ops)'
+    )
+    op.execute(
+        'CREATE INDEX ix_catalog_embeddings_embedding_hnsw ON catalog_embeddings '
+        'USING hnsw (embedding vector_cosine_ops)'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if 'catalog_embeddings' not in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.drop_index('ix_catalog_embeddings_embedding_hnsw', table_name='catalog_embeddings')
+    op.drop_index('ix_clothing_items_embedding_hnsw', table_name='clothing_items')
+    op.drop_index(op.f('ix_catalog_embeddings_id'), table_name='catalog_embeddings')
+    op.drop_table('catalog_embeddings')
+    op.drop_column('clothing_items', 'embedding')
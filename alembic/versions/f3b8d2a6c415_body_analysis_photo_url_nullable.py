@@ -0,0 +1,30 @@
+"""Allow body analyses without a stored photo
+
+Revision ID: f3b8d2a6c415
+Revises: a7d3c1e5f902
+Create Date: 2025-09-12 14:05:37.611842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d2a6c415'
+down_revision: Union[str, None] = 'a7d3c1e5f902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # An analysis is kept even when its photo upload failed
+    op.alter_column('body_analyses', 'photo_url', existing_type=sa.String(), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("UPDATE body_analyses SET photo_url = '' WHERE photo_url IS NULL")
+    op.alter_column('body_analyses', 'photo_url', existing_type=sa.String(), nullable=False)
@@ -1,6 +1,8 @@
+from sqlalchemy import delete, update
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from . import models, auth, schemas
+from .services import user_cache, vector_index, wardrobe_cache
 from typing import Optional
 
 def get_user_by_username(db: Session, username: str):
@@ -61,24 +63,39 @@ def update_firebase_user(
     
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.firebase_uid)
     return user
 
 def create_clothing_item(
     db: Session,
     item_in: schemas.ClothingItemCreate,
-    owner_id: int
+    owner_id: int,
+    idempotency_key: Optional[str] = None
 ) -> models.ClothingItem:
     data = item_in.dict()
     data["image_url"]   = str(data["image_url"]) if data.get("image_url") else None
     data["store_url"]   = str(data["store_url"]) if data.get("store_url") else None
     data["product_url"] = str(data["product_url"]) if data.get("product_url") else None
     
-    db_item = models.ClothingItem(**data, owner_id=owner_id)
+    db_item = models.ClothingItem(**data, owner_id=owner_id, idempotency_key=idempotency_key)
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
+    wardrobe_cache.bump_version_sync(owner_id)
     return db_item
 
+def set_clothing_item_embedding(db: Session, item_id: int, embedding: list) -> bool:
+    """Store the CLIP embedding of an item; returns False if the item is gone"""
+    updated = db.execute(
+        update(models.ClothingItem)
+          .where(models.ClothingItem.id == item_id)
+          # Derived data, not a user edit: keep updated_at as is
+          .values(embedding=embedding, updated_at=models.ClothingItem.updated_at)
+          .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(updated)
+
 def get_clothing_items_by_owner(
     db: Session,
     owner_id: int,
@@ -93,6 +110,17 @@ def get_clothing_items_by_owner(
           .all()
     )
 
+def get_clothing_item_by_idempotency_key(
+    db: Session,
+    owner_id: int,
+    idempotency_key: str
+) -> Optional[models.ClothingItem]:
+    """Get the item created by a previous run of the same upload task"""
+    return db.query(models.ClothingItem).filter(
+        models.ClothingItem.owner_id == owner_id,
+        models.ClothingItem.idempotency_key == idempotency_key
+    ).first()
+
 def get_clothing_item_by_id(
     db: Session,
     item_id: int,
@@ -106,34 +134,54 @@ def get_clothing_item_by_id(
 def update_clothing_item(
     db: Session,
     item_id: int,
-    item_in: schemas.ClothingItemCreate
-) -> models.ClothingItem:
-    data = item_in.dict()
+    owner_id: int,
+    item_in,
+    partial: bool = False
+) -> Optional[models.ClothingItem]:
+    """Single UPDATE ... RETURNING with the ownership check; `partial` writes only the fields that were set"""
+    data = item_in.dict(exclude_unset=partial)
     # Convert HttpUrl to str if needed
-    if data.get("image_url"):
-        data["image_url"] = str(data["image_url"])
-    if data.get("store_url"):
-        data["store_url"] = str(data["store_url"])
-    if data.get("product_url"):
-        data["product_url"] = str(data["product_url"])
+    for field in ("image_url", "store_url", "product_url"):
+        if field in data:
+            data[field] = str(data[field]) if data[field] else None
+    if not data:
+        return get_clothing_item_by_id(db, item_id, owner_id)
     
-    db.query(models.ClothingItem).filter(models.ClothingItem.id == item_id).update(data)
+    db_item = db.execute(
+        update(models.ClothingItem)
+          .where(models.ClothingItem.id == item_id, models.ClothingItem.owner_id == owner_id)
+          .values(**data)
+          .returning(models.ClothingItem)
+          .execution_options(populate_existing=True)
+    ).scalars().first()
     db.commit()
-    return db.query(models.ClothingItem).filter(models.ClothingItem.id == item_id).first()
+    if db_item is not None:
+        wardrobe_cache.bump_version_sync(owner_id)
+    return db_item
 
 def delete_clothing_item(
     db: Session,
-    item_id: int
+    item_id: int,
+    owner_id: int
 ):
-    db.query(models.ClothingItem).filter(models.ClothingItem.id == item_id).delete()
+    """Delete one of the user's items; returns the deleted (id, image_url) row or None"""
+    deleted = db.execute(
+        delete(models.ClothingItem)
+          .where(models.ClothingItem.id == item_id, models.ClothingItem.owner_id == owner_id)
+          .returning(models.ClothingItem.id, models.ClothingItem.image_url)
+    ).first()
     db.commit()
+    if deleted is not None:
+        wardrobe_cache.bump_version_sync(owner_id)
+    return deleted
 
 def delete_user(db: Session, user_id: int):
-    """Delete user and all associated data"""
-    # First delete all clothing items owned by the user
-    db.query(models.ClothingItem).filter(models.ClothingItem.owner_id == user_id).delete()
-    
-    # Then delete the user
-    db.query(models.User).filter(models.User.id == user_id).delete()
+    """Delete user and all associated data (items and analyses go via ON DELETE CASCADE)"""
+    firebase_uid = db.execute(
+        delete(models.User).where(models.User.id == user_id).returning(models.User.firebase_uid)
+    ).scalar_one_or_none()
     
     db.commit()
+    user_cache.invalidate(firebase_uid)
+    vector_index.drop_owner(user_id)
+    wardrobe_cache.bump_version_sync(user_id)
@@ -0,0 +1,382 @@
+"""
+Async counterparts of the crud functions used on the hot request paths.
+Celery tasks and the remaining sync routes keep using app/crud.py.
+"""
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, delete, update, func, literal, type_coerce, Text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+from .services import user_cache, vector_index, wardrobe_cache
+from .services.embeddings import PGVECTOR_ENABLED
+
+
+async def get_user_by_firebase_uid(db: AsyncSession, firebase_uid: str) -> Optional[models.User]:
+    """Get user by Firebase UID"""
+    result = await db.execute(select(models.User).where(models.User.firebase_uid == firebase_uid))
+    return result.scalars().first()
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    """Get user by email"""
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+async def create_firebase_user(
+    db: AsyncSession,
+    firebase_uid: str,
+    email: str,
+    display_name: Optional[str] = None,
+    photo_url: Optional[str] = None,
+    email_verified: bool = False
+) -> models.User:
+    """Create a new Firebase user"""
+    user = models.User(
+        firebase_uid=firebase_uid,
+        email=email,
+        display_name=display_name,
+        photo_url=photo_url,
+        email_verified=email_verified,
+        is_premium=False
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+async def delete_user(db: AsyncSession, user_id: int):
+    """Delete user and all associated data (items and analyses go via ON DELETE CASCADE)"""
+    result = await db.execute(
+        delete(models.User).where(models.User.id == user_id).returning(models.User.firebase_uid)
+    )
+    firebase_uid = result.scalar_one_or_none()
+    await db.commit()
+    user_cache.invalidate(firebase_uid)
+    vector_index.drop_owner(user_id)
+    await wardrobe_cache.bump_version(user_id)
+
+def _clothing_item_data(item_in, exclude_unset: bool = False) -> dict:
+    data = item_in.dict(exclude_unset=exclude_unset)
+    # Convert HttpUrl to str if needed
+    for field in ("image_url", "store_url", "product_url"):
+        if field in data:
+            data[field] = str(data[field]) if data[field] else None
+    return data
+
+async def create_clothing_item(
+    db: AsyncSession,
+    item_in: schemas.ClothingItemCreate,
+    owner_id: int
+) -> models.ClothingItem:
+    db_item = models.ClothingItem(**_clothing_item_data(item_in), owner_id=owner_id)
+    db.add(db_item)
+    await db.commit()
+    await db.refresh(db_item)
+    await wardrobe_cache.bump_version(owner_id)
+    return db_item
+
+async def get_clothing_items_by_owner(
+    db: AsyncSession,
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100
+) -> list[models.ClothingItem]:
+    result = await db.execute(
+        select(models.ClothingItem)
+          .where(models.ClothingItem.owner_id == owner_id)
+          .offset(skip)
+          .limit(limit)
+    )
+    return list(result.scalars().all())
+
+def json_contains(column, values: List[str]):
+    """`column @> '["a", "b"]'` - the array holds all of `values` (GIN-indexed)"""
+    return type_coerce(column, JSONB).contains(list(values))
+
+def json_has_any(column, values: List[str]):
+    """`column ?| array['a', 'b']` - the array holds at least one of `values` (GIN-indexed)"""
+    return type_coerce(column, JSONB).has_any(literal(list(values), ARRAY(Text)))
+
+# Columns a client may request through `fields=`
+CLOTHING_ITEM_FIELDS = [
+    column.name for column in models.ClothingItem.__table__.columns
+    if column.name not in ("idempotency_key", "embedding")
+]
+
+async def get_clothing_items_page(
+    db: AsyncSession,
+    owner_id: int,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    skip: int = 0,
+    category: Optional[str] = None,
+    color: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    occasion: Optional[str] = None,
+    weather: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> list:
+    """
+    One page of a user's wardrobe ordered by id (keyset pagination on (owner_id, id)).
+    Returns ORM objects, or plain dicts with only `fields` when a field list is given.
+    """
+    item = models.ClothingItem
+    if fields:
+        query = select(*[getattr(item, field) for field in fields])
+    else:
+        query = select(item)
+    
+    query = query.where(item.owner_id == owner_id)
+    if after_id is not None:
+        query = query.where(item.id > after_id)
+    if category:
+        query = query.where(func.lower(item.category) == category.lower())
+    if color:
+        query = query.where(func.lower(item.color) == color.lower())
+    if tags:
+        query = query.where(json_contains(item.tags, tags))
+    if occasion:
+        query = query.where(json_contains(item.occasions, [occasion]))
+    if weather:
+        query = query.where(json_contains(item.weather_suitability, [weather]))
+    
+    query = query.order_by(item.id).limit(limit)
+    if after_id is None and skip:
+        # Legacy offset paging, kept for older clients
+        query = query.offset(skip)
+    
+    result = await db.execute(query)
+    if fields:
+        return [dict(row) for row in result.mappings().all()]
+    return list(result.scalars().all())
+
+async def get_all_clothing_items_by_owner(db: AsyncSession, owner_id: int) -> list[models.ClothingItem]:
+    """Whole wardrobe of a user (stylist and wardrobe views)"""
+    result = await db.execute(select(models.ClothingItem).where(models.ClothingItem.owner_id == owner_id))
+    return list(result.scalars().all())
+
+async def get_clothing_items_matching(
+    db: AsyncSession,
+    owner_id: int,
+    occasions: Optional[List[str]] = None,
+    weather_tags: Optional[List[str]] = None
+) -> list[models.ClothingItem]:
+    """Items tagged with any of `occasions` and any of `weather_tags` (empty filters are skipped)"""
+    query = select(models.ClothingItem).where(models.ClothingItem.owner_id == owner_id)
+    if occasions:
+        query = query.where(json_has_any(models.ClothingItem.occasions, occasions))
+    if weather_tags:
+        query = query.where(json_has_any(models.ClothingItem.weather_suitability, weather_tags))
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+async def get_clothing_items_by_ids(db: AsyncSession, owner_id: int, item_ids: List[int]) -> list[models.ClothingItem]:
+    result = await db.execute(
+        select(models.ClothingItem).where(
+            models.ClothingItem.owner_id == owner_id,
+            models.ClothingItem.id.in_(item_ids)
+        )
+    )
+    return list(result.scalars().all())
+
+async def get_clothing_item_embedding(db: AsyncSession, item_id: int, owner_id: int) -> Optional[List[float]]:
+    result = await db.execute(
+        select(models.ClothingItem.embedding).where(
+            models.ClothingItem.id == item_id,
+            models.ClothingItem.owner_id == owner_id
+        )
+    )
+    embedding = result.scalar_one_or_none()
+    return list(embedding) if embedding is not None else None
+
+async def get_similar_clothing_items(
+    db: AsyncSession,
+    owner_id: int,
+    embedding: List[float],
+    k: int = 10,
+    exclude_id: Optional[int] = None
+) -> list[tuple[models.ClothingItem, float]]:
+    """The user's k nearest items by cosine distance (HNSW), with their distances"""
+    distance = models.ClothingItem.embedding.cosine_distance(embedding).label("distance")
+    query = select(models.ClothingItem, distance).where(
+        models.ClothingItem.owner_id == owner_id,
+        models.ClothingItem.embedding.isnot(None)
+    )
+    if exclude_id is not None:
+        query = query.where(models.ClothingItem.id != exclude_id)
+    result = await db.execute(query.order_by(distance).limit(k))
+    return [(item, float(dist)) for item, dist in result.all()]
+
+async def search_catalog(
+    db: AsyncSession,
+    embedding: List[float],
+    k: int = 10,
+    gender: Optional[str] = None,
+    piece_type: Optional[str] = None
+) -> "list[tuple[models.CatalogEmbedding, float]]":
+    """
+    k nearest catalog products by cosine distance, optionally within a gender/piece type.
+    pgvector only (models.CatalogEmbedding doesn't exist otherwise); use vector_index.search_catalog.
+    """
+    if not PGVECTOR_ENABLED:
+        raise RuntimeError("search_catalog needs the pgvector backend")
+    distance = models.CatalogEmbedding.embedding.cosine_distance(embedding).label("distance")
+    query = select(models.CatalogEmbedding, distance)
+    if gender:
+        query = query.where(models.CatalogEmbedding.gender == gender.lower())
+    if piece_type:
+        query = query.where(models.CatalogEmbedding.piece_type == piece_type.lower())
+    result = await db.execute(query.order_by(distance).limit(k))
+    return [(product, float(dist)) for product, dist in result.all()]
+
+async def get_clothing_item_by_id(
+    db: AsyncSession,
+    item_id: int,
+    owner_id: int
+) -> Optional[models.ClothingItem]:
+    result = await db.execute(
+        select(models.ClothingItem).where(
+            models.ClothingItem.id == item_id,
+            models.ClothingItem.owner_id == owner_id
+        )
+    )
+    return result.scalars().first()
+
+async def update_clothing_item(
+    db: AsyncSession,
+    item_id: int,
+    owner_id: int,
+    item_in,
+    partial: bool = False
+) -> Tuple[Optional[models.ClothingItem], Optional[str]]:
+    """
+    UPDATE ... WHERE id AND owner_id RETURNING * in one round-trip, together with the
+    image_url the row had before (read under FOR UPDATE in the same statement, so a
+    concurrent update can't slip in between).
+    With `partial` only the fields set on `item_in` are written (PATCH).
+    Returns (None, None) if the item doesn't exist or belongs to someone else.
+    """
+    values = _clothing_item_data(item_in, exclude_unset=partial)
+    if not values:
+        db_item = await get_clothing_item_by_id(db, item_id, owner_id)
+        return db_item, db_item.image_url if db_item else None
+    
+    item = models.ClothingItem
+    old = (
+        select(item.id, item.image_url)
+          .where(item.id == item_id, item.owner_id == owner_id)
+          .with_for_update()
+          .cte("old")
+    )
+    result = await db.execute(
+        update(item)
+          .where(item.id == old.c.id)
+          .values(**values)
+          .returning(item, old.c.image_url)
+          .execution_options(populate_existing=True)
+    )
+    row = result.first()
+    await db.commit()
+    if row is None:
+        return None, None
+    await wardrobe_cache.bump_version(owner_id)
+    return row[0], row[1]
+
+async def delete_clothing_item(db: AsyncSession, item_id: int, owner_id: int):
+    """Delete one of the user's items; returns the deleted (id, image_url) row or None"""
+    result = await db.execute(
+        delete(models.ClothingItem)
+          .where(models.ClothingItem.id == item_id, models.ClothingItem.owner_id == owner_id)
+          .returning(models.ClothingItem.id, models.ClothingItem.image_url)
+    )
+    deleted = result.first()
+    await db.commit()
+    if deleted is not None:
+        await wardrobe_cache.bump_version(owner_id)
+    return deleted
+
+async def bulk_delete_clothing_items(db: AsyncSession, owner_id: int, item_ids: List[int]) -> list:
+    """Delete the user's items among `item_ids` in one statement; returns (id, image_url) of deleted rows"""
+    result = await db.execute(
+        delete(models.ClothingItem)
+          .where(models.ClothingItem.owner_id == owner_id, models.ClothingItem.id.in_(item_ids))
+          .returning(models.ClothingItem.id, models.ClothingItem.image_url)
+    )
+    deleted = list(result.all())
+    await db.commit()
+    if deleted:
+        await wardrobe_cache.bump_version(owner_id)
+    return deleted
+
+async def bulk_update_clothing_items(db: AsyncSession, owner_id: int, item_ids: List[int], values: dict) -> List[int]:
+    """Set `values` on the user's items among `item_ids` in one statement; returns ids of updated rows"""
+    result = await db.execute(
+        update(models.ClothingItem)
+          .where(models.ClothingItem.owner_id == owner_id, models.ClothingItem.id.in_(item_ids))
+          .values(**values)
+          .returning(models.ClothingItem.id)
+          .execution_options(synchronize_session=False)
+    )
+    updated_ids = list(result.scalars().all())
+    await db.commit()
+    if updated_ids:
+        await wardrobe_cache.bump_version(owner_id)
+    return updated_ids
+
+async def get_body_analysis_by_hash(
+    db: AsyncSession,
+    user_id: int,
+    image_hash: str,
+    analysis_version: str
+) -> Optional[models.BodyAnalysis]:
+    """The user's latest analysis of the same (AI-sized) image, if any"""
+    result = await db.execute(
+        select(models.BodyAnalysis)
+          .where(
+              models.BodyAnalysis.user_id == user_id,
+              models.BodyAnalysis.image_hash == image_hash,
+              models.BodyAnalysis.analysis_version == analysis_version,
+          )
+          .order_by(models.BodyAnalysis.created_at.desc())
+          .limit(1)
+    )
+    return result.scalars().first()
+
+async def get_latest_body_analysis(db: AsyncSession, user_id: int) -> Optional[models.BodyAnalysis]:
+    result = await db.execute(
+        select(models.BodyAnalysis)
+          .where(models.BodyAnalysis.user_id == user_id)
+          .order_by(models.BodyAnalysis.created_at.desc())
+          .limit(1)
+    )
+    return result.scalars().first()
+
+async def get_body_analyses(db: AsyncSession, user_id: int, limit: int = 20) -> list[models.BodyAnalysis]:
+    result = await db.execute(
+        select(models.BodyAnalysis)
+          .where(models.BodyAnalysis.user_id == user_id)
+          .order_by(models.BodyAnalysis.created_at.desc())
+          .limit(limit)
+    )
+    return list(result.scalars().all())
+
+async def create_body_analysis(db: AsyncSession, user_id: int, **values) -> models.BodyAnalysis:
+    analysis = models.BodyAnalysis(user_id=user_id, **values)
+    db.add(analysis)
+    await db.commit()
+    await db.refresh(analysis)
+    return analysis
+
+async def delete_body_analysis(db: AsyncSession, analysis_id: int, user_id: int):
+    """Delete one of the user's analyses; returns the deleted (id, photo_url) row or None"""
+    result = await db.execute(
+        delete(models.BodyAnalysis)
+          .where(models.BodyAnalysis.id == analysis_id, models.BodyAnalysis.user_id == user_id)
+          .returning(models.BodyAnalysis.id, models.BodyAnalysis.photo_url)
+    )
+    deleted = result.first()
+    await db.commit()
+    if deleted is not None:
+        await wardrobe_cache.bump_version(owner_id)
+    return deleted
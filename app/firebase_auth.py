@@ -1,17 +1,23 @@
 import os
 import json
+import time
+import hashlib
 from typing import Optional
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
 from firebase_admin import credentials, auth
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from dotenv import load_dotenv
 import logging
 
-from . import models, crud
-from .database import get_db
+from . import models, crud, crud_async
+from .database import get_async_db
+from .services.ttl_cache import TTLCache
+from .services import user_cache
+from .services.user_cache import UserSnapshot
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -56,6 +62,28 @@ def initialize_firebase():
 # Initialize Firebase on module import
 initialize_firebase()
 
+# Verified-claims cache: repeat requests with the same ID token skip RS256 verification.
+# Entries never outlive the token's own `exp`.
+TOKEN_CACHE_TTL = int(os.getenv("FIREBASE_TOKEN_CACHE_TTL", 300))
+TOKEN_CACHE_SIZE = int(os.getenv("FIREBASE_TOKEN_CACHE_SIZE", 10000))
+
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
+def verify_id_token_cached(id_token: str) -> dict:
+    """
+    Verify a Firebase ID token, serving repeat calls from the in-process cache.
+    Raises the same firebase_admin exceptions as auth.verify_id_token.
+    """
+    cache_key = hashlib.sha256(id_token.encode()).hexdigest()
+    decoded_token = _token_cache.get(cache_key)
+    if decoded_token is not None:
+        return decoded_token
+    
+    decoded_token = auth.verify_id_token(id_token)
+    expires_in = decoded_token.get("exp", 0) - time.time()
+    _token_cache.set(cache_key, decoded_token, ttl=expires_in)
+    return decoded_token
+
 # HTTP Bearer token security
 security = HTTPBearer(auto_error=False)  # Don't auto-error, we'll handle it manually
 
@@ -71,14 +99,10 @@ async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depe
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    logger.info(f"Attempting to verify Firebase token: {credentials.credentials[:20]}...")
-    
     try:
-        # Verify the Firebase ID token
-        decoded_token = auth.verify_id_token(credentials.credentials)
-        user_uid = decoded_token.get('uid')
-        user_email = decoded_token.get('email', 'no-email')
-        logger.info(f"Firebase token verified successfully for user: {user_uid} ({user_email})")
+        # Verify the Firebase ID token (cached per token)
+        decoded_token = verify_id_token_cached(credentials.credentials)
+        logger.debug(f"Firebase token verified for user: {decoded_token.get('uid')}")
         return decoded_token
     except auth.InvalidIdTokenError as e:
         logger.error(f"Invalid Firebase ID token: {str(e)}")
@@ -104,13 +128,13 @@ async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depe
 
 async def get_current_user_firebase(
     token_data: dict = Depends(verify_firebase_token),
-    db: Session = Depends(get_db)
-) -> models.User:
+    db: AsyncSession = Depends(get_async_db)
+) -> UserSnapshot:
     """
-    Get current user from Firebase token
+    Get current user from Firebase token.
+    Returns a cached UserSnapshot; the users table is only queried on a cache miss.
     """
     firebase_uid = token_data.get("uid")
-    logger.info(f"Getting user for Firebase UID: {firebase_uid}")
     
     if not firebase_uid:
         logger.error("Firebase token missing UID")
@@ -119,8 +143,12 @@ async def get_current_user_firebase(
             detail="Invalid token: missing uid"
         )
     
+    snapshot = user_cache.get(firebase_uid)
+    if snapshot is not None:
+        return snapshot
+    
     # Try to find user by Firebase UID
-    user = crud.get_user_by_firebase_uid(db, firebase_uid)
+    user = await crud_async.get_user_by_firebase_uid(db, firebase_uid)
     
     if not user:
         logger.info(f"User not found, creating new user for UID: {firebase_uid}")
@@ -138,7 +166,7 @@ async def get_current_user_firebase(
             logger.info(f"Generated email for Apple Sign In user: {email}")
         
         try:
-            user = crud.create_firebase_user(
+            user = await crud_async.create_firebase_user(
                 db=db,
                 firebase_uid=firebase_uid,
                 email=email,
@@ -149,15 +177,15 @@ async def get_current_user_firebase(
             logger.info(f"Created new user: {user.email}")
         except IntegrityError:
             # If there's an email conflict, find and delete the conflicting user
-            db.rollback()
+            await db.rollback()
             logger.info(f"IntegrityError occurred, checking for existing user with email: {email}")
-            existing_user_by_email = crud.get_user_by_email(db, email)
+            existing_user_by_email = await crud_async.get_user_by_email(db, email)
             if existing_user_by_email:
                 logger.info(f"Deleting existing user with email: {email}")
-                crud.delete_user(db, existing_user_by_email.id)
+                await crud_async.delete_user(db, existing_user_by_email.id)
             
             # Try creating the user again
-            user = crud.create_firebase_user(
+            user = await crud_async.create_firebase_user(
                 db=db,
                 firebase_uid=firebase_uid,
                 email=email,
@@ -166,21 +194,33 @@ async def get_current_user_firebase(
                 email_verified=email_verified
             )
             logger.info(f"Created new user after cleanup: {user.email}")
-    else:
-        logger.info(f"Found existing user: {user.email}")
-    
-    if user:
-        db.refresh(user)
     
+    return user_cache.put(user)
+
+async def get_current_user_orm(
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
+    db: AsyncSession = Depends(get_async_db)
+) -> models.User:
+    """
+    Load the full users row for handlers that need more than the cached snapshot
+    """
+    user = await db.get(models.User, current_user.id)
+    if not user:
+        user_cache.invalidate(current_user.firebase_uid)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
     return user
 
+
 # WebSocket version for Firebase authentication
 async def get_current_user_websocket_firebase(token: str, db: Session) -> Optional[models.User]:
     """
     WebSocket version of Firebase authentication
     """
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = verify_id_token_cached(token)
         firebase_uid = decoded_token.get("uid")
         
         if not firebase_uid:
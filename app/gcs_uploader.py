@@ -1,6 +1,6 @@
 import os
 import uuid
-from typing import Optional
+from typing import List, Optional
 from io import BytesIO
 from datetime import datetime, timedelta
 from google.cloud import storage
@@ -216,6 +216,22 @@ class GCSUploader:
         
         return signed_url
     
+    def _blob_name_from_url(self, file_url: str) -> str:
+        """Extract the blob path from a public or signed URL of this bucket"""
+        # Example URL: https://storage.googleapis.com/bucket-name/photos/filename.jpg
+        url_parts = file_url.split('?')[0].split('/')
+        if len(url_parts) < 2:
+            raise ValueError("Invalid file URL format")
+        
+        try:
+            bucket_index = url_parts.index(self.bucket_name)
+        except ValueError:
+            raise ValueError("Cannot extract blob name from URL")
+        blob_name = '/'.join(url_parts[bucket_index + 1:])
+        if not blob_name:
+            raise ValueError("Cannot extract blob name from URL")
+        return blob_name
+    
     def delete_file(self, file_url: str) -> bool:
         """
         Delete a file from Google Cloud Storage using its public URL.
@@ -230,28 +246,8 @@ class GCSUploader:
             if not self.client:
                 self._initialize_client()
             
-            # Extract blob name from URL
-            # Example URL: https://storage.googleapis.com/bucket-name/photos/filename.jpg
-            url_parts = file_url.split('/')
-            if len(url_parts) < 2:
-                raise ValueError("Invalid file URL format")
-            
-            # Find bucket name in URL and extract blob path
-            try:
-                bucket_index = url_parts.index(self.bucket_name)
-                blob_name = '/'.join(url_parts[bucket_index + 1:])
-            except ValueError:
-                # If bucket name not found in URL, try to extract from signed URL
-                # For signed URLs, extract the object path from the URL parameters
-                if '?' in file_url:
-                    base_url = file_url.split('?')[0]
-                    url_parts = base_url.split('/')
-                    blob_name = '/'.join(url_parts[url_parts.index(self.bucket_name) + 1:])
-                else:
-                    raise ValueError("Cannot extract blob name from URL")
-            
             # Delete the blob
-            blob = self.bucket.blob(blob_name)
+            blob = self.bucket.blob(self._blob_name_from_url(file_url))
             blob.delete()
             
             logger.info(f"File deleted successfully: {file_url}")
@@ -263,6 +259,53 @@ class GCSUploader:
         except Exception as e:
             logger.error(f"Unexpected error during deletion: {str(e)}")
             return False
+    
+    def delete_files(self, file_urls: List[str], batch_size: int = 100) -> int:
+        """
+        Delete many files using batched GCS requests (one HTTP call per `batch_size` blobs).
+        URLs that don't point into this bucket (e.g. store images) are skipped.
+        
+        Args:
+            file_urls: Public URLs of the files to delete
+            batch_size: Blobs per batch request (GCS allows at most 100)
+            
+        Returns:
+            Number of blobs submitted for deletion
+        """
+        blob_names = []
+        for file_url in file_urls:
+            if not file_url:
+                continue
+            try:
+                blob_names.append(self._blob_name_from_url(file_url))
+            except ValueError:
+                logger.debug(f"Skipping non-bucket URL: {file_url}")
+        
+        if not blob_names:
+            return 0
+        
+        try:
+            if not self.client:
+                self._initialize_client()
+        except Exception as e:
+            logger.error(f"Cannot delete {len(blob_names)} files, GCS unavailable: {str(e)}")
+            return 0
+        
+        submitted = 0
+        for start in range(0, len(blob_names), batch_size):
+            chunk = blob_names[start:start + batch_size]
+            try:
+                with self.client.batch():
+                    for blob_name in chunk:
+                        self.bucket.blob(blob_name).delete()
+                submitted += len(chunk)
+            except Exception as e:
+                # A batch reports the first failed sub-request (e.g. already deleted blob); the rest went through
+                logger.warning(f"Batched deletion of {len(chunk)} files reported an error: {str(e)}")
+                submitted += len(chunk)
+        
+        logger.info(f"Deleted {submitted} files from GCS")
+        return submitted
 
 # Global instance for reuse
 gcs_uploader = GCSUploader() 
\ No newline at end of file
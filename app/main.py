@@ -1,22 +1,33 @@
 from typing import List
 import os
+import logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import models, schemas, crud, auth, firebase_auth
-from .database import get_db
+from . import models, schemas, crud, crud_async, auth, firebase_auth
+from .database import get_db, get_async_db
 from .routes import classifier, weather, photo_upload, items, stylist, v2v_assistant, firebase_auth as firebase_auth_routes, ip_location, body_analysis, visual_try_on
 from . import unfurl
+from .gcs_uploader import gcs_uploader
+from .tasks import embed_clothing_item_task
+from .services import vector_index, weather_async
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(root_path="/api")
 
+@app.on_event("shutdown")
+async def close_clients():
+    await weather_async.close()
+
 origins = [
     "http://localhost:5173",
     "http://localhost:5175", 
@@ -34,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],    
+    expose_headers=["X-Next-Cursor"],  # keyset pagination of /items
 )
 
 # Include all routers
@@ -55,68 +67,60 @@ clothing_router = APIRouter(
     tags=["clothing"]
 )
 
+def schedule_embedding(item_id: int):
+    """Queue CLIP embedding of the item photo; a broker outage must not fail the request"""
+    try:
+        embed_clothing_item_task.delay(item_id)
+    except Exception as e:
+        logger.warning(f"Could not queue embedding for item {item_id}: {str(e)}")
+
 @clothing_router.post(
     "/",
     response_model=schemas.ClothingItem,
     status_code=status.HTTP_201_CREATED
 )
-def create_item(
+async def create_item(
     item: schemas.ClothingItemCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(firebase_auth.get_current_user_firebase)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
 ):
-    return crud.create_clothing_item(db, item, current_user.id)
+    db_item = await crud_async.create_clothing_item(db, item, current_user.id)
+    if db_item.image_url:
+        schedule_embedding(db_item.id)
+    return db_item
 
-@clothing_router.put(
-    "/{item_id}",
-    response_model=schemas.ClothingItem
-)
-def update_item(
-    item_id: int,
-    item: schemas.ClothingItemCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(firebase_auth.get_current_user_firebase)
-):
-    db_item = crud.get_clothing_item_by_id(db, item_id, current_user.id)
-    if not db_item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    return crud.update_clothing_item(db, item_id, item)
+# Set-based statements make large batches cheap; this only bounds the request size
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 500))
 
-@clothing_router.delete("/{item_id}")
-def delete_item(
-    item_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(firebase_auth.get_current_user_firebase)
-):
-    db_item = crud.get_clothing_item_by_id(db, item_id, current_user.id)
-    if not db_item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    crud.delete_clothing_item(db, item_id)
-    return {"message": "Item deleted successfully"}
+def _check_bulk_ids(item_ids: List[int]):
+    if not item_ids:
+        raise HTTPException(status_code=400, detail="No item IDs provided")
+    
+    if len(item_ids) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Cannot process more than {BULK_MAX_ITEMS} items at once")
 
 @clothing_router.post("/bulk-delete")
-def bulk_delete_items(
+async def bulk_delete_items(
     item_ids: List[int],
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(firebase_auth.get_current_user_firebase)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
 ):
     """Delete multiple clothing items at once"""
-    if not item_ids:
-        raise HTTPException(status_code=400, detail="No item IDs provided")
-    
-    if len(item_ids) > 50:  # Reasonable limit
-        raise HTTPException(status_code=400, detail="Cannot delete more than 50 items at once")
+    _check_bulk_ids(item_ids)
+    item_ids = list(dict.fromkeys(item_ids))
     
-    deleted_count = 0
-    not_found_ids = []
+    deleted = await crud_async.bulk_delete_clothing_items(db, current_user.id, item_ids)
+    deleted_count = len(deleted)
+    deleted_ids = {row.id for row in deleted}
+    not_found_ids = [item_id for item_id in item_ids if item_id not in deleted_ids]
     
-    for item_id in item_ids:
-        db_item = crud.get_clothing_item_by_id(db, item_id, current_user.id)
-        if db_item:
-            crud.delete_clothing_item(db, item_id)
-            deleted_count += 1
-        else:
-            not_found_ids.append(item_id)
+    # Remove the photos after the response is sent
+    image_urls = [row.image_url for row in deleted if row.image_url]
+    if image_urls:
+        background_tasks.add_task(gcs_uploader.delete_files, image_urls)
+    if deleted_ids:
+        background_tasks.add_task(vector_index.remove_items, current_user.id, list(deleted_ids))
     
     result = {
         "message": f"Successfully deleted {deleted_count} items",
@@ -130,6 +134,88 @@ def bulk_delete_items(
     
     return result
 
+@clothing_router.patch("/bulk-update")
+async def bulk_update_items(
+    changes: schemas.ClothingItemBulkUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
+):
+    """Set the same fields (tags, occasions, availability...) on multiple clothing items at once"""
+    _check_bulk_ids(changes.item_ids)
+    item_ids = list(dict.fromkeys(changes.item_ids))
+    
+    values = changes.dict(exclude_unset=True, exclude={"item_ids"})
+    if not values:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    
+    updated_ids = await crud_async.bulk_update_clothing_items(db, current_user.id, item_ids, values)
+    updated = set(updated_ids)
+    not_found_ids = [item_id for item_id in item_ids if item_id not in updated]
+    
+    result = {
+        "message": f"Successfully updated {len(updated_ids)} items",
+        "updated_count": len(updated_ids),
+        "updated_ids": updated_ids,
+        "total_requested": len(item_ids)
+    }
+    
+    if not_found_ids:
+        result["not_found_ids"] = not_found_ids
+        result["message"] += f". {len(not_found_ids)} items were not found or don't belong to you."
+    
+    return result
+
+@clothing_router.put(
+    "/{item_id}",
+    response_model=schemas.ClothingItem
+)
+async def update_item(
+    item_id: int,
+    item: schemas.ClothingItemCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
+):
+    db_item, old_image_url = await crud_async.update_clothing_item(db, item_id, current_user.id, item)
+    if not db_item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    # Only a new photo needs a new embedding
+    if db_item.image_url and db_item.image_url != old_image_url:
+        schedule_embedding(db_item.id)
+    return db_item
+
+@clothing_router.patch(
+    "/{item_id}",
+    response_model=schemas.ClothingItem
+)
+async def patch_item(
+    item_id: int,
+    item: schemas.ClothingItemUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
+):
+    """Update only the fields present in the request body"""
+    db_item, old_image_url = await crud_async.update_clothing_item(db, item_id, current_user.id, item, partial=True)
+    if not db_item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if db_item.image_url and db_item.image_url != old_image_url:
+        schedule_embedding(db_item.id)
+    return db_item
+
+@clothing_router.delete("/{item_id}")
+async def delete_item(
+    item_id: int,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
+):
+    deleted = await crud_async.delete_clothing_item(db, item_id, current_user.id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if deleted.image_url:
+        background_tasks.add_task(gcs_uploader.delete_files, [deleted.image_url])
+    background_tasks.add_task(vector_index.remove_items, current_user.id, [item_id])
+    return {"message": "Item deleted successfully"}
+
 # === Legacy Authentication Routes (keep for backward compatibility) ===
 legacy_auth_router = APIRouter(tags=["legacy-auth"])
 
@@ -174,7 +260,7 @@ app.include_router(clothing_router, prefix="")          # /clothing
 
 # Updated /me endpoint to use Firebase auth
 @app.get("/me")
-def get_me(current_user: models.User = Depends(firebase_auth.get_current_user_firebase)):
+def get_me(current_user: models.User = Depends(firebase_auth.get_current_user_orm)):
     return {
         "id": current_user.id,
         "firebase_uid": current_user.firebase_uid,
@@ -190,7 +276,7 @@ def get_me(current_user: models.User = Depends(firebase_auth.get_current_user_fi
     }
 
 @app.get("/debug/me")
-def debug_me(current_user: models.User = Depends(firebase_auth.get_current_user_firebase)):
+def debug_me(current_user: models.User = Depends(firebase_auth.get_current_user_orm)):
     return {
         "firebase_uid": current_user.firebase_uid,
         "email": current_user.email,
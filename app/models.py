@@ -8,8 +8,19 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     JSON,
+    UniqueConstraint,
+    Index,
 )
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 from .database import Base
+from .services.embeddings import EMBEDDING_DIM, PGVECTOR_ENABLED
+
+if PGVECTOR_ENABLED:
+    from pgvector.sqlalchemy import Vector
+
+# JSONB on PostgreSQL (indexable with GIN, supports @> / ?|), plain JSON elsewhere
+JSONList = JSON().with_variant(JSONB(), "postgresql")
 
 class User(Base):
     __tablename__ = "users"
@@ -35,9 +46,25 @@ class User(Base):
 
 class ClothingItem(Base):
     __tablename__ = "clothing_items"
+    __table_args__ = (
+        # One item per processed upload (batch_id:image_index:content_hash), see app/tasks.py
+        UniqueConstraint("owner_id", "idempotency_key", name="uq_clothing_items_owner_idempotency_key"),
+        # Keyset pagination of a user's wardrobe: WHERE owner_id = ? AND id > ? ORDER BY id
+        Index("ix_clothing_items_owner_id_id", "owner_id", "id"),
+        # Containment filters on tag arrays (stylist, /items filters)
+        Index("ix_clothing_items_tags_gin", "tags", postgresql_using="gin"),
+        Index("ix_clothing_items_occasions_gin", "occasions", postgresql_using="gin"),
+        Index("ix_clothing_items_weather_suitability_gin", "weather_suitability", postgresql_using="gin"),
+    ) + ((
+        # Approximate nearest neighbours by cosine distance
+        Index(
+            "ix_clothing_items_embedding_hnsw", "embedding",
+            postgresql_using="hnsw", postgresql_ops={"embedding": "vector_cosine_ops"}
+        ),
+    ) if PGVECTOR_ENABLED else ())
 
     id = Column(Integer, primary_key=True, index=True)
-    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
     name        = Column(String, nullable=False)
     brand       = Column(String, nullable=True)
@@ -54,23 +81,58 @@ class ClothingItem(Base):
     product_url = Column(String, nullable=True)
     price       = Column(Float,  nullable=True, default=0.0)
 
-    tags                   = Column(JSON, default=list)
-    occasions              = Column(JSON, default=list)
-    weather_suitability    = Column(JSON, default=list)
+    tags                   = Column(JSONList, default=list)
+    occasions              = Column(JSONList, default=list)
+    weather_suitability    = Column(JSONList, default=list)
     ai_generated_embedding = Column(JSON, default=list)
 
     available  = Column(Boolean, default=True, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
 
+    idempotency_key = Column(String, nullable=True)
+
+    if PGVECTOR_ENABLED:
+        # CLIP image embedding for similarity search; deferred so list queries don't load it.
+        # Without pgvector the embeddings live in app/services/vector_index.py files instead.
+        embedding = deferred(Column(Vector(EMBEDDING_DIM), nullable=True))
+
+
+if PGVECTOR_ENABLED:
+    class CatalogEmbedding(Base):
+        """CLIP embeddings of the classified.csv catalog (filled by embed_catalog.py)"""
+        __tablename__ = "catalog_embeddings"
+        __table_args__ = (
+            Index(
+                "ix_catalog_embeddings_embedding_hnsw", "embedding",
+                postgresql_using="hnsw", postgresql_ops={"embedding": "vector_cosine_ops"}
+            ),
+        )
+
+        id          = Column(Integer, primary_key=True, index=True)
+        product_url = Column(String, unique=True, nullable=False)
+        name        = Column(String, nullable=False)
+        price       = Column(Float, nullable=True)
+        image_url   = Column(String, nullable=True)
+        gender      = Column(String, nullable=True)
+        piece_type  = Column(String, nullable=True)
+        main_color  = Column(String, nullable=True)
+
+        embedding = deferred(Column(Vector(EMBEDDING_DIM), nullable=False))
+
 
 class BodyAnalysis(Base):
     __tablename__ = "body_analyses"
+    __table_args__ = (
+        # Re-submitted photos are answered from here: WHERE user_id = ? AND image_hash = ?
+        Index("ix_body_analyses_user_id_image_hash", "user_id", "image_hash"),
+        Index("ix_body_analyses_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     
-    # Photo information
-    photo_url = Column(String, nullable=False)
+    # Photo information (NULL when the upload failed but the analysis succeeded)
+    photo_url = Column(String, nullable=True)
     compressed_photo_url = Column(String, nullable=True)
     
     # Analysis results
@@ -89,6 +151,10 @@ class BodyAnalysis(Base):
     best_silhouettes = Column(JSON, default=list)
     avoid_patterns = Column(JSON, default=list)
     accessory_tips = Column(JSON, default=list)
+
+    # sha256 of the AI-sized image and the full structured analysis returned for it
+    image_hash = Column(String(64), nullable=True)
+    analysis_data = Column(JSON, nullable=True)
     
     # Metadata
     analysis_version = Column(String, default="1.0")
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status
-from fastapi.responses import JSONResponse
-from typing import Dict, Any, List, Optional, Tuple
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, HTTPException, Depends, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 import os
 import io
+import asyncio
 from PIL import Image
 import json
 import base64
@@ -11,17 +12,20 @@ import requests
 import re
 import time
 import uuid
+import hashlib
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 from openai import OpenAI
-import pandas as pd
 
 from ..gcs_uploader import gcs_uploader
-from ..firebase_auth import get_current_user_firebase
-from .. import models
+from ..firebase_auth import get_current_user_firebase, UserSnapshot
+from .. import models, crud_async
 from ..services.image_compression import ImageCompressionService
-from ..database import get_db
+from ..services.catalog import CatalogIndex, get_catalog
+from ..services import catalog_ranking, wardrobe_cache
+from ..services.ai import ai_analyze_wardrobe_compatibility
+from ..database import AsyncSessionLocal, get_async_db
 import logging
 
 # Load environment variables
@@ -60,28 +64,56 @@ BRANDS_AVOID = [
 ]
 
 PRICE_RANGE = {"min": 20, "max": 160}
+PRICE_BAND = (PRICE_RANGE["min"], PRICE_RANGE["max"])
+# Сколько лучших по скорингу товаров каждой категории видит ИИ
+SHORTLIST_SIZE = int(os.getenv("CATALOG_SHORTLIST_SIZE", 20))
 MIN_RATING = 4.2
 MIN_REVIEWS = 500
 
 # ---------- CSV ДАННЫЕ ----------
-CSV_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "classified.csv")
+# Каталог индексируется один раз (app/services/catalog.py)
+def load_clothing_data() -> CatalogIndex:
+    """Возвращает индекс каталога одежды"""
+    return get_catalog()
 
-# Глобальная переменная для хранения данных CSV
-_clothing_data = None
+# ---------- УТИЛИТЫ ----------
+# Версия схемы анализа: при изменении промпта/схемы повышаем, старые сохранённые анализы не переиспользуются
+ANALYSIS_VERSION = "2.0"
 
-def load_clothing_data() -> pd.DataFrame:
-    """Загружает данные одежды из CSV файла"""
-    global _clothing_data
-    if _clothing_data is None:
-        try:
-            _clothing_data = pd.read_csv(CSV_FILE_PATH)
-            logger.info(f"📊 Загружено {len(_clothing_data)} товаров из CSV")
-        except Exception as e:
-            logger.error(f"❌ Ошибка загрузки CSV: {e}")
-            _clothing_data = pd.DataFrame()  # Пустой DataFrame в случае ошибки
-    return _clothing_data
+# Профиль для wardrobe-compatibility, пока у пользователя нет сохранённого анализа
+DEFAULT_COMPATIBILITY_PROFILE = {
+    "bodyType": "Rectangle",
+    "recommendedColors": ["Navy", "White", "Black", "Gray", "Burgundy"],
+    "styleRecommendations": ["Classic", "Minimalist", "Structured"]
+}
+
+def image_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def analysis_record(analysis: Dict) -> Dict:
+    """Колонки BodyAnalysis для результата analyze_image"""
+    return {
+        "body_type": analysis.get("body_type"),
+        "recommended_colors": (analysis.get("color_palette") or {}).get("best_colors", []),
+        "style_recommendations": (analysis.get("fit_rules") or {}).get("prefer", []),
+        "analysis_data": analysis,
+        "analysis_version": ANALYSIS_VERSION,
+    }
+
+def compatibility_profile(stored: Optional[models.BodyAnalysis]) -> Dict:
+    """Сохранённый анализ -> профиль для ai_analyze_wardrobe_compatibility"""
+    if stored is None:
+        return DEFAULT_COMPATIBILITY_PROFILE
+    data = stored.analysis_data or {}
+    styles = list(stored.style_recommendations or [])
+    if data.get("style_goal"):
+        styles.insert(0, data["style_goal"])
+    return {
+        "bodyType": stored.body_type or DEFAULT_COMPATIBILITY_PROFILE["bodyType"],
+        "recommendedColors": stored.recommended_colors or DEFAULT_COMPATIBILITY_PROFILE["recommendedColors"],
+        "styleRecommendations": styles or DEFAULT_COMPATIBILITY_PROFILE["styleRecommendations"]
+    }
 
-# ---------- УТИЛИТЫ ----------
 def b64img(image_bytes: bytes) -> str:
     """Конвертирует изображение в base64 для OpenAI API"""
     return f"data:image/jpeg;base64," + base64.b64encode(image_bytes).decode()
@@ -166,70 +198,89 @@ class WardrobeCompatibilityResponse(BaseModel):
     message: str
     result: Optional[WardrobeCompatibilityResult] = None
 
+class StoredBodyAnalysis(BaseModel):
+    id: int
+    photo_url: Optional[str] = None
+    body_type: Optional[str] = None
+    recommended_colors: Optional[List[str]] = None
+    style_recommendations: Optional[List[str]] = None
+    analysis: Optional[Dict[str, Any]] = None
+    analysis_version: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+def stored_analysis(analysis: models.BodyAnalysis) -> StoredBodyAnalysis:
+    return StoredBodyAnalysis(
+        id=analysis.id,
+        photo_url=analysis.photo_url,
+        body_type=analysis.body_type,
+        recommended_colors=analysis.recommended_colors,
+        style_recommendations=analysis.style_recommendations,
+        analysis=analysis.analysis_data,
+        analysis_version=analysis.analysis_version,
+        created_at=analysis.created_at
+    )
+
 # ---------- ПОИСК ТОВАРОВ В CSV ----------
-def ai_select_clothing_from_csv(analysis: Dict, max_items: int = 15) -> Tuple[List[ClothingItem], List[ClothingItem]]:
-    """ИИ подбор одежды из CSV данных с использованием ChatGPT API"""
-    clothing_data = load_clothing_data()
+def ai_select_clothing_from_csv(
+    analysis: Dict,
+    max_items: int = 15,
+    use_llm: bool = True
+) -> Tuple[List[ClothingItem], List[ClothingItem]]:
+    """
+    Подбор одежды из каталога: локальный скоринг (app/services/catalog_ranking.py)
+    выбирает шорт-лист, ChatGPT выбирает из него финальные вещи.
+    С use_llm=False (быстрый режим) сразу возвращается топ скоринга.
+    """
+    catalog = load_clothing_data()
     
-    if clothing_data.empty:
+    if not catalog.size:
         logger.warning("⚠️ CSV данные не загружены")
         return [], []
     
-    logger.info(f"📊 Загружено {len(clothing_data)} товаров из CSV")
+    per_piece = max_items // 2
+    gender = analysis.get('gender_label', 'unisex')
+    body_type = analysis.get('body_type', 'unknown')
+    style_goal = analysis.get('style_goal', 'casual')
+    logger.info(f"🔍 Анализ для: пол={gender}, тип фигуры={body_type}, стиль={style_goal}")
+    
+    # Детерминированный скоринг всех подходящих товаров
+    top_rows, _ = catalog_ranking.rank(catalog, analysis, "top", k=max(SHORTLIST_SIZE, per_piece), price_range=PRICE_BAND)
+    bottom_rows, _ = catalog_ranking.rank(catalog, analysis, "bottom", k=max(SHORTLIST_SIZE, per_piece), price_range=PRICE_BAND)
+    
+    ranked_tops = [ClothingItem.construct(**item) for item in catalog.to_items(top_rows[:per_piece])]
+    ranked_bottoms = [ClothingItem.construct(**item) for item in catalog.to_items(bottom_rows[:per_piece])]
+    
+    if not use_llm or (not len(top_rows) and not len(bottom_rows)):
+        logger.info(f"⚡ Локальный подбор: {len(ranked_tops)} топов, {len(ranked_bottoms)} низа")
+        return ranked_tops, ranked_bottoms
     
     try:
-        # Подготавливаем данные для ИИ анализа
-        gender = analysis.get('gender_label', 'unisex')
-        body_type = analysis.get('body_type', 'unknown')
-        style_goal = analysis.get('style_goal', 'casual')
         best_colors = analysis.get('color_palette', {}).get('best_colors', [])
         avoid_colors = analysis.get('color_palette', {}).get('avoid_colors', [])
         recommended_categories = analysis.get('recommended_categories', {})
         
-        logger.info(f"🔍 Анализ для: пол={gender}, тип фигуры={body_type}, стиль={style_goal}")
-        
-        # Фильтруем данные по полу для уменьшения объема
-        # Маппинг значений ИИ анализа к значениям CSV
-        gender_mapping = {'men': 'male', 'women': 'female', 'unisex': None}
-        csv_gender = gender_mapping.get(gender.lower(), None)
-        
-        if csv_gender:
-            filtered_data = clothing_data[clothing_data['gender'].str.lower() == csv_gender]
-            logger.info(f"🚹 После фильтрации по полу '{gender}' -> '{csv_gender}': {len(filtered_data)} товаров")
-        else:
-            filtered_data = clothing_data
-            logger.info(f"🚻 Без фильтрации по полу: {len(filtered_data)} товаров")
-        
-        if filtered_data.empty:
-            logger.warning(f"⚠️ Нет товаров для пола '{gender}'")
-            return [], []
-        
-        # Ограничиваем количество товаров для анализа (чтобы не превысить лимит токенов)
-        sample_size = min(100, len(filtered_data))
-        sample_data = filtered_data.sample(n=sample_size) if len(filtered_data) > sample_size else filtered_data
-        
-        logger.info(f"📝 Отправляем ИИ {len(sample_data)} товаров для анализа")
-        
-        # Создаем JSON представление товаров для ИИ
+        # Компактное представление шорт-листа (id = номер строки каталога)
+        shortlist_rows = list(top_rows) + list(bottom_rows)
         items_for_ai = []
-        for idx, row in sample_data.iterrows():
+        for row in shortlist_rows:
+            item = catalog.item(row)
             items_for_ai.append({
-                "id": idx,
-                "name": row['name'],
-                "price": row['price'],
-                "gender": row['gender'],
-                "piece_type": row['piece_type'],
-                "subtype": row.get('subtype', ''),
-                "fit": row.get('fit', ''),
-                "style": row.get('style', ''),
-                "season": row.get('season', ''),
-                "main_color": row['main_color'],
-                "palette_tags": row.get('palette_tags', '')
+                "id": int(row),
+                "name": item['name'],
+                "price": item['price'],
+                "piece_type": item['piece_type'],
+                "subtype": item['subtype'] or '',
+                "fit": item['fit'] or '',
+                "season": item['season'] or '',
+                "main_color": item['main_color']
             })
         
+        logger.info(f"📝 Отправляем ИИ шорт-лист из {len(items_for_ai)} товаров")
+        
         # Формируем промпт для ChatGPT
         ai_prompt = f"""
 Ты - эксперт по стилю и моде. Проанализируй данные о человеке и выбери наиболее подходящие вещи из предоставленного списка одежды.
+Список уже отсортирован по релевантности (лучшие сверху).
 
 Данные о человеке:
 - Пол: {gender}
@@ -240,9 +291,9 @@ def ai_select_clothing_from_csv(analysis: Dict, max_items: int = 15) -> Tuple[Li
 - Рекомендуемые категории: {recommended_categories}
 
 Список доступной одежды:
-{json.dumps(items_for_ai, ensure_ascii=False, indent=2)}
+{json.dumps(items_for_ai, ensure_ascii=False, separators=(',', ':'))}
 
-Выбери максимум {max_items//2} топов и {max_items//2} низа, которые лучше всего подходят этому человеку.
+Выбери максимум {per_piece} топов и {per_piece} низа, которые лучше всего подходят этому человеку.
 Учитывай:
 1. Соответствие типу фигуры
 2. Цветовую палитру
@@ -264,7 +315,8 @@ def ai_select_clothing_from_csv(analysis: Dict, max_items: int = 15) -> Tuple[Li
                 {"role": "system", "content": "Ты эксперт по стилю и моде. Отвечай только в формате JSON."},
                 {"role": "user", "content": ai_prompt}
             ],
-            max_tokens=1000,
+            response_format={"type": "json_object"},
+            max_tokens=500,
             temperature=0.3
         )
         
@@ -280,124 +332,37 @@ def ai_select_clothing_from_csv(analysis: Dict, max_items: int = 15) -> Tuple[Li
             
             logger.info(f"🧠 ИИ выбрал: {len(selected_top_ids)} топов, {len(selected_bottom_ids)} низа. Обоснование: {reasoning}")
             
-            # Конвертируем выбранные ID в ClothingItem объекты
-            tops_result = []
-            for item_id in selected_top_ids:
-                if item_id in sample_data.index:
-                    row = sample_data.loc[item_id]
-                    tops_result.append(ClothingItem(
-                        name=row['name'],
-                        price=float(row['price']),
-                        image_url=row['image_url'],
-                        product_url=row['product_url'],
-                        gender=row['gender'],
-                        piece_type=row['piece_type'],
-                        subtype=row.get('subtype'),
-                        fit=row.get('fit'),
-                        style=row.get('style'),
-                        season=row.get('season'),
-                        main_color=row['main_color'],
-                        palette_tags=row.get('palette_tags')
-                    ))
-            
-            bottoms_result = []
-            for item_id in selected_bottom_ids:
-                if item_id in sample_data.index:
-                    row = sample_data.loc[item_id]
-                    bottoms_result.append(ClothingItem(
-                        name=row['name'],
-                        price=float(row['price']),
-                        image_url=row['image_url'],
-                        product_url=row['product_url'],
-                        gender=row['gender'],
-                        piece_type=row['piece_type'],
-                        subtype=row.get('subtype'),
-                        fit=row.get('fit'),
-                        style=row.get('style'),
-                        season=row.get('season'),
-                        main_color=row['main_color'],
-                        palette_tags=row.get('palette_tags')
-                    ))
+            # Конвертируем выбранные ID в ClothingItem объекты (только из шорт-листа)
+            tops_result = selected_items(catalog, selected_top_ids[:per_piece], {int(row) for row in top_rows})
+            bottoms_result = selected_items(catalog, selected_bottom_ids[:per_piece], {int(row) for row in bottom_rows})
             
             logger.info(f"✅ ИИ подбор завершен: {len(tops_result)} топов, {len(bottoms_result)} низа")
-            return tops_result, bottoms_result
+            # Если ИИ ничего не выбрал из категории — берём топ скоринга
+            return tops_result or ranked_tops, bottoms_result or ranked_bottoms
             
         except json.JSONDecodeError as e:
             logger.error(f"❌ Ошибка парсинга ответа ИИ: {e}")
-            # Fallback к простому поиску
-            return fallback_clothing_search(analysis, max_items)
+            return ranked_tops, ranked_bottoms
             
     except Exception as e:
         logger.error(f"❌ Ошибка ИИ подбора: {e}")
-        # Fallback к простому поиску
-        return fallback_clothing_search(analysis, max_items)
+        return ranked_tops, ranked_bottoms
+
+def selected_items(catalog: CatalogIndex, item_ids: List, allowed_ids: set) -> List[ClothingItem]:
+    """ID, выбранные ИИ -> ClothingItem (словари уже проверены при построении индекса)"""
+    result = []
+    for item_id in item_ids:
+        try:
+            row = int(item_id)
+        except (TypeError, ValueError):
+            continue
+        if row in allowed_ids:
+            result.append(ClothingItem.construct(**catalog.item(row)))
+    return result
 
 def fallback_clothing_search(analysis: Dict, max_items: int = 15) -> Tuple[List[ClothingItem], List[ClothingItem]]:
-    """Резервный простой поиск одежды в случае сбоя ИИ"""
-    clothing_data = load_clothing_data()
-    
-    if clothing_data.empty:
-        return [], []
-    
-    gender = analysis.get('gender_label', 'unisex')
-    recommended_categories = analysis.get('recommended_categories', {})
-    
-    # Простая фильтрация по полу
-    if gender != 'unisex':
-        filtered_data = clothing_data[clothing_data['gender'].str.lower() == gender.lower()]
-    else:
-        filtered_data = clothing_data
-    
-    # Поиск топов и низа
-    top_categories = recommended_categories.get('top', ['t-shirt', 'shirt', 'blouse'])
-    bottom_categories = recommended_categories.get('bottom', ['jeans', 'trousers', 'pants'])
-    
-    tops_data = filtered_data[filtered_data['piece_type'].str.lower().isin([cat.lower() for cat in top_categories])]
-    bottoms_data = filtered_data[filtered_data['piece_type'].str.lower().isin([cat.lower() for cat in bottom_categories])]
-    
-    # Сортировка по цене
-    tops_data = tops_data.sort_values('price', ascending=True)
-    bottoms_data = bottoms_data.sort_values('price', ascending=True)
-    
-    max_per_category = max_items // 2
-    
-    # Конвертация в ClothingItem объекты
-    tops_result = []
-    for _, row in tops_data.head(max_per_category).iterrows():
-        tops_result.append(ClothingItem(
-            name=row['name'],
-            price=float(row['price']),
-            image_url=row['image_url'],
-            product_url=row['product_url'],
-            gender=row['gender'],
-            piece_type=row['piece_type'],
-            subtype=row.get('subtype'),
-            fit=row.get('fit'),
-            style=row.get('style'),
-            season=row.get('season'),
-            main_color=row['main_color'],
-            palette_tags=row.get('palette_tags')
-        ))
-    
-    bottoms_result = []
-    for _, row in bottoms_data.head(max_per_category).iterrows():
-        bottoms_result.append(ClothingItem(
-            name=row['name'],
-            price=float(row['price']),
-            image_url=row['image_url'],
-            product_url=row['product_url'],
-            gender=row['gender'],
-            piece_type=row['piece_type'],
-            subtype=row.get('subtype'),
-            fit=row.get('fit'),
-            style=row.get('style'),
-            season=row.get('season'),
-            main_color=row['main_color'],
-            palette_tags=row.get('palette_tags')
-        ))
-    
-    logger.info(f"🔄 Fallback поиск: {len(tops_result)} топов, {len(bottoms_result)} низа")
-    return tops_result, bottoms_result
+    """Резервный поиск одежды без ИИ (локальный скоринг)"""
+    return ai_select_clothing_from_csv(analysis, max_items, use_llm=False)
 
 # ---------- СТАРЫЕ ФУНКЦИИ AMAZON (БУДУТ ЗАМЕНЕНЫ) ----------
 def tavily_search_with_brands(query: str, brands: List[str], max_results: int = 12) -> List[str]:
@@ -666,115 +631,213 @@ def select_best_items(analysis: Dict, top_links: List[str], bottom_links: List[s
         selected_bottoms = sort_by_brand_preference(selected_bottoms)
     
     return selected_tops, selected_bottoms
-@router.post("/wardrobe-compatibility", response_model=WardrobeCompatibilityResponse)
-async def analyze_wardrobe_compatibility(
-    current_user: models.User = Depends(get_current_user_firebase),
-    db: Session = Depends(get_db)
-):
-    """
-    Analyze how well user's wardrobe matches their body analysis results.
-    """
+
+# ---------- ЭТАПЫ /analyze ----------
+def upload_body_photo(image_bytes: bytes, firebase_uid: Optional[str]) -> str:
+    """Сжатие для хранения + загрузка в GCS (блокирующая, выполняется в потоке)"""
     try:
-        logger.info(f"🔍 Starting wardrobe compatibility analysis for user {current_user.id}")
-        
-        # Get user's clothing items
-        clothing_items = db.query(models.ClothingItem).filter(
-            models.ClothingItem.owner_id == current_user.id
-        ).all()
-        
-        if not clothing_items:
-            return WardrobeCompatibilityResponse(
-                success=True,
-                message="No clothing items found in wardrobe",
-                result=WardrobeCompatibilityResult(
-                    compatibility_percentage=0.0,
-                    matching_items=0,
-                    total_items=0,
-                    recommendations=["Add clothing items to your wardrobe to get compatibility analysis"],
-                    color_matches=[],
-                    style_matches=[],
-                    missing_essentials=["Basic wardrobe items needed"]
-                )
-            )
-        
-        # Get user's latest body analysis (we'll need to store this)
-        # For now, we'll use default recommendations
-        body_analysis = {
-            "bodyType": "Rectangle",  # Default - should come from stored analysis
-            "recommendedColors": ["Navy", "White", "Black", "Gray", "Burgundy"],
-            "styleRecommendations": ["Classic", "Minimalist", "Structured"]
-        }
-        
-        # Prepare wardrobe data for AI analysis
-        wardrobe_data = []
-        for item in clothing_items:
-            wardrobe_data.append({
-                "name": item.name,
-                "category": item.category,
-                "color": item.color,
-                "brand": item.brand,
-                "material": item.material,
-                "tags": item.tags if hasattr(item, 'tags') else []
-            })
-        
-        # Analyze compatibility with AI
-        try:
-            logger.info("🤖 Starting AI wardrobe compatibility analysis...")
-            compatibility_result = ai_analyze_wardrobe_compatibility(body_analysis, wardrobe_data)
-            logger.info(f"✅ AI compatibility analysis completed: {compatibility_result}")
-            
-        except Exception as e:
-            logger.error(f"❌ AI compatibility analysis failed: {e}")
-            # Fallback to basic analysis
-            compatibility_result = {
-                "compatibility_percentage": 75.0,
-                "matching_items": len(clothing_items) // 2,
-                "total_items": len(clothing_items),
-                "recommendations": ["Consider adding more versatile pieces", "Focus on recommended colors"],
-                "color_matches": ["Navy", "Black"],
-                "style_matches": ["Classic pieces"],
-                "missing_essentials": ["White button-down shirt", "Dark jeans"]
-            }
-        
-        result = WardrobeCompatibilityResult(
-            compatibility_percentage=compatibility_result.get("compatibility_percentage", 0.0),
-            matching_items=compatibility_result.get("matching_items", 0),
-            total_items=len(clothing_items),
-            recommendations=compatibility_result.get("recommendations", []),
-            color_matches=compatibility_result.get("color_matches", []),
-            style_matches=compatibility_result.get("style_matches", []),
-            missing_essentials=compatibility_result.get("missing_essentials", [])
+        storage_compressed = ImageCompressionService.compress_for_storage(image_bytes)
+        logger.info("📦 Image compressed for storage")
+    except Exception as e:
+        logger.error(f"❌ Image compression failed: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка обработки изображения")
+    
+    try:
+        filename = f"body_analysis/{firebase_uid or 'unknown'}/{uuid.uuid4()}.jpg"
+        public_url = gcs_uploader.upload_file(
+            file_data=storage_compressed,
+            filename=filename,
+            content_type="image/jpeg"
         )
-        
-        return WardrobeCompatibilityResponse(
-            success=True,
-            message="Wardrobe compatibility analysis completed",
-            result=result
+        logger.info(f"☁️ Image uploaded to GCS: {public_url}")
+        return public_url
+    except Exception as e:
+        logger.error(f"❌ GCS upload failed: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка загрузки файла")
+
+def run_analysis(ai_bytes: bytes) -> Dict:
+    try:
+        logger.info("🤖 Starting AI body analysis...")
+        analysis = analyze_image(ai_bytes)
+        logger.info(f"✅ AI analysis completed")
+        return analysis
+    except Exception as e:
+        logger.error(f"❌ AI analysis failed: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка AI анализа")
+
+def select_products(analysis: Dict, fast: bool = False) -> Tuple[List[ClothingItem], List[ClothingItem], Metadata]:
+    """Поисковые запросы + подбор товаров из каталога"""
+    try:
+        top_query, bottom_query, preferred_brands = build_queries_from_analysis(analysis)
+        logger.info(f"🔍 Generated queries - Top: {top_query}, Bottom: {bottom_query}")
+    except Exception as e:
+        logger.error(f"❌ Query generation failed: {e}")
+        top_query, bottom_query, preferred_brands = "casual shirt", "jeans", ["Uniqlo", "J.Crew"]
+    
+    try:
+        logger.info("🤖 AI selecting clothing from CSV data...")
+        final_tops, final_bottoms = ai_select_clothing_from_csv(analysis, max_items=15, use_llm=not fast)
+        logger.info(f"🎯 AI selected {len(final_tops)} tops and {len(final_bottoms)} bottoms")
+    except Exception as e:
+        logger.error(f"❌ CSV product search failed: {e}")
+        final_tops, final_bottoms = [], []
+    
+    metadata = Metadata(
+        recommended_brands=preferred_brands,
+        search_queries={
+            "top_query": top_query,
+            "bottom_query": bottom_query
+        }
+    )
+    return final_tops, final_bottoms, metadata
+
+def analysis_summary(analysis: Dict) -> Tuple[BodyAnalysisResult, IdealFits, IdealColors]:
+    result = BodyAnalysisResult(
+        gender=analysis.get("gender_label", "unisex"),
+        body_type=analysis.get("body_type", "rectangle"),
+        style_goal=analysis.get("style_goal", "casual"),
+        height_cm=analysis.get("height_cm", 170),
+        weight_kg=analysis.get("weight_kg", 70)
+    )
+    
+    fits = IdealFits(
+        top_fit=analysis["fit_rules"]["top_fit"],
+        bottom_fit=analysis["fit_rules"]["bottom_fit"],
+        preferred_styles=analysis["fit_rules"]["prefer"],
+        avoid_styles=analysis["fit_rules"]["avoid"],
+        fit_description=f"Рекомендуемый крой верха: {analysis['fit_rules']['top_fit']}, низа: {analysis['fit_rules']['bottom_fit']}"
+    )
+    
+    colors = IdealColors(
+        best_colors=analysis["color_palette"]["best_colors"],
+        avoid_colors=analysis["color_palette"]["avoid_colors"],
+        color_description=f"Цветотип: {analysis['color_palette']['season']}"
+    )
+    return result, fits, colors
+
+def clothing_recommendations(tops: List[ClothingItem], bottoms: List[ClothingItem]) -> ClothingRecommendations:
+    return ClothingRecommendations(
+        tops=tops,
+        bottoms=bottoms,
+        total_found={
+            "tops": len(tops),
+            "bottoms": len(bottoms)
+        }
+    )
+
+# Фоновые задачи очистки: храним ссылки, иначе сборщик мусора может удалить задачу до завершения
+_cleanup_tasks = set()
+
+def run_cleanup(coro):
+    task = asyncio.create_task(coro)
+    _cleanup_tasks.add(task)
+    task.add_done_callback(_cleanup_tasks.discard)
+
+async def discard_upload(upload_task: "asyncio.Task"):
+    """Фото уже загружается, а анализ не удался: дожидаемся загрузки и удаляем файл"""
+    try:
+        public_url = await upload_task
+    except Exception:
+        return
+    await asyncio.to_thread(gcs_uploader.delete_files, [public_url])
+
+async def save_analysis(db: AsyncSession, user_id: int, public_url: Optional[str], photo_hash: str, analysis: Dict):
+    """Сохраняем анализ: повторная отправка того же фото обойдётся без вызова модели"""
+    try:
+        await crud_async.create_body_analysis(
+            db, user_id, photo_url=public_url, image_hash=photo_hash, **analysis_record(analysis)
         )
-        
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"❌ Unexpected error in wardrobe compatibility analysis: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Internal server error during wardrobe compatibility analysis"
+        logger.error(f"❌ Failed to store body analysis: {e}")
+        await db.rollback()
+
+def ndjson_event(event: str, **payload) -> bytes:
+    return (json.dumps({"event": event, **payload}, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+async def analysis_events(
+    image_bytes: bytes,
+    ai_bytes: bytes,
+    photo_hash: str,
+    stored: Optional[models.BodyAnalysis],
+    fast: bool,
+    current_user: UserSnapshot
+) -> AsyncIterator[bytes]:
+    """
+    NDJSON-поток для /analyze?stream=true, события по мере готовности:
+    analysis -> recommendations (после подбора) и photo (после загрузки, в любом порядке) -> done.
+    Ошибка этапа приходит событием error; после ошибки анализа поток завершается.
+    """
+    def analysis_event(analysis: Dict) -> bytes:
+        result, fits, colors = analysis_summary(analysis)
+        return ndjson_event("analysis", analysis=result.dict(), ideal_fits=fits.dict(), ideal_colors=colors.dict())
+
+    def recommendations_event(tops, bottoms, metadata: Metadata) -> bytes:
+        return ndjson_event(
+            "recommendations",
+            clothing_recommendations=clothing_recommendations(tops, bottoms).dict(),
+            metadata=metadata.dict()
         )
 
+    if stored:
+        yield analysis_event(stored.analysis_data)
+        yield recommendations_event(*await asyncio.to_thread(select_products, stored.analysis_data, fast))
+        yield ndjson_event("photo", photo_url=stored.photo_url)
+        yield ndjson_event("done", success=True, message="Анализ тела и подбор товаров успешно выполнен")
+        return
+
+    upload_task = asyncio.create_task(asyncio.to_thread(upload_body_photo, image_bytes, current_user.firebase_uid))
+    analysis_task = asyncio.create_task(asyncio.to_thread(run_analysis, ai_bytes))
+    selection_task = None
+    pending = {upload_task, analysis_task}
+    analysis, public_url = None, None
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            try:
+                if task is analysis_task:
+                    analysis = task.result()
+                    yield analysis_event(analysis)
+                    selection_task = asyncio.create_task(asyncio.to_thread(select_products, analysis, fast))
+                    pending.add(selection_task)
+                elif task is selection_task:
+                    yield recommendations_event(*task.result())
+                else:
+                    public_url = task.result()
+                    yield ndjson_event("photo", photo_url=public_url)
+            except HTTPException as e:
+                stage = "analysis" if task is analysis_task else "upload"
+                yield ndjson_event("error", stage=stage, detail=e.detail)
+                if task is analysis_task:
+                    if upload_task in pending:
+                        run_cleanup(discard_upload(upload_task))
+                    elif public_url:
+                        run_cleanup(asyncio.to_thread(gcs_uploader.delete_files, [public_url]))
+                    return
+
+    # Анализ сохраняем и без фото, если загрузка не удалась.
+    # Сессия зависимости закрывается до конца стрима, поэтому своя
+    async with AsyncSessionLocal() as db:
+        await save_analysis(db, current_user.id, public_url, photo_hash, analysis)
+    yield ndjson_event("done", success=True, message="Анализ тела и подбор товаров успешно выполнен")
+
 @router.post("/analyze", response_model=BodyAnalysisResponse)
 async def analyze_body_photo(
     file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_user_firebase)
+    fast: bool = Query(False, description="Подбор товаров только локальным скорингом, без ChatGPT"),
+    refresh: bool = Query(False, description="Не использовать сохранённый анализ этого же фото"),
+    stream: bool = Query(False, description="Отдавать результаты по мере готовности (NDJSON)"),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
+    db: AsyncSession = Depends(get_async_db)
 ) -> BodyAnalysisResponse:
     """
-    Анализирует фото тела пользователя и предоставляет рекомендации по стилю с поиском товаров на Amazon
+    Анализирует фото тела пользователя и предоставляет рекомендации по стилю с поиском товаров на Amazon.
+    Загрузка фото в GCS идёт параллельно с AI анализом и подбором товаров.
+    С stream=true ответ — application/x-ndjson с событиями analysis, recommendations, photo, done.
     """
     try:
         logger.info(f"🔍 Starting body photo analysis for user {current_user.firebase_uid or 'unknown'}")
         
-        # Загрузка данных одежды из CSV
-        load_clothing_data()
-        
         # Валидация файла
         if not file.content_type or not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Файл должен быть изображением")
@@ -786,104 +849,59 @@ async def analyze_body_photo(
         
         logger.info(f"📸 Processing image: {len(image_bytes)} bytes")
         
-        # Сжатие изображения для хранения
+        # Сжатие для AI: модель получает уменьшенное фото, по его хэшу ищем готовый анализ
         try:
-            storage_compressed = ImageCompressionService.compress_for_storage(image_bytes)
-            logger.info("📦 Image compressed for storage")
+            ai_bytes = await asyncio.to_thread(ImageCompressionService.compress_for_ai_processing, image_bytes)
         except Exception as e:
             logger.error(f"❌ Image compression failed: {e}")
             raise HTTPException(status_code=500, detail="Ошибка обработки изображения")
+        photo_hash = image_hash(ai_bytes)
         
-        # Загрузка в GCS
-        try:
-            filename = f"body_analysis/{current_user.firebase_uid or 'unknown'}/{uuid.uuid4()}.jpg"
-            public_url = gcs_uploader.upload_file(
-                file_data=storage_compressed,
-                filename=filename,
-                content_type="image/jpeg"
-            )
-            logger.info(f"☁️ Image uploaded to GCS: {public_url}")
-        except Exception as e:
-            logger.error(f"❌ GCS upload failed: {e}")
-            raise HTTPException(status_code=500, detail="Ошибка загрузки файла")
+        stored = None
+        if not refresh:
+            stored = await crud_async.get_body_analysis_by_hash(db, current_user.id, photo_hash, ANALYSIS_VERSION)
         
-        # AI анализ изображения с помощью OpenAI GPT-4o
-        try:
-            logger.info("🤖 Starting AI body analysis...")
-            analysis = analyze_image(image_bytes)
-            logger.info(f"✅ AI analysis completed")
-        except Exception as e:
-            logger.error(f"❌ AI analysis failed: {e}")
-            raise HTTPException(status_code=500, detail="Ошибка AI анализа")
+        if stored:
+            logger.info(f"♻️ Using stored analysis {stored.id} for image {photo_hash[:12]}")
         
-        # Генерация поисковых запросов
-        try:
-            top_query, bottom_query, preferred_brands = build_queries_from_analysis(analysis)
-            logger.info(f"🔍 Generated queries - Top: {top_query}, Bottom: {bottom_query}")
-        except Exception as e:
-            logger.error(f"❌ Query generation failed: {e}")
-            top_query, bottom_query, preferred_brands = "casual shirt", "jeans", ["Uniqlo", "J.Crew"]
+        if stream:
+            return StreamingResponse(
+                analysis_events(image_bytes, ai_bytes, photo_hash, stored, fast, current_user),
+                media_type="application/x-ndjson"
+            )
         
-        # ИИ подбор товаров из CSV данных
-        try:
-            logger.info("🤖 AI selecting clothing from CSV data...")
-            final_tops, final_bottoms = ai_select_clothing_from_csv(analysis, max_items=15)
+        if stored:
+            analysis = stored.analysis_data
+            public_url = stored.photo_url
+            final_tops, final_bottoms, metadata = await asyncio.to_thread(select_products, analysis, fast)
+        else:
+            # Ветка 1: сжатие для хранения + GCS; ветка 2: анализ -> подбор товаров
+            upload_task = asyncio.create_task(
+                asyncio.to_thread(upload_body_photo, image_bytes, current_user.firebase_uid)
+            )
+            try:
+                analysis = await asyncio.to_thread(run_analysis, ai_bytes)
+            except Exception:
+                run_cleanup(discard_upload(upload_task))
+                raise
+            final_tops, final_bottoms, metadata = await asyncio.to_thread(select_products, analysis, fast)
+            try:
+                public_url = await upload_task
+            except Exception as e:
+                # Готовый (платный) анализ не выбрасываем: отдаём и сохраняем без фото
+                logger.error(f"❌ Photo upload failed, returning analysis without photo: {e}")
+                public_url = None
             
-            logger.info(f"🎯 AI selected {len(final_tops)} tops and {len(final_bottoms)} bottoms")
-        except Exception as e:
-            logger.error(f"❌ CSV product search failed: {e}")
-            final_tops, final_bottoms = [], []
-        
-        # Создание результата в новом формате
-        result = BodyAnalysisResult(
-            gender=analysis.get("gender_label", "unisex"),
-            body_type=analysis.get("body_type", "rectangle"),
-            style_goal=analysis.get("style_goal", "casual"),
-            height_cm=analysis.get("height_cm", 170),
-            weight_kg=analysis.get("weight_kg", 70)
-        )
-        
-        # Создание объектов для идеальных фасонов и цветов
-        fits = IdealFits(
-            top_fit=analysis["fit_rules"]["top_fit"],
-            bottom_fit=analysis["fit_rules"]["bottom_fit"],
-            preferred_styles=analysis["fit_rules"]["prefer"],
-            avoid_styles=analysis["fit_rules"]["avoid"],
-            fit_description=f"Рекомендуемый крой верха: {analysis['fit_rules']['top_fit']}, низа: {analysis['fit_rules']['bottom_fit']}"
-        )
-        
-        colors = IdealColors(
-            best_colors=analysis["color_palette"]["best_colors"],
-            avoid_colors=analysis["color_palette"]["avoid_colors"],
-            color_description=f"Цветотип: {analysis['color_palette']['season']}"
-        )
-        
-        # Рекомендации одежды из CSV
-        clothing_recs = ClothingRecommendations(
-            tops=final_tops,
-            bottoms=final_bottoms,
-            total_found={
-                "tops": len(final_tops),
-                "bottoms": len(final_bottoms)
-            }
-        )
-        
-        # Метаданные
-        metadata = Metadata(
-            recommended_brands=preferred_brands,
-            search_queries={
-                "top_query": top_query,
-                "bottom_query": bottom_query
-            }
-        )
+            await save_analysis(db, current_user.id, public_url, photo_hash, analysis)
         
+        result, fits, colors = analysis_summary(analysis)
         return BodyAnalysisResponse(
             success=True,
             message="Анализ тела и подбор товаров успешно выполнен",
             analysis=result,
             ideal_fits=fits,
             ideal_colors=colors,
-            clothing_recommendations=clothing_recs,
+            clothing_recommendations=clothing_recommendations(final_tops, final_bottoms),
             metadata=metadata,
             photo_url=public_url
         )
@@ -896,19 +914,17 @@ async def analyze_body_photo(
 
 @router.post("/wardrobe-compatibility", response_model=WardrobeCompatibilityResponse)
 async def analyze_wardrobe_compatibility(
-    current_user: models.User = Depends(get_current_user_firebase),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Analyze how well user's wardrobe matches their body analysis results.
+    Analyze how well user's wardrobe matches their latest stored body analysis.
     """
     try:
         logger.info(f"🔍 Starting wardrobe compatibility analysis for user {current_user.id}")
         
-        # Get user's clothing items
-        clothing_items = db.query(models.ClothingItem).filter(
-            models.ClothingItem.owner_id == current_user.id
-        ).all()
+        # Get user's clothing items (shared wardrobe snapshot)
+        clothing_items = (await wardrobe_cache.get_snapshot(db, current_user.id)).items
         
         if not clothing_items:
             return WardrobeCompatibilityResponse(
@@ -925,13 +941,9 @@ async def analyze_wardrobe_compatibility(
                 )
             )
         
-        # Get user's latest body analysis (we'll need to store this)
-        # For now, we'll use default recommendations
-        body_analysis = {
-            "bodyType": "Rectangle",  # Default - should come from stored analysis
-            "recommendedColors": ["Navy", "White", "Black", "Gray", "Burgundy"],
-            "styleRecommendations": ["Classic", "Minimalist", "Structured"]
-        }
+        # Latest stored body analysis; the default profile is used until the user has one
+        latest_analysis = await crud_async.get_latest_body_analysis(db, current_user.id)
+        body_analysis = compatibility_profile(latest_analysis)
         
         # Prepare wardrobe data for AI analysis
         wardrobe_data = []
@@ -989,28 +1001,34 @@ async def analyze_wardrobe_compatibility(
             detail="Internal server error during wardrobe compatibility analysis"
         )
 
-@router.get("/results/{user_id}")
+@router.get("/results/{user_id}", response_model=List[StoredBodyAnalysis])
 async def get_body_analysis_results(
     user_id: int,
-    current_user: models.User = Depends(get_current_user_firebase)
+    limit: int = Query(20, ge=1, le=100),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Body analysis results are not stored - this endpoint is deprecated.
+    Stored body analyses of the current user, newest first.
     """
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Body analysis results are not stored. Please perform a new analysis."
-    )
+    if user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    analyses = await crud_async.get_body_analyses(db, current_user.id, limit=limit)
+    return [stored_analysis(analysis) for analysis in analyses]
 
 @router.delete("/results/{analysis_id}")
 async def delete_body_analysis(
     analysis_id: int,
-    current_user: models.User = Depends(get_current_user_firebase)
+    background_tasks: BackgroundTasks,
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Body analysis results are not stored - this endpoint is deprecated.
+    Delete a stored body analysis and its photo.
     """
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Body analysis results are not stored. Nothing to delete."
-    )
\ No newline at end of file
+    deleted = await crud_async.delete_body_analysis(db, analysis_id, current_user.id)
+    if deleted is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Body analysis not found")
+    if deleted.photo_url:
+        background_tasks.add_task(gcs_uploader.delete_files, [deleted.photo_url])
+    return {"success": True, "message": "Body analysis deleted"}
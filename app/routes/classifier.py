@@ -17,10 +17,10 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from pydantic import BaseModel
 import asyncio
 
-from ..services import ai
+from ..services import ai, rate_limit
 from .. import models, crud
 from ..database import get_db
-from ..firebase_auth import get_current_user_firebase
+from ..firebase_auth import get_current_user_firebase, UserSnapshot
 from sqlalchemy.orm import Session
 
 router = APIRouter(prefix="/classifier", tags=["classifier"])
@@ -53,7 +53,7 @@ class ImageClassificationResponse(BaseModel):
 @router.post("/classify-image", response_model=ImageClassificationResponse)
 async def classify_clothing_image(
     request: ImageClassificationRequest,
-    current_user: models.User = Depends(get_current_user_firebase),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
     db: Session = Depends(get_db)
 ):
     """
@@ -86,7 +86,7 @@ async def classify_clothing_image(
 @router.post("/classify-image-file", response_model=ImageClassificationResponse)
 async def classify_clothing_image_file(
     files: List[UploadFile] = File(...),
-    current_user: models.User = Depends(get_current_user_firebase),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
     db: Session = Depends(get_db)
 ):
     """
@@ -105,6 +105,12 @@ async def classify_clothing_image_file(
         # Read file content
         file_content = await file.read()
         
+        if not await rate_limit.wait_for_provider_slot():
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="AI classification is busy right now. Please try again in a few seconds."
+            )
+        
         # Use the AI classification function directly
         classification_result = ai.ai_classify_clothing(file_content)
         
@@ -87,7 +87,7 @@ async def firebase_login(
 
 @router.get("/me")
 async def get_current_user_info(
-    current_user = Depends(firebase_auth.get_current_user_firebase)
+    current_user = Depends(firebase_auth.get_current_user_orm)
 ):
     """
     Get current user information (Firebase version)
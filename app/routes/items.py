@@ -1,21 +1,153 @@
-from typing import List
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Response, UploadFile, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .. import models, schemas, crud, firebase_auth
-from ..database import get_db
+from .. import models, schemas, crud_async, firebase_auth
+from ..database import get_async_db
+from ..services import embeddings, vector_index
+from ..services.image_compression import ImageCompressionService
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _split_csv(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()] if value else []
+
 
 @router.get(
     "/",
     response_model=List[schemas.ClothingItem]
 )
-def read_items(
+async def read_items(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(firebase_auth.get_current_user_firebase)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, description=f"Id of the last item of the previous page (value of {NEXT_CURSOR_HEADER})"),
+    category: Optional[str] = None,
+    color: Optional[str] = None,
+    tags: Optional[str] = Query(None, description="Comma-separated, item must have all of them"),
+    occasion: Optional[str] = None,
+    weather: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return (id is always included)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
+):
+    """
+    Wardrobe items ordered by id. Pass the `X-Next-Cursor` response header back
+    as `cursor` to get the next page; the header is absent on the last page.
+    """
+    selected_fields = None
+    if fields:
+        requested = _split_csv(fields)
+        unknown = [field for field in requested if field not in crud_async.CLOTHING_ITEM_FIELDS]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+        selected_fields = ["id"] + [field for field in requested if field != "id"]
+    
+    # Fetch one extra row to know whether there is a next page
+    items = await crud_async.get_clothing_items_page(
+        db,
+        current_user.id,
+        limit=limit + 1,
+        after_id=cursor,
+        skip=skip,
+        category=category,
+        color=color,
+        tags=_split_csv(tags),
+        occasion=occasion,
+        weather=weather,
+        fields=selected_fields
+    )
+    
+    headers = {}
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        headers[NEXT_CURSOR_HEADER] = str(last["id"] if selected_fields else last.id)
+    
+    if selected_fields:
+        # Sparse rows don't fit the full response model
+        return JSONResponse(content=jsonable_encoder(items), headers=headers)
+    
+    response.headers.update(headers)
+    return items
+
+
+async def _query_embedding(file: Optional[UploadFile], text: Optional[str]) -> List[float]:
+    """CLIP embedding of an uploaded photo or a text description (CPU work runs off the event loop)"""
+    if file is not None:
+        image_bytes = await file.read()
+        is_valid, error_msg = ImageCompressionService.validate_image(image_bytes)
+        if not is_valid:
+            raise HTTPException(status_code=400, detail=f"Invalid image: {error_msg}")
+        return await asyncio.to_thread(embeddings.embed_image_bytes, image_bytes)
+    if text and text.strip():
+        return await asyncio.to_thread(embeddings.embed_text, text.strip())
+    raise HTTPException(status_code=400, detail="Provide a photo or a text description")
+
+
+@router.get(
+    "/{item_id}/similar",
+    response_model=List[schemas.ClothingItemMatch]
+)
+async def similar_items(
+    item_id: int,
+    k: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
+):
+    """Items in the user's wardrobe that look most like the given one"""
+    item = await crud_async.get_clothing_item_by_id(db, item_id, current_user.id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    embedding = await vector_index.get_item_embedding(db, item_id, current_user.id)
+    if embedding is None:
+        raise HTTPException(status_code=409, detail="Item embedding is not ready yet, try again shortly")
+    
+    matches = await vector_index.similar_items(db, current_user.id, embedding, k, exclude_id=item_id)
+    return [{"item": match, "score": 1 - distance} for match, distance in matches]
+
+
+@router.post(
+    "/match",
+    response_model=List[schemas.ClothingItemMatch]
+)
+async def match_wardrobe(
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    k: int = Form(10),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
+):
+    """Wardrobe items matching a photo or a text description (e.g. "black leather jacket")"""
+    embedding = await _query_embedding(file, text)
+    matches = await vector_index.similar_items(db, current_user.id, embedding, max(1, min(k, 50)))
+    return [{"item": match, "score": 1 - distance} for match, distance in matches]
+
+
+@router.post(
+    "/match/catalog",
+    response_model=List[schemas.CatalogMatch]
+)
+async def match_catalog(
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    k: int = Form(10),
+    gender: Optional[str] = Form(None),
+    piece_type: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: firebase_auth.UserSnapshot = Depends(firebase_auth.get_current_user_firebase)
 ):
-    return crud.get_clothing_items_by_owner(db, current_user.id, skip, limit) 
\ No newline at end of file
+    """Catalog products (classified.csv) matching a photo or a text description"""
+    embedding = await _query_embedding(file, text)
+    matches = await vector_index.search_catalog(db, embedding, max(1, min(k, 50)), gender=gender, piece_type=piece_type)
+    return [{**product, "score": 1 - distance} for product, distance in matches]
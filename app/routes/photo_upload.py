@@ -6,10 +6,10 @@ from typing import Dict, Any, List
 import os
 
 from ..gcs_uploader import gcs_uploader
-from ..firebase_auth import get_current_user_firebase
-from ..models import User
+from ..firebase_auth import get_current_user_firebase, UserSnapshot
 from ..database import SessionLocal
 from ..services.image_compression import ImageCompressionService
+from ..services import rate_limit
 
 logger = logging.getLogger(__name__)
 
@@ -40,7 +40,7 @@ MAX_FILE_SIZE = 10 * 1024 * 1024
 @router.post("/upload-photo", response_model=Dict[str, str])
 async def upload_photo(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user_firebase),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
@@ -155,7 +155,7 @@ async def upload_photo(
 @router.delete("/photo")
 async def delete_photo(
     file_url: str,
-    current_user: User = Depends(get_current_user_firebase),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
@@ -204,7 +204,7 @@ async def delete_photo(
 @router.post("/upload-and-classify", response_model=Dict[str, Any])
 async def upload_and_classify_photo(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user_firebase),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
@@ -302,7 +302,11 @@ async def upload_and_classify_photo(
         # Classify the image using AI (this will use AI-optimized compression internally)
         try:
             from ..services import ai
-            classification_result = ai.ai_classify_clothing(file_content)
+            if await rate_limit.wait_for_provider_slot():
+                classification_result = ai.ai_classify_clothing(file_content)
+            else:
+                logger.warning("AI provider rate limit reached, skipping classification")
+                classification_result = None
             
             if not classification_result or "error" in classification_result:
                 logger.warning("AI classification failed, returning upload URL only")
@@ -369,7 +373,7 @@ async def upload_and_classify_photo(
 @router.post("/bulk-upload", response_model=Dict[str, Any])
 async def bulk_upload_images(
     files: List[UploadFile] = File(...),
-    current_user: User = Depends(get_current_user_firebase),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
@@ -462,7 +466,7 @@ async def bulk_upload_images(
 @router.get("/bulk-status/{batch_id}", response_model=Dict[str, Any])
 async def get_bulk_upload_status(
     batch_id: str,
-    current_user: User = Depends(get_current_user_firebase),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
     db: Session = Depends(get_db)
 ) -> Dict[str, Any]:
     """
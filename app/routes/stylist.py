@@ -1,16 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 import google.generativeai as genai
+import asyncio
+import logging
 import os
 import json
 import re
 
-from ..database import get_db
-from ..firebase_auth import get_current_user_firebase
-from ..models import User, ClothingItem
+from ..database import get_async_db
+from .. import crud_async
+from ..firebase_auth import get_current_user_firebase, UserSnapshot
+from ..models import ClothingItem
 from ..schemas import ClothingItem as ClothingItemSchema
+from ..services import outfit_cache, outfit_engine, wardrobe_cache
+from ..services.outfit_engine import OutfitContext, ScoredOutfit, get_weather_tags, temperature_band
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/stylist", tags=["stylist"])
 
@@ -74,6 +81,8 @@ class OutfitResponse(BaseModel):
     outfit: OutfitSuggestion
     available_items: List[str]
     message: str
+    alternatives: List[OutfitSuggestion] = []
+    cached: bool = False
 
 # Configure Gemini AI
 def get_gemini_model():
@@ -87,54 +96,63 @@ def get_gemini_model():
     genai.configure(api_key=api_key)
     return genai.GenerativeModel('gemini-2.0-flash')
 
-def get_user_clothing_items_for_prompt(user_id: int, db: Session) -> str:
-    """Get user's clothing items formatted for AI prompt"""
-    items = db.query(ClothingItem).filter(ClothingItem.owner_id == user_id).all()
-    
-    if not items:
-        return "No clothing items found for this user."
-    
-    formatted_items = []
-    for item in items:
-        item_info = f"- {item.name}"
-        if item.brand:
-            item_info += f" by {item.brand}"
-        if item.color:
-            item_info += f" (Color: {item.color})"
-        if item.category:
-            item_info += f" [Category: {item.category}]"
-        if item.material:
-            item_info += f" [Material: {item.material}]"
-        if item.description:
-            item_info += f" - {item.description}"
-        
-        formatted_items.append(item_info)
-    
-    return "\n".join(formatted_items)
+def filter_matching_items(items, occasions: Optional[List[str]], weather_tags: Optional[List[str]]) -> list:
+    """Items tagged with any of `occasions` and any of `weather_tags` (empty filters are skipped)"""
+    occasions = set(occasions or [])
+    weather_tags = set(weather_tags or [])
+    return [
+        item for item in items
+        if (not occasions or occasions & set(item.occasions or []))
+        and (not weather_tags or weather_tags & set(item.weather_suitability or []))
+    ]
 
-def find_clothing_item_by_name(name: str, items: List[ClothingItem]) -> Optional[ClothingItem]:
-    """Find a clothing item by name (case-insensitive, partial match)"""
-    if not name:
-        return None
-    
-    name_lower = name.lower()
-    
-    # First try exact match
-    for item in items:
-        if item.name.lower() == name_lower:
-            return item
-    
-    # Then try partial match
-    for item in items:
-        if name_lower in item.name.lower() or item.name.lower() in name_lower:
-            return item
-    
-    return None
+class WardrobeIndex:
+    """Per-request lookup tables: item by id and items by outfit slot"""
 
-def get_items_by_category(items: List[ClothingItem], categories: List[str]) -> List[ClothingItem]:
-    return [item for item in items if item.category and item.category.lower() in [cat.lower() for cat in categories]]
+    def __init__(self, items: List[ClothingItem]):
+        self.by_id = {item.id: item for item in items}
+        self.slot_by_id = {}
+        self.by_slot = {slot: [] for slot in outfit_engine.SLOT_KEYWORDS}
+        for item in items:
+            slot = outfit_engine.slot_of(item.category)
+            if slot:
+                self.slot_by_id[item.id] = slot
+                self.by_slot[slot].append(item)
+
+    def resolve(self, item_id, slot: str) -> Optional[ClothingItem]:
+        """Item the model picked for `slot`; ids that are unknown or in another slot are ignored"""
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        if self.slot_by_id.get(item_id) != slot:
+            return None
+        return self.by_id[item_id]
+
+    def first(self, slot: str) -> Optional[ClothingItem]:
+        return self.by_slot[slot][0] if self.by_slot[slot] else None
+
+def covers_basic_outfit(items: List[ClothingItem]) -> bool:
+    slots = {outfit_engine.slot_of(item.category) for item in items}
+    return {"top", "bottom", "shoes"} <= slots
+
+# Gemini structured output: the model answers with wardrobe item ids
+OUTFIT_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "hat": {"type": "INTEGER", "nullable": True},
+        "top": {"type": "INTEGER"},
+        "bottom": {"type": "INTEGER"},
+        "shoes": {"type": "INTEGER"},
+        "accessories": {"type": "ARRAY", "items": {"type": "INTEGER"}},
+        "styling_tips": {"type": "STRING"},
+    },
+    "required": ["top", "bottom", "shoes", "accessories", "styling_tips"],
+}
 
 def convert_orm_to_schema(item: ClothingItem) -> ClothingItemSchema:
+    if isinstance(item, ClothingItemSchema):  # already serialised (wardrobe snapshot)
+        return item
     return ClothingItemSchema(
         id=item.id,
         owner_id=item.owner_id,
@@ -159,16 +177,201 @@ def convert_orm_to_schema(item: ClothingItem) -> ClothingItemSchema:
         updated_at=item.updated_at
     )
 
+def outfit_to_suggestion(outfit: ScoredOutfit, styling_tips: str) -> OutfitSuggestion:
+    return OutfitSuggestion(
+        hat=convert_orm_to_schema(outfit.hat) if outfit.hat else None,
+        top=convert_orm_to_schema(outfit.top) if outfit.top else None,
+        bottom=convert_orm_to_schema(outfit.bottom) if outfit.bottom else None,
+        shoes=convert_orm_to_schema(outfit.shoes) if outfit.shoes else None,
+        accessories=[convert_orm_to_schema(item) for item in outfit.accessories],
+        styling_tips=styling_tips
+    )
+
+def generate_styling_tips(outfit: ScoredOutfit, occasion: str, weather_description: str, style_preference: str) -> Optional[str]:
+    """LLM-written tips for an already assembled outfit; None if the model is unavailable"""
+    pieces = "\n".join(
+        f"- {item.name}" + (f" ({item.color})" if item.color else "") + (f" [{item.category}]" if item.category else "")
+        for item in outfit.items
+    )
+    prompt = (
+        f"You are a professional fashion stylist. Write 2-3 sentences of styling advice for this outfit.\n"
+        f"Occasion: {occasion}. Weather: {weather_description}. Style preference: {style_preference}.\n"
+        f"Outfit:\n{pieces}\n"
+        f"Answer with the advice text only."
+    )
+    try:
+        response = get_gemini_model().generate_content(prompt)
+        return response.text.strip() if response and response.text else None
+    except Exception as e:
+        logger.warning(f"Styling tips generation failed: {e}")
+        return None
+
+async def compose_outfit(
+    db: AsyncSession,
+    owner_id: int,
+    occasion: Optional[str],
+    style_preference: Optional[str],
+    mode: str,
+    ai_tips: bool,
+    temperature: Optional[float],
+    weather_conditions: str,
+    weather_description: str,
+    wardrobe_version: Optional[str] = None
+) -> OutfitResponse:
+    """Outfit for the parsed request, built by the local engine or by Gemini"""
+    temp_category = temperature_band(temperature)
+    # Occasion/weather matching on the tag arrays: in memory on the wardrobe snapshot
+    # when it's cached, otherwise in SQL on the GIN-indexed columns. If the tagged
+    # subset can't make a basic outfit, use the whole wardrobe.
+    occasions = [occasion.lower()] if occasion else None
+    weather_tags = get_weather_tags(temp_category, weather_conditions)
+    snapshot = await wardrobe_cache.peek_snapshot(owner_id, wardrobe_version)
+    if snapshot is not None:
+        all_items = filter_matching_items(snapshot.items, occasions, weather_tags)
+    else:
+        all_items = await crud_async.get_clothing_items_matching(db, owner_id, occasions, weather_tags)
+    if not covers_basic_outfit(all_items):
+        if snapshot is None:
+            snapshot = await wardrobe_cache.get_snapshot(db, owner_id, wardrobe_version)
+        all_items = snapshot.items
+
+    if not all_items:
+        raise HTTPException(
+            status_code=404,
+            detail="No clothing items found. Please add some clothes to your wardrobe first."
+        )
+
+    if mode == "engine":
+        context = OutfitContext(
+            occasion=occasion,
+            style=style_preference,
+            temperature=temperature,
+            conditions=weather_conditions
+        )
+        outfits = outfit_engine.assemble_outfits(all_items, context, n=3)
+        best = outfits[0] if outfits else ScoredOutfit()
+        styling_tips = outfit_engine.describe_outfit(best, context)
+        if ai_tips and best.items:
+            styling_tips = await asyncio.to_thread(
+                generate_styling_tips, best, occasion, weather_description, style_preference
+            ) or styling_tips
+
+        return OutfitResponse(
+            outfit=outfit_to_suggestion(best, styling_tips),
+            available_items=[item.name for item in all_items],
+            message=f"Here's your {style_preference} outfit suggestion for {occasion}!",
+            alternatives=[
+                outfit_to_suggestion(outfit, outfit_engine.describe_outfit(outfit, context))
+                for outfit in outfits[1:]
+            ]
+        )
+
+    if snapshot is not None and all_items is snapshot.items:
+        user_items = snapshot.prompt
+    else:
+        user_items = wardrobe_cache.format_wardrobe_prompt(all_items)
+    wardrobe = WardrobeIndex(all_items)
+
+    # Get Gemini model
+    model = get_gemini_model()
+
+    # Create prompt for outfit suggestion
+    prompt = f"""
+    You are a professional fashion stylist. Based on the following clothing items available in this person's wardrobe, suggest a complete outfit.
+
+    Available clothing items (id|category|color|name):
+    {user_items}
+
+    Requirements:
+    - Occasion: {occasion}
+    - Weather: {weather_description}
+    - Style preference: {style_preference}
+
+    Please create a stylish and practical outfit suggestion. Choose items that work well together in terms of color, style, and appropriateness for the occasion and weather.
+    Answer with item ids from the list above only; use null for the hat if none fits.
+    """
+
+    # Generate response with error handling
+    ai_outfit_data = None
+    try:
+        response = await asyncio.to_thread(
+            model.generate_content,
+            prompt,
+            generation_config={
+                "response_mime_type": "application/json",
+                "response_schema": OUTFIT_RESPONSE_SCHEMA,
+            }
+        )
+        ai_outfit_data = json.loads(response.text)
+    except Exception as e:
+        # If AI generation fails, use fallback
+        logger.warning(f"AI outfit selection failed: {e}")
+
+    # Initialize outfit items
+    hat_item = None
+    top_item = None
+    bottom_item = None
+    shoes_item = None
+    accessory_items = []
+    styling_tips = f"Here's a great {style_preference} outfit for {occasion}!"
+
+    # Process AI outfit data if available
+    if ai_outfit_data:
+        hat_item = wardrobe.resolve(ai_outfit_data.get("hat"), "hat")
+        top_item = wardrobe.resolve(ai_outfit_data.get("top"), "top")
+        bottom_item = wardrobe.resolve(ai_outfit_data.get("bottom"), "bottom")
+        shoes_item = wardrobe.resolve(ai_outfit_data.get("shoes"), "shoes")
+        accessory_items = [
+            item for item in (
+                wardrobe.resolve(item_id, "accessories") for item_id in ai_outfit_data.get("accessories") or []
+            ) if item
+        ]
+        styling_tips = ai_outfit_data.get("styling_tips") or styling_tips
+
+    # Fallback: if AI couldn't find suitable items or failed, use the slot index
+    top_item = top_item or wardrobe.first("top")
+    bottom_item = bottom_item or wardrobe.first("bottom")
+    shoes_item = shoes_item or wardrobe.first("shoes")
+
+    if not hat_item and (not ai_outfit_data or ai_outfit_data.get("hat")):
+        hat_item = wardrobe.first("hat")
+
+    if not accessory_items:
+        accessory_items = wardrobe.by_slot["accessories"][:2]  # Take up to 2 accessories
+
+    # Create the outfit
+    outfit = OutfitSuggestion(
+        hat=convert_orm_to_schema(hat_item) if hat_item else None,
+        top=convert_orm_to_schema(top_item) if top_item else None,
+        bottom=convert_orm_to_schema(bottom_item) if bottom_item else None,
+        shoes=convert_orm_to_schema(shoes_item) if shoes_item else None,
+        accessories=[convert_orm_to_schema(item) for item in accessory_items],
+        styling_tips=styling_tips
+    )
+
+    # Get list of available items for reference
+    available_items = [item.name for item in all_items]
+
+    return OutfitResponse(
+        outfit=outfit,
+        available_items=available_items,
+        message=f"Here's your {style_preference} outfit suggestion for {occasion}!"
+    )
+
 @router.post("/suggest-outfit", response_model=OutfitResponse)
 async def suggest_outfit(
     occasion: Optional[str] = "casual", 
     weather: Optional[str] = "mild",
     style_preference: Optional[str] = "casual",
-    current_user: User = Depends(get_current_user_firebase),
-    db: Session = Depends(get_db)
+    mode: Literal["engine", "llm"] = Query("engine", description="engine: local scoring; llm: Gemini picks the items"),
+    ai_tips: bool = Query(False, description="In engine mode, let Gemini write the styling tips (slower; template tips otherwise)"),
+    another: bool = Query(False, description="Skip the cached suggestion and return a different one"),
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Generate outfit suggestions based on user's clothing items
+    Generate outfit suggestions based on user's clothing items.
+    By default outfits are assembled and ranked locally (outfit_engine); the LLM only writes tips.
     """
     try:
         # Validate weather parameter
@@ -182,169 +385,41 @@ async def suggest_outfit(
         temperature, weather_conditions = parse_weather_safely(weather)
         
         # Create a descriptive weather string for the AI
+        temp_category = temperature_band(temperature)
         if temperature is not None:
             temp_desc = f"{temperature:.1f}°C"
-            if temperature < 5:
-                temp_category = "very cold"
-            elif temperature < 15:
-                temp_category = "cold"
-            elif temperature < 25:
-                temp_category = "mild"
-            else:
-                temp_category = "warm"
             weather_description = f"{temp_desc} ({temp_category}), {weather_conditions}"
         else:
             weather_description = weather_conditions
         
-        # Get user's clothing items
-        user_items = get_user_clothing_items_for_prompt(current_user.id, db)
-        
-        if "No clothing items found" in user_items:
-            raise HTTPException(
-                status_code=404,
-                detail="No clothing items found. Please add some clothes to your wardrobe first."
-            )
-        
-        # Get actual clothing items for lookup
-        all_items = db.query(ClothingItem).filter(ClothingItem.owner_id == current_user.id).all()
-        
-        if not all_items:
-            raise HTTPException(
-                status_code=404,
-                detail="No clothing items found. Please add some clothes to your wardrobe first."
-            )
-        
-        # Get Gemini model
-        model = get_gemini_model()
-        
-        # Create prompt for outfit suggestion
-        prompt = f"""
-        You are a professional fashion stylist. Based on the following clothing items available in this person's wardrobe, suggest a complete outfit.
-
-        Available clothing items:
-        {user_items}
-
-        Requirements:
-        - Occasion: {occasion}
-        - Weather: {weather_description}
-        - Style preference: {style_preference}
-
-        Please create a stylish and practical outfit suggestion. Choose items that work well together in terms of color, style, and appropriateness for the occasion and weather.
-
-        Return your response in the following JSON format:
-        {{
-            "hat": "specific hat item name if available, or null",
-            "top": "specific top item name (required)",
-            "bottom": "specific bottom item name (required)", 
-            "shoes": "specific shoes item name (required)",
-            "accessories": ["list of specific accessory item names"],
-            "styling_tips": "specific styling advice for this outfit combination"
-        }}
-
-        Important: Only use items that are actually available in the wardrobe list above. Be specific with item names and match them exactly.
-        """
-        
-        # Generate response with error handling
-        try:
-            response = model.generate_content(prompt)
-            response_text = response.text.strip() if response and response.text else ""
-        except Exception as e:
-            # If AI generation fails, use fallback
-            response_text = ""
-            print(f"AI generation failed: {e}")
-        
-        # Try to find JSON in the response
-        ai_outfit_data = None
-        try:
-            if response_text:
-                # Look for JSON content between ```json and ``` or just find the JSON object
-                if "```json" in response_text:
-                    json_start = response_text.find("```json") + 7
-                    json_end = response_text.find("```", json_start)
-                    if json_end == -1:
-                        json_end = len(response_text)
-                    json_text = response_text[json_start:json_end].strip()
-                elif "{" in response_text:
-                    json_start = response_text.find("{")
-                    json_end = response_text.rfind("}") + 1
-                    json_text = response_text[json_start:json_end]
-                else:
-                    raise ValueError("No JSON found in response")
-                
-                ai_outfit_data = json.loads(json_text)
-            else:
-                raise ValueError("Empty AI response")
-        except (json.JSONDecodeError, ValueError, Exception) as e:
-            print(f"JSON parsing failed: {e}")
-            ai_outfit_data = None
-        
-        # Initialize outfit items
-        hat_item = None
-        top_item = None
-        bottom_item = None
-        shoes_item = None
-        accessory_items = []
-        styling_tips = f"Here's a great {style_preference} outfit for {occasion}!"
-        
-        # Process AI outfit data if available
-        if ai_outfit_data:
-            # Convert AI suggestions to actual ClothingItem objects
-            if ai_outfit_data.get("hat"):
-                hat_item = find_clothing_item_by_name(ai_outfit_data["hat"], all_items)
-            
-            top_item = find_clothing_item_by_name(ai_outfit_data.get("top", ""), all_items)
-            bottom_item = find_clothing_item_by_name(ai_outfit_data.get("bottom", ""), all_items)
-            shoes_item = find_clothing_item_by_name(ai_outfit_data.get("shoes", ""), all_items)
-            
-            # Find accessories
-            for acc_name in ai_outfit_data.get("accessories", []):
-                acc_item = find_clothing_item_by_name(acc_name, all_items)
-                if acc_item:
-                    accessory_items.append(acc_item)
-            
-            # Use AI styling tips if available
-            styling_tips = ai_outfit_data.get("styling_tips", styling_tips)
-        
-        # Fallback: if AI couldn't find suitable items or failed, use category-based selection
-        if not top_item:
-            tops = get_items_by_category(all_items, ['top', 'shirt', 'blouse', 't-shirt', 'sweater', 'hoodie'])
-            top_item = tops[0] if tops else None
-        
-        if not bottom_item:
-            bottoms = get_items_by_category(all_items, ['bottom', 'pants', 'jeans', 'skirt', 'shorts'])
-            bottom_item = bottoms[0] if bottoms else None
-        
-        if not shoes_item:
-            shoes = get_items_by_category(all_items, ['shoes', 'footwear', 'sneakers', 'boots', 'sandals', 'heels'])
-            shoes_item = shoes[0] if shoes else None
-        
-        if not hat_item and (not ai_outfit_data or ai_outfit_data.get("hat")):
-            hats = get_items_by_category(all_items, ['hat', 'cap'])
-            hat_item = hats[0] if hats else None
-        
-        if not accessory_items:
-            accessories = get_items_by_category(all_items, ['accessories', 'accessory'])
-            accessory_items = accessories[:2]  # Take up to 2 accessories
-        
-        # Create the outfit
-        outfit = OutfitSuggestion(
-            hat=convert_orm_to_schema(hat_item) if hat_item else None,
-            top=convert_orm_to_schema(top_item) if top_item else None,
-            bottom=convert_orm_to_schema(bottom_item) if bottom_item else None,
-            shoes=convert_orm_to_schema(shoes_item) if shoes_item else None,
-            accessories=[convert_orm_to_schema(item) for item in accessory_items],
-            styling_tips=styling_tips
+        # Repeat requests with the same wardrobe and context come from the cache;
+        # another=true asks for a different suggestion instead
+        wardrobe_version = await wardrobe_cache.get_version(current_user.id)
+        cache_key = outfit_cache.cache_key(
+            current_user.id, wardrobe_version,
+            mode, occasion, style_preference, temperature, weather_conditions, ai_tips
         )
+        cached = await outfit_cache.get(cache_key)
+        if cached and not another:
+            await outfit_cache.record(hit=True)
+            return OutfitResponse.parse_obj({**cached, "cached": True})
+        if cached and another and cached.get("alternatives"):
+            # Engine results carry ranked alternatives: rotate instead of recomputing
+            rotated = outfit_cache.rotate(cached)
+            await outfit_cache.put(cache_key, rotated)
+            await outfit_cache.record(hit=True)
+            return OutfitResponse.parse_obj({**rotated, "cached": True})
+        await outfit_cache.record(hit=False)
         
-        # Get list of available items for reference
-        available_items = [item.name for item in all_items]
-        
-        return OutfitResponse(
-            outfit=outfit,
-            available_items=available_items,
-            message=f"Here's your {style_preference} outfit suggestion for {occasion}!"
+        response = await compose_outfit(
+            db, current_user.id, occasion, style_preference, mode, ai_tips,
+            temperature, weather_conditions, weather_description, wardrobe_version
         )
+        await outfit_cache.put(cache_key, response.dict())
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -353,38 +428,38 @@ async def suggest_outfit(
 
 @router.get("/my-wardrobe")
 async def get_my_wardrobe(
-    current_user: User = Depends(get_current_user_firebase),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user_firebase),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's clothing items organized by category"""
-    items = db.query(ClothingItem).filter(ClothingItem.owner_id == current_user.id).all()
+    snapshot = await wardrobe_cache.get_snapshot(db, current_user.id)
     
-    if not items:
+    if not snapshot.items:
         raise HTTPException(
             status_code=404,
             detail="No clothing items found. Please add some clothes to your wardrobe first."
         )
     
-    # Organize by category
-    wardrobe = {}
-    for item in items:
-        category = item.category or "Other"
-        if category not in wardrobe:
-            wardrobe[category] = []
-        
-        wardrobe[category].append({
-            "id": item.id,
-            "name": item.name,
-            "brand": item.brand,
-            "color": item.color,
-            "size": item.size,
-            "material": item.material,
-            "description": item.description
-        })
+    # Organized by category once per wardrobe version
+    wardrobe = {
+        category: [
+            {
+                "id": item.id,
+                "name": item.name,
+                "brand": item.brand,
+                "color": item.color,
+                "size": item.size,
+                "material": item.material,
+                "description": item.description
+            }
+            for item in items
+        ]
+        for category, items in snapshot.category_items().items()
+    }
     
     return {
         "wardrobe": wardrobe,
-        "total_items": len(items),
+        "total_items": len(snapshot.items),
         "categories": list(wardrobe.keys())
     }
 
@@ -403,31 +478,16 @@ async def get_forecast_outfits(
         raise HTTPException(status_code=400, detail="Longitude must be between -180 and 180")
     
     try:
-        # Import here to avoid circular imports
-        from ..services.weather import get_cached_weather_forecast_by_coordinates, fetch_weather_forecast_by_coordinates
-        from ..services.ai import ai_generate_daily_outfits
-        
-        # Get weather forecast
-        forecast_data = get_cached_weather_forecast_by_coordinates(lat, lon, days)
-        if not forecast_data:
-            forecast_data = fetch_weather_forecast_by_coordinates(lat, lon, days)
-        
-        if not forecast_data:
+        # Shared per area/day/occasion; only uncached days reach the LLM
+        from ..services import forecast_outfits
+
+        result = await asyncio.to_thread(forecast_outfits.get_forecast_outfits, lat, lon, days, occasion)
+        if not result:
             raise HTTPException(
                 status_code=503,
                 detail="Weather forecast service is not available. Try again later."
             )
-        
-        # For now, we'll generate recommendations without user-specific items
-        # This can be enhanced later to include user authentication and their wardrobe
-        user_items = []
-        
-        # Generate outfit recommendations
-        outfit_recommendations = ai_generate_daily_outfits(
-            forecast_data=forecast_data,
-            user_items=user_items,
-            occasion=occasion
-        )
+        forecast_data, outfit_recommendations = result
         
         return {
             "status": "success",
@@ -436,6 +496,8 @@ async def get_forecast_outfits(
             "message": f"Generated outfit recommendations for {days} days in {forecast_data.get('city', 'your location')}"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error generating forecast outfits: {str(e)}")
         import traceback
@@ -13,9 +13,9 @@ import time
 import asyncio
 
 import torch
-from transformers import CLIPProcessor, CLIPModel   # загружается один раз
 
 from ..gcs_uploader import gcs_uploader
+from ..services.embeddings import get_clip   # CLIP загружается один раз, общий с эмбеддингами
 
 logger = logging.getLogger(__name__)
 
@@ -28,9 +28,6 @@ MODEL = "cuuupid/idm-vton:0513734a452173b8173e907e3a59d19a36266e55b48528559432bd
 
 router = APIRouter(prefix="/visual-try-on", tags=["visual-try-on"])
 
-# ---- CLIP init (один раз) ----
-clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
 CANDIDATES = {
     "upper_body":  "photo of an upper-body garment (tops, t-shirt, shirt, hoodie, sweater, jacket)",
     "lower_body":  "photo of a lower-body garment (pants, jeans, trousers, shorts, skirt)",
@@ -97,6 +94,7 @@ def shape_hint(img: Image.Image) -> Category | None:
 # ---- zero-shot CLIP ----
 def clip_guess(img: Image.Image) -> Tuple[Category, Dict[str, float]]:
     texts = list(CANDIDATES.values())
+    clip_model, clip_processor = get_clip()
     inputs = clip_processor(text=texts, images=img, return_tensors="pt", padding=True)
     with torch.no_grad():
         outputs = clip_model(**inputs)
@@ -1,17 +1,12 @@
 from fastapi import APIRouter, HTTPException, Query
-from ..services.weather import (
-    get_cached_weather, fetch_weather, 
-    get_cached_weather_by_coordinates, fetch_weather_by_coordinates,
-    get_cached_weather_forecast_by_coordinates, fetch_weather_forecast_by_coordinates
-)
+from ..services.weather import ALMATY_COORDS
+from ..services.weather_async import weather_by_coordinates, weather_forecast_by_coordinates
 
 router = APIRouter()
 
 @router.get("/almaty")
 async def get_almaty_weather():
-    weather_data = get_cached_weather()
-    if not weather_data:
-        weather_data = fetch_weather()
+    weather_data = await weather_by_coordinates(ALMATY_COORDS["lat"], ALMATY_COORDS["lon"])
     
     if not weather_data:
         raise HTTPException(
@@ -33,9 +28,7 @@ async def get_weather_by_coordinates(
     if not (-180 <= lon <= 180):
         raise HTTPException(status_code=400, detail="Longitude must be between -180 and 180")
     
-    weather_data = get_cached_weather_by_coordinates(lat, lon)
-    if not weather_data:
-        weather_data = fetch_weather_by_coordinates(lat, lon)
+    weather_data = await weather_by_coordinates(lat, lon)
     
     if not weather_data:
         raise HTTPException(
@@ -58,9 +51,7 @@ async def get_weather_forecast_by_coordinates(
     if not (-180 <= lon <= 180):
         raise HTTPException(status_code=400, detail="Longitude must be between -180 and 180")
     
-    forecast_data = get_cached_weather_forecast_by_coordinates(lat, lon, days)
-    if not forecast_data:
-        forecast_data = fetch_weather_forecast_by_coordinates(lat, lon, days)
+    forecast_data = await weather_forecast_by_coordinates(lat, lon, days)
     
     if not forecast_data:
         raise HTTPException(
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, validator
 from typing import List, Optional
 from datetime import datetime
 
@@ -48,6 +48,65 @@ class ClothingItem(ClothingItemBase):
     class Config:
         orm_mode = True
 
+def _reject_null(cls, value, field):
+    # Optional only so the field can be omitted; an explicit null would violate
+    # NOT NULL (name, store_name) or break code that expects a list (tag columns)
+    if value is None:
+        raise ValueError(f"{field.name} cannot be null")
+    return value
+
+class ClothingItemUpdate(BaseModel):
+    """Partial update (PATCH): only the fields sent by the client are written"""
+    name:        Optional[str] = None
+    brand:       Optional[str] = None
+    category:    Optional[str] = None
+    gender:      Optional[str] = None
+    color:       Optional[str] = None
+    size:        Optional[str] = None
+    material:    Optional[str] = None
+    description: Optional[str] = None
+
+    image_url:   Optional[str] = None
+    store_name:  Optional[str] = None
+    store_url:   Optional[str] = None
+    product_url: Optional[str] = None
+    price:       Optional[float] = None
+
+    tags:                Optional[List[str]] = None
+    occasions:           Optional[List[str]] = None
+    weather_suitability: Optional[List[str]] = None
+    available:           Optional[bool] = None
+
+    _not_null = validator(
+        "name", "store_name", "tags", "occasions", "weather_suitability", pre=True, allow_reuse=True
+    )(_reject_null)
+
+class ClothingItemBulkUpdate(BaseModel):
+    """Fields to set on every item in `item_ids`; omitted fields are left unchanged"""
+    item_ids:            List[int]
+    category:            Optional[str] = None
+    available:           Optional[bool] = None
+    tags:                Optional[List[str]] = None
+    occasions:           Optional[List[str]] = None
+    weather_suitability: Optional[List[str]] = None
+
+    _not_null = validator("tags", "occasions", "weather_suitability", pre=True, allow_reuse=True)(_reject_null)
+
+class ClothingItemMatch(BaseModel):
+    """Wardrobe item found by embedding similarity (score = cosine similarity)"""
+    item:  ClothingItem
+    score: float
+
+class CatalogMatch(BaseModel):
+    name:        str
+    price:       Optional[float] = None
+    image_url:   Optional[str] = None
+    product_url: str
+    gender:      Optional[str] = None
+    piece_type:  Optional[str] = None
+    main_color:  Optional[str] = None
+    score:       float
+
 # === Firebase User Schemas ===
 class FirebaseUserLogin(BaseModel):
     uid: str
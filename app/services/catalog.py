@@ -0,0 +1,397 @@
+"""
+In-memory index over the product catalog used by body-analysis recommendations.
+Everything that doesn't depend on the request is computed once at load time:
+normalised categorical codes, row-index arrays per gender and piece type, RGB
+colour vectors and palette tags.
+
+The catalog is read from the versioned columnar store written by build_catalog.py
+and falls back to classified.csv. The store is memory-mapped, item payloads
+included (one UTF-8 blob plus offsets), so all workers share the pages and item
+dicts are only built for the rows a request returns.
+"""
+import os
+import ast
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+CSV_FILE_PATH = os.path.join(PROJECT_ROOT, "classified.csv")
+
+# Columnar store written by build_catalog.py: <dir>/<version>/*.npy + CURRENT pointer
+CATALOG_STORE_DIR = os.getenv("CATALOG_STORE_DIR", os.path.join(PROJECT_ROOT, "data", "catalog"))
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", 10))
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+ITEM_TEXT_FILE = "item_text.bin"
+
+# Text fields of the response items, stored per row in this order in ITEM_TEXT_FILE
+ITEM_TEXT_FIELDS = [
+    "name", "image_url", "product_url", "gender", "piece_type", "subtype",
+    "fit", "style", "season", "main_color", "palette_tags",
+]
+
+# Values the body analysis uses -> values stored in the catalog
+GENDER_ALIASES = {
+    "men": "male", "man": "male", "male": "male", "m": "male",
+    "women": "female", "woman": "female", "female": "female", "f": "female",
+}
+
+CATEGORICAL_COLUMNS = ["gender", "piece_type", "subtype", "fit", "style", "season"]
+REQUIRED_COLUMNS = ["name", "price", "image_url", "product_url", "gender", "piece_type", "main_color"]
+
+
+def normalize_gender(gender: Optional[str]) -> Optional[str]:
+    """Catalog gender for an analysis label; None means no gender filter (unisex/unknown)"""
+    if not gender:
+        return None
+    return GENDER_ALIASES.get(str(gender).strip().lower())
+
+
+def hex_to_rgb(value) -> Optional[tuple]:
+    """'#4a6a8c' -> (r, g, b) in 0..1, None if it isn't a hex colour"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lstrip("#")
+    if len(value) == 3:
+        value = "".join(ch * 2 for ch in value)
+    if len(value) != 6:
+        return None
+    try:
+        return tuple(int(value[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
+    except ValueError:
+        return None
+
+
+def parse_tags(value) -> List[str]:
+    """Palette tags are stored as Python literals ("['cool', 'dark']")"""
+    if isinstance(value, (list, tuple)):
+        return [str(tag).strip().lower() for tag in value]
+    if not isinstance(value, str) or not value.strip():
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        parsed = value.split(",")
+    if isinstance(parsed, str):
+        parsed = [parsed]
+    return [str(tag).strip().strip("'\"").lower() for tag in parsed if str(tag).strip()]
+
+
+class StoredItems:
+    """
+    Response item dicts of a store version, decoded row by row from the mapped
+    text blob: cell (row, field) is blob[offsets[row * F + field]:offsets[row * F + field + 1]]
+    """
+
+    def __init__(self, path: str):
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.offsets = load("item_offsets")
+        self.null = load("item_null")
+        self.price = load("item_price")
+        blob_path = os.path.join(path, ITEM_TEXT_FILE)
+        # np.memmap refuses empty files (empty catalog)
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else np.empty(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def __getitem__(self, row: int) -> dict:
+        fields = len(ITEM_TEXT_FIELDS)
+        bounds = self.offsets[row * fields:(row + 1) * fields + 1]
+        null = self.null[row]
+        item = {"price": float(self.price[row])}
+        for field, name in enumerate(ITEM_TEXT_FIELDS):
+            if null[field]:
+                item[name] = None
+            else:
+                item[name] = self.blob[bounds[field]:bounds[field + 1]].tobytes().decode("utf-8")
+        return item
+
+
+def encode_items(items: List[dict]) -> dict:
+    """Item dicts -> the arrays StoredItems reads"""
+    fields = len(ITEM_TEXT_FIELDS)
+    chunks = []
+    offsets = np.zeros(len(items) * fields + 1, dtype=np.int64)
+    null = np.zeros((len(items), fields), dtype=bool)
+    position = 0
+    for row, item in enumerate(items):
+        for field, name in enumerate(ITEM_TEXT_FIELDS):
+            value = item.get(name)
+            if value is None:
+                null[row, field] = True
+            else:
+                encoded = str(value).encode("utf-8")
+                chunks.append(encoded)
+                position += len(encoded)
+            offsets[row * fields + field + 1] = position
+    return {
+        "text": b"".join(chunks),
+        "offsets": offsets,
+        "null": null,
+        "price": np.array([item["price"] for item in items], dtype=np.float64),
+    }
+
+
+class CatalogIndex:
+    """Immutable vectorised view of the catalog; build once, share between requests"""
+
+    def __init__(
+        self,
+        items: Sequence[dict],
+        codes: Dict[str, np.ndarray],
+        categories: Dict[str, List[str]],
+        price: np.ndarray,
+        rgb: np.ndarray,
+        has_color: np.ndarray,
+        palette: np.ndarray,
+        palette_vocab: List[str],
+        version: str = "csv"
+    ):
+        self.version = version
+        self.size = len(items)
+        # Response dicts (fields of body_analysis.ClothingItem): a list for the CSV
+        # fallback, StoredItems (decoded per row) for the columnar store
+        self.items = items
+        # Categorical columns as integer codes + category lists (lower-cased, stripped)
+        self.codes = codes
+        self.categories = categories
+        self.price = price
+        self.rgb = rgb
+        self.has_color = has_color
+        # Palette tags as a (rows x vocab) boolean matrix
+        self.palette = palette
+        self.palette_vocab = palette_vocab
+
+        self.rows_by_gender = self._group_rows("gender")
+        self.rows_by_piece = self._group_rows("piece_type")
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, version: str = "csv") -> "CatalogIndex":
+        return cls(**build_columns(df), version=version)
+
+    @classmethod
+    def from_store(cls, path: str) -> "CatalogIndex":
+        """Load a directory written by build_catalog.py; every column is memory-mapped"""
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        return cls(
+            items=StoredItems(path),
+            codes={column: load(f"code_{column}") for column in CATEGORICAL_COLUMNS},
+            categories=manifest["categories"],
+            price=load("price"),
+            rgb=load("rgb"),
+            has_color=load("has_color"),
+            palette=load("palette"),
+            palette_vocab=manifest["palette_vocab"],
+            version=manifest["version"]
+        )
+
+    def _group_rows(self, column: str) -> Dict[str, np.ndarray]:
+        codes = self.codes[column]
+        return {
+            value: np.flatnonzero(codes == code)
+            for code, value in enumerate(self.categories[column])
+        }
+
+    def code_of(self, column: str, value: Optional[str]) -> int:
+        """Integer code of a value in a categorical column, -1 if unknown"""
+        if value is None:
+            return -1
+        try:
+            return self.categories[column].index(str(value).strip().lower())
+        except ValueError:
+            return -1
+
+    def codes_of(self, column: str, values) -> np.ndarray:
+        codes = [self.code_of(column, value) for value in values or []]
+        return np.array([code for code in codes if code >= 0], dtype=np.int16)
+
+    def rows(self, gender: Optional[str] = None, piece_type: Optional[str] = None) -> np.ndarray:
+        """Row indices for a gender (analysis label or catalog value) and/or piece type"""
+        rows = np.arange(self.size)
+        catalog_gender = normalize_gender(gender)
+        if catalog_gender:
+            rows = self.rows_by_gender.get(catalog_gender, np.empty(0, dtype=np.int64))
+        if piece_type:
+            piece_rows = self.rows_by_piece.get(piece_type.strip().lower(), np.empty(0, dtype=np.int64))
+            rows = np.intersect1d(rows, piece_rows, assume_unique=True)
+        return rows
+
+    def matches(self, column: str, rows: np.ndarray, values) -> np.ndarray:
+        """Boolean mask over `rows`: column value is one of `values`"""
+        return np.isin(self.codes[column][rows], self.codes_of(column, values))
+
+    def has_palette_tag(self, rows: np.ndarray, tag: str) -> np.ndarray:
+        """Boolean mask over `rows`: the product carries palette tag `tag`"""
+        try:
+            column = self.palette_vocab.index(tag)
+        except ValueError:
+            return np.zeros(len(rows), dtype=bool)
+        return np.asarray(self.palette[rows, column], dtype=bool)
+
+    def item(self, row: int) -> dict:
+        return self.items[int(row)]
+
+    def to_items(self, rows) -> List[dict]:
+        return [self.items[int(row)] for row in rows]
+
+
+def build_columns(df: pd.DataFrame) -> dict:
+    """Typed columns of the catalog (shared by the CSV loader and build_catalog.py)"""
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Catalog is missing columns: {missing}")
+
+    df = df.dropna(subset=REQUIRED_COLUMNS).reset_index(drop=True)
+    df = df[pd.to_numeric(df["price"], errors="coerce").notna()].reset_index(drop=True)
+    size = len(df)
+
+    codes, categories = {}, {}
+    for column in CATEGORICAL_COLUMNS:
+        values = df[column] if column in df.columns else pd.Series([""] * size)
+        categorical = pd.Categorical(values.fillna("").astype(str).str.strip().str.lower())
+        codes[column] = np.asarray(categorical.codes, dtype=np.int16)
+        categories[column] = [str(value) for value in categorical.categories]
+
+    rgb = [hex_to_rgb(value) for value in df["main_color"]]
+    has_color = np.array([value is not None for value in rgb], dtype=bool)
+    rgb = np.array([value or (np.nan, np.nan, np.nan) for value in rgb], dtype=np.float32).reshape(-1, 3)
+
+    palette_values = df["palette_tags"] if "palette_tags" in df.columns else pd.Series([None] * size)
+    tags = [parse_tags(value) for value in palette_values]
+    palette_vocab = sorted({tag for row_tags in tags for tag in row_tags})
+    palette = np.zeros((size, len(palette_vocab)), dtype=bool)
+    for row, row_tags in enumerate(tags):
+        for tag in row_tags:
+            palette[row, palette_vocab.index(tag)] = True
+
+    optional = lambda value: None if pd.isna(value) else str(value)
+    items = [
+        {
+            "name": str(row.name),
+            "price": float(row.price),
+            "image_url": str(row.image_url),
+            "product_url": str(row.product_url),
+            "gender": str(row.gender),
+            "piece_type": str(row.piece_type),
+            "subtype": optional(getattr(row, "subtype", None)),
+            "fit": optional(getattr(row, "fit", None)),
+            "style": optional(getattr(row, "style", None)),
+            "season": optional(getattr(row, "season", None)),
+            "main_color": str(row.main_color),
+            "palette_tags": optional(getattr(row, "palette_tags", None)),
+        }
+        for row in df.itertuples(index=False)
+    ]
+
+    return {
+        "items": items,
+        "codes": codes,
+        "categories": categories,
+        "price": pd.to_numeric(df["price"]).to_numpy(dtype=np.float32),
+        "rgb": rgb,
+        "has_color": has_color,
+        "palette": palette,
+        "palette_vocab": palette_vocab,
+    }
+
+
+def write_store(df: pd.DataFrame, root: str = None) -> str:
+    """
+    Write a new catalog version under `root` and switch CURRENT to it atomically.
+    Running workers pick it up on their next version check. Returns the version.
+    """
+    root = root or CATALOG_STORE_DIR
+    columns = build_columns(df)
+    digest = hashlib.sha256(json.dumps(columns["items"], sort_keys=True).encode()).hexdigest()[:12]
+    version = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{digest}"
+    path = os.path.join(root, version)
+    os.makedirs(path, exist_ok=True)
+
+    np.save(os.path.join(path, "price.npy"), columns["price"])
+    np.save(os.path.join(path, "rgb.npy"), columns["rgb"])
+    np.save(os.path.join(path, "has_color.npy"), columns["has_color"])
+    np.save(os.path.join(path, "palette.npy"), columns["palette"])
+    for column, codes in columns["codes"].items():
+        np.save(os.path.join(path, f"code_{column}.npy"), codes)
+    encoded = encode_items(columns["items"])
+    with open(os.path.join(path, ITEM_TEXT_FILE), "wb") as f:
+        f.write(encoded["text"])
+    np.save(os.path.join(path, "item_offsets.npy"), encoded["offsets"])
+    np.save(os.path.join(path, "item_null.npy"), encoded["null"])
+    np.save(os.path.join(path, "item_price.npy"), encoded["price"])
+    with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "rows": len(columns["items"]),
+            "categories": columns["categories"],
+            "palette_vocab": columns["palette_vocab"],
+        }, f, ensure_ascii=False, indent=2)
+
+    pointer = os.path.join(root, CURRENT_FILE)
+    tmp_pointer = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp_pointer, "w") as f:
+        f.write(version)
+    os.replace(tmp_pointer, pointer)
+    return version
+
+
+def _current_store_version() -> Optional[str]:
+    try:
+        with open(os.path.join(CATALOG_STORE_DIR, CURRENT_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+_catalog: Optional[CatalogIndex] = None
+_catalog_lock = threading.Lock()
+_last_check = 0.0
+# CURRENT version the loaded index came from, or failed to load from (the index
+# then reports "csv"); a broken version is only retried once CURRENT moves on
+_loaded_store_version: Optional[str] = None
+
+def _load_catalog() -> CatalogIndex:
+    version = _current_store_version()
+    if version:
+        try:
+            return CatalogIndex.from_store(os.path.join(CATALOG_STORE_DIR, version))
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки каталога {version}: {e}")
+    try:
+        return CatalogIndex.from_dataframe(pd.read_csv(CSV_FILE_PATH))
+    except Exception as e:
+        logger.error(f"❌ Ошибка загрузки каталога: {e}")
+        return CatalogIndex.from_dataframe(pd.DataFrame(columns=REQUIRED_COLUMNS))
+
+def get_catalog() -> CatalogIndex:
+    """
+    The process-wide catalog index. Uses the columnar store when one was built
+    (build_catalog.py) and swaps to a new version without a restart.
+    """
+    global _catalog, _last_check, _loaded_store_version
+    now = time.monotonic()
+    if _catalog is not None and now - _last_check < CATALOG_CHECK_INTERVAL:
+        return _catalog
+
+    with _catalog_lock:
+        _last_check = now
+        version = _current_store_version()
+        if _catalog is None or (version and version != _loaded_store_version):
+            catalog = _load_catalog()
+            logger.info(f"📊 Каталог {catalog.version}: {catalog.size} товаров")
+            _catalog = catalog
+            _loaded_store_version = version
+    return _catalog
@@ -0,0 +1,203 @@
+"""
+Deterministic scoring of catalog products against a body analysis.
+Ranks a gender/piece-type slice of the CatalogIndex with vectorised NumPy
+operations; the LLM (if used at all) only sees the resulting shortlist.
+"""
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .catalog import CatalogIndex, hex_to_rgb
+
+# Relative weight of each signal in the final score
+WEIGHTS = {
+    "color": 3.0,
+    "avoid_color": 3.0,
+    "palette": 1.0,
+    "subtype": 2.0,
+    "fit": 1.5,
+    "style": 1.5,
+    "season": 1.0,
+    "price": 1.0,
+}
+
+DEFAULT_PRICE_RANGE = (20.0, 160.0)
+
+# Colour names the analysis may return (English and Russian) -> RGB 0..255
+COLOR_NAMES = {
+    "black": (0, 0, 0), "white": (255, 255, 255), "ivory": (255, 255, 240), "cream": (255, 253, 208),
+    "grey": (128, 128, 128), "gray": (128, 128, 128), "charcoal": (54, 69, 79), "silver": (192, 192, 192),
+    "navy": (0, 0, 128), "blue": (0, 90, 200), "royal blue": (65, 105, 225), "light blue": (173, 216, 230),
+    "sky blue": (135, 206, 235), "teal": (0, 128, 128), "turquoise": (64, 224, 208), "denim": (21, 96, 189),
+    "red": (220, 20, 60), "burgundy": (128, 0, 32), "maroon": (128, 0, 0), "wine": (114, 47, 55),
+    "pink": (255, 182, 193), "coral": (255, 127, 80), "peach": (255, 218, 185), "blush": (222, 93, 131),
+    "orange": (255, 140, 0), "rust": (183, 65, 14), "terracotta": (204, 78, 92), "mustard": (225, 173, 1),
+    "yellow": (255, 215, 0), "gold": (212, 175, 55), "beige": (245, 245, 220), "camel": (193, 154, 107),
+    "tan": (210, 180, 140), "khaki": (195, 176, 145), "brown": (139, 69, 19), "chocolate": (123, 63, 0),
+    "olive": (128, 128, 0), "green": (34, 139, 34), "emerald": (80, 200, 120), "mint": (152, 255, 152),
+    "sage": (188, 184, 138), "forest green": (34, 139, 34), "purple": (128, 0, 128), "lavender": (230, 230, 250),
+    "lilac": (200, 162, 200), "plum": (142, 69, 133), "violet": (143, 0, 255),
+    "черный": (0, 0, 0), "белый": (255, 255, 255), "серый": (128, 128, 128), "синий": (0, 90, 200),
+    "темно-синий": (0, 0, 128), "голубой": (173, 216, 230), "красный": (220, 20, 60), "бордовый": (128, 0, 32),
+    "розовый": (255, 182, 193), "оранжевый": (255, 140, 0), "желтый": (255, 215, 0), "бежевый": (245, 245, 220),
+    "коричневый": (139, 69, 19), "оливковый": (128, 128, 0), "зеленый": (34, 139, 34), "фиолетовый": (128, 0, 128),
+    "хаки": (195, 176, 145), "бирюзовый": (64, 224, 208), "кремовый": (255, 253, 208), "горчичный": (225, 173, 1),
+}
+
+DARK_MODIFIERS = ("dark", "deep", "темно", "тёмно")
+LIGHT_MODIFIERS = ("light", "pale", "pastel", "светло")
+
+# Analysis style_goal -> catalog styles that suit it
+STYLE_MATCHES = {
+    "casual": ["casual", "sports"],
+    "smart_casual": ["business casual", "classic", "casual"],
+    "office": ["formal", "business casual", "classic"],
+    "street": ["casual", "sports"],
+}
+
+ALL_SEASON_VALUES = ("all", "all-season")
+
+
+def color_to_rgb(name: str) -> Optional[np.ndarray]:
+    """Colour name or hex -> RGB vector in 0..1, None if unknown"""
+    if not name:
+        return None
+    value = str(name).strip().lower().replace("ё", "е")
+    rgb = hex_to_rgb(value) if value.startswith("#") else None
+    if rgb is not None:
+        return np.array(rgb, dtype=np.float32)
+
+    base = COLOR_NAMES.get(value)
+    if base is None:
+        # "navy blue", "dusty pink", "тёмно-зелёный" -> longest known colour inside the phrase
+        known = [color for color in COLOR_NAMES if color in value]
+        if not known:
+            return None
+        base = COLOR_NAMES[max(known, key=len)]
+
+    rgb = np.array(base, dtype=np.float32) / 255.0
+    if value not in COLOR_NAMES:
+        if any(modifier in value for modifier in DARK_MODIFIERS):
+            rgb = rgb * 0.6
+        elif any(modifier in value for modifier in LIGHT_MODIFIERS):
+            rgb = rgb + (1.0 - rgb) * 0.4
+    return rgb
+
+
+def _colors_matrix(names: List[str]) -> np.ndarray:
+    vectors = [color_to_rgb(name) for name in names or []]
+    vectors = [vector for vector in vectors if vector is not None]
+    return np.stack(vectors) if vectors else np.empty((0, 3), dtype=np.float32)
+
+
+def _min_color_distance(rgb: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """Distance (0..1) from each row colour to the closest palette colour"""
+    if not len(palette):
+        return np.full(len(rgb), np.nan, dtype=np.float32)
+    distances = np.linalg.norm(rgb[:, None, :] - palette[None, :, :], axis=-1) / np.sqrt(3)
+    return distances.min(axis=1)
+
+
+def _text_tokens(values) -> set:
+    if isinstance(values, str):
+        values = [values]
+    tokens = set()
+    for value in values or []:
+        tokens.update(re.findall(r"[\w-]+", str(value).lower()))
+    return tokens
+
+
+def _value_match(catalog: CatalogIndex, column: str, rows: np.ndarray, tokens: set) -> np.ndarray:
+    """1 where the row's value (or any word of it) appears in `tokens`"""
+    categories = catalog.categories[column]
+    hits = np.array(
+        [bool(value) and (value in tokens or bool(_text_tokens(value) & tokens)) for value in categories],
+        dtype=np.float32
+    )
+    codes = catalog.codes[column][rows]
+    return hits[codes] if len(hits) else np.zeros(len(rows), dtype=np.float32)
+
+
+def current_season(today: Optional[datetime] = None) -> str:
+    month = (today or datetime.utcnow()).month
+    return {12: "winter", 1: "winter", 2: "winter", 3: "spring", 4: "spring", 5: "spring",
+            6: "summer", 7: "summer", 8: "summer"}.get(month, "fall")
+
+
+def score_rows(
+    catalog: CatalogIndex,
+    rows: np.ndarray,
+    analysis: Dict,
+    piece_type: str,
+    season: Optional[str] = None,
+    price_range: Tuple[float, float] = DEFAULT_PRICE_RANGE
+) -> np.ndarray:
+    """Score of every row in `rows` for this analysis (higher is better)"""
+    if not len(rows):
+        return np.empty(0, dtype=np.float32)
+
+    palette = analysis.get("color_palette", {}) or {}
+    fit_rules = analysis.get("fit_rules", {}) or {}
+    categories = (analysis.get("recommended_categories", {}) or {}).get(piece_type, [])
+    score = np.zeros(len(rows), dtype=np.float32)
+
+    # Colour: close to a best colour is good, close to an avoid colour is bad
+    rgb = catalog.rgb[rows]
+    has_color = catalog.has_color[rows]
+    best = _min_color_distance(rgb, _colors_matrix(palette.get("best_colors")))
+    if not np.all(np.isnan(best)):
+        score += WEIGHTS["color"] * np.where(has_color, 1.0 - np.nan_to_num(best, nan=1.0), 0.0)
+    avoid = _min_color_distance(rgb, _colors_matrix(palette.get("avoid_colors")))
+    if not np.all(np.isnan(avoid)):
+        # Penalise only really close matches (within ~15% of the RGB cube diagonal)
+        closeness = np.clip(1.0 - np.nan_to_num(avoid, nan=1.0) / 0.15, 0.0, 1.0)
+        score -= WEIGHTS["avoid_color"] * np.where(has_color, closeness, 0.0)
+
+    # Palette tags: cool_summer -> 'cool', warm_autumn -> 'warm'
+    temperature = str(palette.get("season", "")).split("_")[0]
+    if temperature in ("cool", "warm"):
+        score += WEIGHTS["palette"] * catalog.has_palette_tag(rows, temperature).astype(np.float32)
+
+    # Recommended subtypes (t-shirt, jeans, ...)
+    score += WEIGHTS["subtype"] * _value_match(catalog, "subtype", rows, _text_tokens(categories) | {c.lower() for c in categories})
+
+    # Fit: recommended cut and "prefer" words count, "avoid" words count against
+    fit_text = fit_rules.get("top_fit" if piece_type == "top" else "bottom_fit", "")
+    prefer_tokens = _text_tokens([fit_text] + list(fit_rules.get("prefer", [])))
+    avoid_tokens = _text_tokens(fit_rules.get("avoid", []))
+    score += WEIGHTS["fit"] * _value_match(catalog, "fit", rows, prefer_tokens)
+    score -= WEIGHTS["fit"] * _value_match(catalog, "fit", rows, avoid_tokens)
+
+    # Style
+    style_goal = analysis.get("style_goal", "casual")
+    score += WEIGHTS["style"] * catalog.matches("style", rows, STYLE_MATCHES.get(style_goal, [style_goal])).astype(np.float32)
+
+    # Season: exact season or all-season items
+    season = (season or current_season()).lower()
+    season_tokens = {season, "autumn" if season == "fall" else season, *ALL_SEASON_VALUES}
+    score += WEIGHTS["season"] * _value_match(catalog, "season", rows, season_tokens)
+
+    # Price band: full score inside, linear decay outside
+    low, high = price_range
+    price = catalog.price[rows]
+    outside = np.maximum(low - price, 0) / max(low, 1.0) + np.maximum(price - high, 0) / max(high, 1.0)
+    score += WEIGHTS["price"] * np.clip(1.0 - outside, 0.0, 1.0)
+
+    return score
+
+
+def rank(
+    catalog: CatalogIndex,
+    analysis: Dict,
+    piece_type: str,
+    k: int,
+    season: Optional[str] = None,
+    price_range: Tuple[float, float] = DEFAULT_PRICE_RANGE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k (rows, scores) for one piece type; ties broken by price then row for stable output"""
+    rows = catalog.rows(gender=analysis.get("gender_label"), piece_type=piece_type)
+    scores = score_rows(catalog, rows, analysis, piece_type, season=season, price_range=price_range)
+    order = np.lexsort((rows, catalog.price[rows], -scores))[:k]
+    return rows[order], scores[order]
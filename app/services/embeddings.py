@@ -0,0 +1,95 @@
+import io
+import os
+import logging
+import threading
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import requests
+from PIL import Image
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from transformers import CLIPModel, CLIPProcessor
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CLIP_MODEL_NAME = os.getenv("CLIP_MODEL_NAME", "openai/clip-vit-base-patch32")
+# Size of the CLIP projection (512 for ViT-B/32); must match the vector columns
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 512))
+
+
+def _resolve_vector_backend() -> str:
+    """
+    "pgvector": vectors live in PostgreSQL (HNSW); "numpy": in-process index files.
+    Explicit rather than detected so importing the models never touches the database;
+    only set pgvector once the embeddings migration has added the vector columns.
+    """
+    backend = os.getenv("VECTOR_BACKEND", "numpy").lower()
+    if backend not in ("pgvector", "numpy"):
+        raise RuntimeError(f"VECTOR_BACKEND must be pgvector or numpy, not {backend!r}")
+    return backend
+
+VECTOR_BACKEND = _resolve_vector_backend()
+PGVECTOR_ENABLED = VECTOR_BACKEND == "pgvector"
+
+_clip = None
+_clip_lock = threading.Lock()
+
+
+def get_clip() -> Tuple["CLIPModel", "CLIPProcessor"]:
+    """
+    Shared CLIP model and processor, loaded on first use.
+    Both visual try-on and the embedding code use this single copy.
+    """
+    global _clip
+    if _clip is None:
+        with _clip_lock:
+            if _clip is None:
+                from transformers import CLIPProcessor, CLIPModel
+                logger.info(f"Loading CLIP model {CLIP_MODEL_NAME}")
+                model = CLIPModel.from_pretrained(CLIP_MODEL_NAME)
+                model.eval()
+                _clip = (model, CLIPProcessor.from_pretrained(CLIP_MODEL_NAME))
+    return _clip
+
+
+def _normalize(features) -> List[float]:
+    features = features / features.norm(dim=-1, keepdim=True)
+    return features[0].tolist()
+
+
+def embed_image(img: Image.Image) -> List[float]:
+    """L2-normalised CLIP image embedding"""
+    import torch
+    model, processor = get_clip()
+    inputs = processor(images=img.convert("RGB"), return_tensors="pt")
+    with torch.no_grad():
+        features = model.get_image_features(**inputs)
+    return _normalize(features)
+
+
+def embed_image_bytes(image_bytes: bytes) -> List[float]:
+    return embed_image(Image.open(io.BytesIO(image_bytes)))
+
+
+def embed_text(text: str) -> List[float]:
+    """L2-normalised CLIP text embedding, comparable with image embeddings"""
+    import torch
+    model, processor = get_clip()
+    inputs = processor(text=[text], return_tensors="pt", padding=True, truncation=True)
+    with torch.no_grad():
+        features = model.get_text_features(**inputs)
+    return _normalize(features)
+
+
+def embed_image_url(url: str, timeout: int = 20) -> Optional[List[float]]:
+    """Download an image and embed it; returns None if it can't be fetched or decoded"""
+    try:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        return embed_image_bytes(response.content)
+    except Exception as e:
+        logger.warning(f"Failed to embed image {url}: {str(e)}")
+        return None
@@ -0,0 +1,183 @@
+"""
+Forecast outfit recommendations shared by everyone in the same area.
+
+/stylist/forecast-outfits is not user-specific, so generated outfits are cached
+per (coordinate cell, date, occasion) together with a fingerprint of the day's
+forecast: an entry is reused until the forecast for that day changes. Requested
+cells are counted, and a beat task regenerates the most popular ones after the
+hourly forecast refresh so their requests are plain cache reads.
+"""
+import os
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from dotenv import load_dotenv
+
+from .outfit_engine import temperature_band
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+FORECAST_CELL_DEG = float(os.getenv("FORECAST_CELL_DEG", 0.1))
+FORECAST_OUTFIT_TTL = int(os.getenv("FORECAST_OUTFIT_TTL", 24 * 3600))
+PRECOMPUTE_CELLS = int(os.getenv("FORECAST_PRECOMPUTE_CELLS", 20))
+PRECOMPUTE_DAYS = 5
+POPULAR_KEY = "forecast_outfit:popular"
+
+_redis = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1, decode_responses=True)
+
+
+def cell_of(lat: float, lon: float) -> Tuple[float, float]:
+    """Centre of the grid cell containing (lat, lon)"""
+    step = FORECAST_CELL_DEG
+    return round(round(lat / step) * step, 4), round(round(lon / step) * step, 4)
+
+
+def _occasion(occasion: Optional[str]) -> str:
+    return (occasion or "casual").strip().lower()
+
+def _day_key(cell: Tuple[float, float], date: str, occasion: str) -> str:
+    return f"forecast_outfit:{cell[0]}:{cell[1]}:{date}:{occasion}"
+
+def _tips_key(cell: Tuple[float, float], occasion: str) -> str:
+    return f"forecast_outfit:{cell[0]}:{cell[1]}:{occasion}:general"
+
+def _fingerprint(day: Dict) -> str:
+    # What the outfit actually depends on, coarsely: temperature bands rather than degrees,
+    # since today's min/max are recomputed from the remaining slots every 3 hours
+    low, high = temperature_band(day.get("temperature_min")), temperature_band(day.get("temperature_max"))
+    return f"{low}|{high}|{day.get('condition')}"
+
+
+def _get_forecast(lat: float, lon: float, days: int, refresh: bool = False) -> Optional[Dict]:
+    from .weather import weather_forecast_by_coordinates, fetch_weather_forecast_by_coordinates
+
+    if refresh:
+        return fetch_weather_forecast_by_coordinates(lat, lon, days)
+    return weather_forecast_by_coordinates(lat, lon, days)
+
+
+def _cached_days(cell, days: List[Dict], occasion: str) -> Dict[str, Dict]:
+    """date -> cached outfit for the days whose forecast hasn't changed"""
+    if not days:
+        return {}
+    try:
+        values = _redis.mget([_day_key(cell, day["date"], occasion) for day in days])
+    except Exception as e:
+        logger.warning(f"Forecast outfit cache read failed: {str(e)}")
+        return {}
+    cached = {}
+    for day, value in zip(days, values):
+        if not value:
+            continue
+        entry = json.loads(value)
+        if entry.get("fingerprint") == _fingerprint(day):
+            cached[day["date"]] = entry["outfit"]
+    return cached
+
+
+def _generate(cell, forecast_data: Dict, days: List[Dict], occasion: str) -> Tuple[Dict[str, Dict], Optional[str]]:
+    """Generate and cache outfits for `days` with one LLM call"""
+    from .ai import ai_generate_daily_outfits
+
+    generated = ai_generate_daily_outfits(
+        forecast_data={**forecast_data, "daily_forecasts": days},
+        user_items=[],
+        occasion=occasion
+    )
+    by_date = {outfit.get("date"): outfit for outfit in generated.get("daily_outfits", [])}
+    general_tips = generated.get("general_tips")
+
+    try:
+        pipe = _redis.pipeline()
+        for day in days:
+            if day["date"] in by_date:
+                entry = {"fingerprint": _fingerprint(day), "outfit": by_date[day["date"]]}
+                pipe.setex(_day_key(cell, day["date"], occasion), FORECAST_OUTFIT_TTL, json.dumps(entry))
+        if general_tips:
+            pipe.setex(_tips_key(cell, occasion), FORECAST_OUTFIT_TTL, general_tips)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Forecast outfit cache write failed: {str(e)}")
+    return by_date, general_tips
+
+
+def get_forecast_outfits(lat: float, lon: float, days: int = 5, occasion: str = "casual") -> Optional[Tuple[Dict, Dict]]:
+    """
+    (forecast_data, outfit_recommendations) for the cell of (lat, lon); only days
+    without a valid cached outfit go to the LLM. None if there is no forecast.
+    """
+    cell = cell_of(lat, lon)
+    occasion = _occasion(occasion)
+    try:
+        _redis.zincrby(POPULAR_KEY, 1, f"{cell[0]},{cell[1]},{occasion}")
+    except Exception:
+        pass
+
+    forecast_data = _get_forecast(cell[0], cell[1], days)
+    if not forecast_data:
+        return None
+
+    daily = forecast_data.get("daily_forecasts", [])
+    outfits = _cached_days(cell, daily, occasion)
+    missing = [day for day in daily if day["date"] not in outfits]
+    general_tips = None
+    if missing:
+        logger.info(f"Generating forecast outfits for {len(missing)} day(s) in cell {cell}")
+        generated, general_tips = _generate(cell, forecast_data, missing, occasion)
+        outfits.update(generated)
+    if general_tips is None:
+        try:
+            general_tips = _redis.get(_tips_key(cell, occasion))
+        except Exception:
+            general_tips = None
+
+    recommendations = {
+        "city": forecast_data.get("city"),
+        "total_days": len(daily),
+        "daily_outfits": [outfits[day["date"]] for day in daily if day["date"] in outfits],
+        "general_tips": general_tips or "Dress appropriately for the weather and stay comfortable throughout the day.",
+    }
+    return forecast_data, recommendations
+
+
+def popular_cells(limit: int = PRECOMPUTE_CELLS) -> List[Tuple[float, float, str]]:
+    try:
+        members = _redis.zrevrange(POPULAR_KEY, 0, limit - 1)
+    except Exception as e:
+        logger.warning(f"Popular forecast cells read failed: {str(e)}")
+        return []
+    cells = []
+    for member in members:
+        lat, lon, occasion = member.split(",", 2)
+        cells.append((float(lat), float(lon), occasion))
+    return cells
+
+
+def precompute(limit: int = PRECOMPUTE_CELLS) -> int:
+    """Refresh forecasts of the most requested cells and regenerate outfits whose day forecast changed"""
+    refreshed = 0
+    for lat, lon, occasion in popular_cells(limit):
+        cell = (lat, lon)
+        forecast_data = _get_forecast(lat, lon, PRECOMPUTE_DAYS, refresh=True)
+        if not forecast_data:
+            continue
+        daily = forecast_data.get("daily_forecasts", [])
+        cached = _cached_days(cell, daily, occasion)
+        missing = [day for day in daily if day["date"] not in cached]
+        if missing:
+            _generate(cell, forecast_data, missing, occasion)
+            refreshed += 1
+    try:
+        # Let old popularity fade so the precomputed set follows current traffic;
+        # both commands are atomic, so concurrent ZINCRBYs are never lost
+        pipe = _redis.pipeline()
+        pipe.zunionstore(POPULAR_KEY, {POPULAR_KEY: 0.5})
+        pipe.zremrangebyscore(POPULAR_KEY, "-inf", 0.5)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Popular forecast cells decay failed: {str(e)}")
+    return refreshed
@@ -0,0 +1,100 @@
+import os
+import re
+import json
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from .outfit_engine import temperature_band
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Wardrobe changes invalidate by version; the TTL only bounds how long tips/picks are reused
+OUTFIT_CACHE_TTL = int(os.getenv("OUTFIT_CACHE_TTL", 6 * 3600))
+# Hit/miss counters for operators: redis-cli -n 1 HGETALL outfit_cache:stats
+STATS_KEY = "outfit_cache:stats"
+
+_redis = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1)
+
+# Weather condition words -> condition class used in the cache key
+CONDITION_CLASSES = [
+    ("storm", ("storm", "thunder")),
+    ("snow", ("snow", "sleet", "blizzard")),
+    ("rain", ("rain", "drizzle", "shower")),
+    ("fog", ("fog", "mist", "haze", "smoke")),
+    ("cloudy", ("cloud", "overcast")),
+    ("clear", ("clear", "sun", "fair")),
+]
+
+
+def condition_class(conditions: Optional[str]) -> str:
+    text = (conditions or "").lower()
+    for name, words in CONDITION_CLASSES:
+        if any(word in text for word in words):
+            return name
+    return "other"
+
+
+def _normalise(value: Optional[str]) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", (value or "").strip().lower()).strip("_") or "-"
+
+
+def cache_key(
+    owner_id: int,
+    wardrobe_version: Optional[str],
+    mode: str,
+    occasion: Optional[str],
+    style: Optional[str],
+    temperature: Optional[float],
+    conditions: Optional[str],
+    ai_tips: bool = False
+) -> Optional[str]:
+    """Semantic key of a suggestion request; None (no caching) without a wardrobe version"""
+    if wardrobe_version is None:
+        return None
+    band = _normalise(temperature_band(temperature) or "unknown")
+    # Engine responses differ by who wrote the tips; LLM mode always uses Gemini's
+    tips = ("ai" if ai_tips else "template") if mode == "engine" else "llm"
+    return (
+        f"outfit:{owner_id}:{wardrobe_version}:{mode}:{tips}:{_normalise(occasion)}:"
+        f"{_normalise(style)}:{band}:{condition_class(conditions)}"
+    )
+
+
+async def get(key: Optional[str]) -> Optional[dict]:
+    if not key:
+        return None
+    try:
+        data = await _redis.get(key)
+        return json.loads(data) if data else None
+    except Exception as e:
+        logger.warning(f"Outfit cache read failed for {key}: {str(e)}")
+        return None
+
+
+async def put(key: Optional[str], response: dict):
+    if not key:
+        return
+    try:
+        await _redis.setex(key, OUTFIT_CACHE_TTL, json.dumps({**response, "cached": False}, default=str))
+    except Exception as e:
+        logger.warning(f"Outfit cache write failed for {key}: {str(e)}")
+
+
+def rotate(response: dict) -> dict:
+    """Next ranked alternative becomes the suggestion, the current one goes to the back"""
+    alternatives = list(response.get("alternatives") or [])
+    if not alternatives:
+        return response
+    return {**response, "outfit": alternatives[0], "alternatives": alternatives[1:] + [response["outfit"]]}
+
+
+async def record(hit: bool):
+    try:
+        await _redis.hincrby(STATS_KEY, "hits" if hit else "misses", 1)
+    except Exception:
+        pass
@@ -0,0 +1,278 @@
+"""
+Local outfit assembly for /stylist/suggest-outfit.
+
+Items are slotted by category and scored on their own (occasion, weather tags,
+style tags, temperature band); only the best few per slot are combined and
+scored for colour harmony. With K candidates per slot that is at most K^3
+top/bottom/shoes combinations, whatever the size of the wardrobe.
+"""
+import os
+import re
+import colorsys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import combinations, product
+from typing import Dict, List, Optional, Tuple
+
+from .catalog_ranking import color_to_rgb
+
+# Candidates kept per slot before combinations are scored
+CANDIDATES_PER_SLOT = int(os.getenv("OUTFIT_CANDIDATES_PER_SLOT", 6))
+MAX_ACCESSORIES = 2
+
+WEIGHTS = {
+    "occasion": 2.0,
+    "weather": 1.5,
+    "style": 1.0,
+    "temperature": 1.5,
+    "harmony": 2.0,
+}
+
+# Category keywords per outfit slot (categories come from the classifier as free text)
+SLOT_KEYWORDS = {
+    "hat": ["hat", "cap", "beanie", "beret", "panama"],
+    "top": ["top", "shirt", "blouse", "t-shirt", "tee", "sweater", "hoodie", "polo", "tank", "cardigan",
+            "sweatshirt", "jumper", "turtleneck", "jacket", "coat", "blazer", "parka", "vest", "dress"],
+    "bottom": ["bottom", "pants", "jeans", "skirt", "shorts", "trousers", "chinos", "leggings", "joggers"],
+    "shoes": ["shoes", "footwear", "sneakers", "boots", "sandals", "heels", "loafers", "trainers", "flats"],
+    "accessories": ["accessories", "accessory", "bag", "belt", "scarf", "watch", "sunglasses", "jewelry",
+                    "necklace", "bracelet", "gloves", "tie"],
+}
+
+# Tags the classifier puts into weather_suitability, by temperature band
+TEMPERATURE_WEATHER_TAGS = {
+    "very cold": ["winter", "cold"],
+    "cold": ["fall", "autumn", "spring", "cold", "cool"],
+    "mild": ["spring", "fall", "autumn", "mild", "warm"],
+    "warm": ["summer", "warm", "hot"],
+}
+
+# Category keywords that only make sense in cold / warm weather
+COLD_KEYWORDS = ["sweater", "hoodie", "coat", "jacket", "parka", "boots", "beanie", "scarf", "gloves",
+                 "turtleneck", "cardigan", "jumper", "sweatshirt"]
+WARM_KEYWORDS = ["shorts", "sandals", "tank", "panama", "sunglasses"]
+
+# temperature band -> (bonus for cold items, bonus for warm items)
+TEMPERATURE_FIT = {
+    "very cold": (1.0, -1.5),
+    "cold": (0.5, -1.0),
+    "mild": (0.0, -0.25),
+    "warm": (-1.0, 0.5),
+}
+
+
+def temperature_band(temperature: Optional[float]) -> Optional[str]:
+    if temperature is None:
+        return None
+    if temperature < 5:
+        return "very cold"
+    if temperature < 15:
+        return "cold"
+    if temperature < 25:
+        return "mild"
+    return "warm"
+
+
+def get_weather_tags(temp_category: Optional[str], conditions: str) -> List[str]:
+    """weather_suitability tags that fit the parsed weather (empty = no filter)"""
+    tags = list(TEMPERATURE_WEATHER_TAGS.get(temp_category, []))
+    conditions = (conditions or "").lower()
+    if "rain" in conditions or "drizzle" in conditions:
+        tags.append("rain")
+    if "snow" in conditions:
+        tags += ["snow", "winter"]
+    return tags
+
+
+def _has_keyword(text: str, keywords: List[str]) -> bool:
+    words = set(re.findall(r"[\w-]+", text))
+    words |= {word[:-1] for word in words if word.endswith("s")}  # plurals
+    return any(keyword in words for keyword in keywords)
+
+
+@lru_cache(maxsize=1024)
+def slot_of(category: Optional[str]) -> Optional[str]:
+    """Outfit slot of a wardrobe category, None if it doesn't fit any"""
+    if not category:
+        return None
+    text = category.strip().lower()
+    for slot, keywords in SLOT_KEYWORDS.items():
+        if text in keywords:
+            return slot
+    for slot, keywords in SLOT_KEYWORDS.items():
+        if _has_keyword(text, keywords):
+            return slot
+    return None
+
+
+@lru_cache(maxsize=1024)
+def color_profile(color: Optional[str]) -> Optional[Tuple[float, float, float]]:
+    """(hue 0..360, saturation, value) of a colour name/hex, None if unknown"""
+    if not color:
+        return None
+    rgb = color_to_rgb(color)
+    if rgb is None:
+        return None
+    h, s, v = colorsys.rgb_to_hsv(*(float(channel) for channel in rgb))
+    return h * 360.0, s, v
+
+
+def color_harmony(first: Optional[str], second: Optional[str]) -> float:
+    """0..1: neutrals go with everything, then analogous, then complementary hues"""
+    a, b = color_profile(first), color_profile(second)
+    if a is None or b is None:
+        return 0.5
+    if a[1] < 0.25 or b[1] < 0.25 or a[2] < 0.2 or b[2] < 0.2:
+        return 1.0
+    distance = abs(a[0] - b[0]) % 360
+    distance = min(distance, 360 - distance)
+    if distance <= 30:
+        return 0.8
+    if distance >= 150:
+        return 0.7
+    return 0.3
+
+
+def _lower_set(values) -> set:
+    return {str(value).strip().lower() for value in values or [] if value}
+
+
+@dataclass
+class OutfitContext:
+    occasion: Optional[str] = None
+    style: Optional[str] = None
+    temperature: Optional[float] = None
+    conditions: str = "mild"
+
+    @property
+    def band(self) -> Optional[str]:
+        return temperature_band(self.temperature)
+
+    @property
+    def weather_tags(self) -> set:
+        return set(get_weather_tags(self.band, self.conditions))
+
+
+@dataclass
+class ScoredOutfit:
+    top: Optional[object] = None
+    bottom: Optional[object] = None
+    shoes: Optional[object] = None
+    hat: Optional[object] = None
+    accessories: List[object] = field(default_factory=list)
+    score: float = 0.0
+
+    @property
+    def items(self) -> List[object]:
+        return [item for item in (self.hat, self.top, self.bottom, self.shoes) if item] + self.accessories
+
+
+def item_score(item, context: OutfitContext) -> float:
+    """How well a single item suits the occasion, weather and style (independent of the rest)"""
+    score = 0.0
+    occasions = _lower_set(item.occasions)
+    if context.occasion and context.occasion.lower() in occasions:
+        score += WEIGHTS["occasion"]
+
+    weather = _lower_set(item.weather_suitability)
+    wanted = context.weather_tags
+    if wanted and weather:
+        score += WEIGHTS["weather"] * len(weather & wanted) / len(wanted)
+
+    if context.style and context.style.lower() in _lower_set(item.tags) | occasions:
+        score += WEIGHTS["style"]
+
+    band = context.band
+    if band:
+        category = (item.category or "").lower()
+        cold_bonus, warm_bonus = TEMPERATURE_FIT[band]
+        if _has_keyword(category, COLD_KEYWORDS):
+            score += WEIGHTS["temperature"] * cold_bonus
+        if _has_keyword(category, WARM_KEYWORDS):
+            score += WEIGHTS["temperature"] * warm_bonus
+    return score
+
+
+def slot_candidates(items, context: OutfitContext, k: int = CANDIDATES_PER_SLOT) -> Dict[str, List[Tuple[float, object]]]:
+    """Top-k (score, item) per slot; unavailable and unslottable items are dropped"""
+    slots: Dict[str, List[Tuple[float, object]]] = {slot: [] for slot in SLOT_KEYWORDS}
+    for item in items:
+        if item.available is False:
+            continue
+        slot = slot_of(item.category)
+        if slot:
+            slots[slot].append((item_score(item, context), item))
+    for slot, scored in slots.items():
+        # Ties go to the older item so the answer is stable between calls
+        scored.sort(key=lambda pair: (-pair[0], pair[1].id))
+        slots[slot] = scored[:k] if slot != "accessories" else scored[:k * 2]
+    return slots
+
+
+def _harmony(items) -> float:
+    pairs = list(combinations([item for item in items if item], 2))
+    if not pairs:
+        return 0.0
+    return sum(color_harmony(a.color, b.color) for a, b in pairs) / len(pairs)
+
+
+def assemble_outfits(items, context: OutfitContext, n: int = 3) -> List[ScoredOutfit]:
+    """Up to n best outfits, best first; alternatives never repeat a top/bottom pair"""
+    slots = slot_candidates(items, context)
+    tops = slots["top"] or [(0.0, None)]
+    bottoms = slots["bottom"] or [(0.0, None)]
+    shoes = slots["shoes"] or [(0.0, None)]
+
+    scored = []
+    for (top_score, top), (bottom_score, bottom), (shoes_score, shoe) in product(tops, bottoms, shoes):
+        score = top_score + bottom_score + shoes_score + WEIGHTS["harmony"] * _harmony((top, bottom, shoe))
+        scored.append((score, top, bottom, shoe))
+    scored.sort(key=lambda combo: -combo[0])
+
+    outfits, used_pairs = [], set()
+    for score, top, bottom, shoe in scored:
+        pair = (getattr(top, "id", None), getattr(bottom, "id", None))
+        if pair in used_pairs:
+            continue
+        used_pairs.add(pair)
+        outfit = ScoredOutfit(top=top, bottom=bottom, shoes=shoe, score=score)
+        _add_extras(outfit, slots, context)
+        outfits.append(outfit)
+        if len(outfits) >= n:
+            break
+    return outfits
+
+
+def _add_extras(outfit: ScoredOutfit, slots: Dict[str, List[Tuple[float, object]]], context: OutfitContext):
+    """Hat and accessories are only added when they actually suit the day and the outfit"""
+    core = [item for item in (outfit.top, outfit.bottom, outfit.shoes) if item]
+
+    def extra_score(pair):
+        score, item = pair
+        return score + WEIGHTS["harmony"] * (_harmony(core + [item]) - _harmony(core))
+
+    hats = sorted(slots["hat"], key=extra_score, reverse=True)
+    if hats and (hats[0][0] > 0 or context.band in ("very cold", "warm")):
+        outfit.hat = hats[0][1]
+        outfit.score += extra_score(hats[0])
+
+    accessories = sorted(slots["accessories"], key=extra_score, reverse=True)
+    outfit.accessories = [item for score, item in accessories[:MAX_ACCESSORIES] if score >= 0]
+
+
+def describe_outfit(outfit: ScoredOutfit, context: OutfitContext) -> str:
+    """Short styling note without an LLM"""
+    pieces = [item.name for item in (outfit.top, outfit.bottom, outfit.shoes) if item]
+    tip = f"Pair {', '.join(pieces[:-1])} and {pieces[-1]}" if len(pieces) > 1 else (
+        f"Build the look around {pieces[0]}" if pieces else "Add a few basics to your wardrobe for full outfits"
+    )
+    band = context.band
+    if band == "very cold":
+        tip += "; layer up and keep the extremities warm"
+    elif band == "cold":
+        tip += "; add a light layer you can take off indoors"
+    elif band == "warm":
+        tip += "; keep it light and breathable"
+    if "rain" in context.weather_tags:
+        tip += ", and take something water-resistant"
+    return tip + "."
@@ -0,0 +1,133 @@
+import os
+import asyncio
+import logging
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1)
+
+# Global Gemini quota shared by every web process and worker
+GEMINI_RATE_PER_MINUTE = float(os.getenv("GEMINI_RATE_PER_MINUTE", 60))
+GEMINI_BURST = float(os.getenv("GEMINI_BURST", 10))
+# Tokens bulk work must leave in the bucket so interactive requests are never starved
+GEMINI_INTERACTIVE_RESERVE = float(os.getenv("GEMINI_INTERACTIVE_RESERVE", 3))
+
+# Per-user budget for bulk uploads, so one large batch can't monopolise the workers
+USER_BULK_RATE_PER_MINUTE = float(os.getenv("USER_BULK_RATE_PER_MINUTE", 12))
+USER_BULK_BURST = float(os.getenv("USER_BULK_BURST", 3))
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+_PROVIDER_KEY = "ratelimit:gemini"
+
+# Token bucket: refills `rate` tokens per second up to `capacity`.
+# A request is granted only if `reserve` tokens remain after paying `cost`.
+# Returns the number of seconds to wait before retrying (0 when granted).
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local reserve = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens - cost >= reserve then
+    tokens = tokens - cost
+else
+    wait = (cost + reserve - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+_token_bucket = r.register_script(_TOKEN_BUCKET_SCRIPT)
+
+# Give back tokens taken by a request that couldn't proceed (never above capacity)
+_REFUND_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+    redis.call('HSET', KEYS[1], 'tokens', math.min(tonumber(ARGV[1]), tokens + tonumber(ARGV[2])))
+end
+return 0
+"""
+
+_refund = r.register_script(_REFUND_SCRIPT)
+
+def acquire(key: str, rate_per_minute: float, capacity: float, cost: float = 1, reserve: float = 0) -> float:
+    """
+    Try to take `cost` tokens from the bucket stored at `key`.
+    Returns 0 if granted, otherwise the seconds to wait before trying again.
+    Fails open if Redis is unavailable.
+    """
+    try:
+        wait = float(_token_bucket(keys=[key], args=[rate_per_minute / 60.0, capacity, cost, reserve]))
+        return wait
+    except Exception as e:
+        logger.warning(f"Rate limiter unavailable for {key}: {str(e)}")
+        return 0.0
+
+def refund(key: str, capacity: float, cost: float = 1):
+    try:
+        _refund(keys=[key], args=[capacity, cost])
+    except Exception as e:
+        logger.warning(f"Rate limiter refund failed for {key}: {str(e)}")
+
+def acquire_provider_slot(priority: str = INTERACTIVE) -> float:
+    """Take one Gemini call from the global bucket; bulk work leaves a reserve for interactive calls"""
+    reserve = GEMINI_INTERACTIVE_RESERVE if priority == BULK else 0
+    return acquire(_PROVIDER_KEY, GEMINI_RATE_PER_MINUTE, GEMINI_BURST, reserve=reserve)
+
+def _user_bulk_key(user_id: int) -> str:
+    return f"ratelimit:user:{user_id}:bulk"
+
+def acquire_user_bulk_slot(user_id: int) -> float:
+    """Take one bulk image from the user's own bucket"""
+    return acquire(_user_bulk_key(user_id), USER_BULK_RATE_PER_MINUTE, USER_BULK_BURST)
+
+def acquire_bulk_slot(user_id: int) -> float:
+    """
+    Fair share per user first, then the global provider quota (minus the interactive
+    reserve). The user's token is given back if the provider is throttled, so waiting
+    on the provider doesn't eat into the user's budget.
+    """
+    wait = acquire_user_bulk_slot(user_id)
+    if wait > 0:
+        return wait
+    wait = acquire_provider_slot(BULK)
+    if wait > 0:
+        refund(_user_bulk_key(user_id), USER_BULK_BURST)
+    return wait
+
+def refund_bulk_slot(user_id: int):
+    """Give back a slot from acquire_bulk_slot whose image turned out to be processed already"""
+    refund(_user_bulk_key(user_id), USER_BULK_BURST)
+    refund(_PROVIDER_KEY, GEMINI_BURST)
+
+async def wait_for_provider_slot(max_wait: float = 10.0) -> bool:
+    """
+    Async helper for request handlers: wait (without blocking the event loop) for an
+    interactive Gemini slot. Returns False if none became free within `max_wait` seconds.
+    """
+    waited = 0.0
+    while True:
+        wait = await asyncio.to_thread(acquire_provider_slot, INTERACTIVE)
+        if wait <= 0:
+            return True
+        if waited + wait > max_wait:
+            return False
+        await asyncio.sleep(wait)
+        waited += wait
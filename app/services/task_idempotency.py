@@ -0,0 +1,71 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Optional
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1)
+
+# How long a worker may hold the "in progress" marker before another delivery can take over
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", 600))
+# How long a finished result is remembered for short-circuiting re-runs
+IDEMPOTENCY_RESULT_TTL = int(os.getenv("IDEMPOTENCY_RESULT_TTL", 86400))
+
+def content_hash(file_data: bytes) -> str:
+    """SHA-256 of the uploaded image bytes"""
+    return hashlib.sha256(file_data).hexdigest()
+
+def build_key(batch_id: str, image_index: int, file_hash: str) -> str:
+    """Idempotency key for one image of a bulk upload batch"""
+    return f"{batch_id}:{image_index}:{file_hash}"
+
+def _lock_key(key: str) -> str:
+    return f"idempotency:{key}:lock"
+
+def _result_key(key: str) -> str:
+    return f"idempotency:{key}:result"
+
+def get_result(key: str) -> Optional[Dict]:
+    """Return the stored result of a previous successful run, if any"""
+    try:
+        data = r.get(_result_key(key))
+        return json.loads(data) if data else None
+    except Exception as e:
+        logger.warning(f"Failed to read idempotency result for {key}: {str(e)}")
+        return None
+
+def claim(key: str) -> bool:
+    """
+    Mark the key as in progress (SETNX with TTL).
+    Returns False if another worker is already processing it.
+    If Redis is unavailable we let the task run and rely on the DB uniqueness constraint.
+    """
+    try:
+        return bool(r.set(_lock_key(key), "1", nx=True, ex=IDEMPOTENCY_LOCK_TTL))
+    except Exception as e:
+        logger.warning(f"Failed to claim idempotency key {key}: {str(e)}")
+        return True
+
+def store_result(key: str, result: Dict):
+    """Remember a successful result and drop the in-progress marker"""
+    try:
+        pipe = r.pipeline()
+        pipe.setex(_result_key(key), IDEMPOTENCY_RESULT_TTL, json.dumps(result))
+        pipe.delete(_lock_key(key))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to store idempotency result for {key}: {str(e)}")
+
+def release(key: str):
+    """Drop the in-progress marker so a retry can pick the work up again"""
+    try:
+        r.delete(_lock_key(key))
+    except Exception as e:
+        logger.warning(f"Failed to release idempotency key {key}: {str(e)}")
@@ -0,0 +1,88 @@
+import os
+import json
+import logging
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import redis
+from dotenv import load_dotenv
+
+from .ttl_cache import TTLCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+# Shared layer so all web workers benefit from one lookup and see invalidations
+USER_CACHE_USE_REDIS = os.getenv("USER_CACHE_USE_REDIS", "true").lower() == "true"
+# invalidate() can only clear this process's LRU, so other workers may serve a
+# changed/deleted user (is_premium, email) for up to this many seconds.
+# Keep it short; Redis absorbs the rest of the lookups.
+USER_CACHE_LOCAL_TTL = int(os.getenv("USER_CACHE_LOCAL_TTL", 30))
+
+_local = TTLCache(maxsize=USER_CACHE_SIZE, ttl=min(USER_CACHE_LOCAL_TTL, USER_CACHE_TTL))
+_redis = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1) if USER_CACHE_USE_REDIS else None
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Lightweight identity of the authenticated user.
+    Handlers that need the full row should depend on get_current_user_orm instead.
+    """
+    id: int
+    firebase_uid: str
+    email: str
+    is_premium: bool
+
+
+def _redis_key(firebase_uid: str) -> str:
+    return f"user:uid:{firebase_uid}"
+
+def get(firebase_uid: str) -> Optional[UserSnapshot]:
+    """Read-through lookup: process LRU first, then Redis (if enabled)"""
+    snapshot = _local.get(firebase_uid)
+    if snapshot is not None:
+        return snapshot
+
+    if _redis is None:
+        return None
+    try:
+        data = _redis.get(_redis_key(firebase_uid))
+        if not data:
+            return None
+        snapshot = UserSnapshot(**json.loads(data))
+        _local.set(firebase_uid, snapshot)
+        return snapshot
+    except Exception as e:
+        logger.warning(f"User cache read failed for {firebase_uid}: {str(e)}")
+        return None
+
+def put(user) -> UserSnapshot:
+    """Cache a snapshot of a users row and return it"""
+    snapshot = UserSnapshot(
+        id=user.id,
+        firebase_uid=user.firebase_uid,
+        email=user.email,
+        is_premium=bool(user.is_premium)
+    )
+    _local.set(snapshot.firebase_uid, snapshot)
+    if _redis is not None:
+        try:
+            _redis.setex(_redis_key(snapshot.firebase_uid), USER_CACHE_TTL, json.dumps(asdict(snapshot)))
+        except Exception as e:
+            logger.warning(f"User cache write failed for {snapshot.firebase_uid}: {str(e)}")
+    return snapshot
+
+def invalidate(firebase_uid: Optional[str]):
+    """Drop a user from both cache layers (call after updating or deleting the row)"""
+    if not firebase_uid:
+        return
+    _local.pop(firebase_uid)
+    if _redis is not None:
+        try:
+            _redis.delete(_redis_key(firebase_uid))
+        except Exception as e:
+            logger.warning(f"User cache invalidation failed for {firebase_uid}: {str(e)}")
@@ -0,0 +1,269 @@
+"""
+Embedding index behind wardrobe similarity and catalog matching.
+
+With pgvector the vectors live in PostgreSQL (HNSW indexes, see crud_async).
+Without it they live in NumPy index files: one .npy per owner (plus one for the
+catalog) holding (id, L2-normalised float32 vector) records. Readers memory-map
+the file and keep a contiguous matrix in memory until the file changes, so a
+query is a single matrix-vector product plus argpartition.
+"""
+import os
+import json
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .embeddings import EMBEDDING_DIM, PGVECTOR_ENABLED, VECTOR_BACKEND
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Shared by web and worker containers (the project directory is mounted in both)
+VECTOR_INDEX_DIR = os.getenv(
+    "VECTOR_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "vector_index")
+)
+
+RECORD_DTYPE = np.dtype([("id", "<i8"), ("vec", "<f4", (EMBEDDING_DIM,))])
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore:
+    """One collection of embeddings stored in a single .npy file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._cache: Optional[Tuple[int, np.ndarray, np.ndarray]] = None  # (mtime_ns, ids, matrix)
+        self._cache_lock = threading.Lock()
+
+    @contextmanager
+    def _write_lock(self):
+        # Serialises read-modify-write across processes (web + Celery workers)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_records(self) -> np.ndarray:
+        try:
+            return np.load(self.path, mmap_mode="r")
+        except FileNotFoundError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+    def _write_records(self, records: np.ndarray):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, records)
+        os.replace(tmp_path, self.path)  # atomic: readers see the old or the new file
+
+    def load(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, matrix) with one normalised row per id; reloaded only when the file changes"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return np.empty(0, dtype=np.int64), np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+        cache = self._cache
+        if cache is not None and cache[0] == mtime:
+            return cache[1], cache[2]
+
+        with self._cache_lock:
+            records = self._read_records()
+            ids = np.array(records["id"], dtype=np.int64)
+            matrix = np.ascontiguousarray(records["vec"], dtype=np.float32)
+            self._cache = (mtime, ids, matrix)
+        return ids, matrix
+
+    def upsert(self, ids: List[int], vectors) -> None:
+        new_ids = np.asarray(ids, dtype=np.int64)
+        new_vectors = _normalize(np.atleast_2d(vectors))
+        with self._write_lock():
+            records = self._read_records()
+            kept = records[~np.isin(records["id"], new_ids)]
+            added = np.empty(len(new_ids), dtype=RECORD_DTYPE)
+            added["id"] = new_ids
+            added["vec"] = new_vectors
+            self._write_records(np.concatenate([kept, added]))
+
+    def remove(self, ids: List[int]) -> None:
+        if not os.path.exists(self.path):
+            return
+        with self._write_lock():
+            records = self._read_records()
+            mask = np.isin(records["id"], np.asarray(ids, dtype=np.int64))
+            if mask.any():
+                self._write_records(np.array(records[~mask]))
+
+    def replace_all(self, ids: List[int], vectors) -> None:
+        records = np.empty(len(ids), dtype=RECORD_DTYPE)
+        records["id"] = np.asarray(ids, dtype=np.int64)
+        records["vec"] = _normalize(np.reshape(vectors, (len(ids), EMBEDDING_DIM)))
+        with self._write_lock():
+            self._write_records(records)
+
+    def drop(self) -> None:
+        for path in (self.path, self.path + ".lock"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, item_id: int) -> Optional[List[float]]:
+        ids, matrix = self.load()
+        positions = np.flatnonzero(ids == item_id)
+        return matrix[positions[0]].tolist() if len(positions) else None
+
+    def top_k(
+        self,
+        query: List[float],
+        k: int,
+        exclude_id: Optional[int] = None,
+        mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """[(id, cosine distance)] of the k nearest rows, best first"""
+        ids, matrix = self.load()
+        if not len(ids):
+            return []
+
+        scores = matrix @ _normalize(query)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        if exclude_id is not None:
+            scores[ids == exclude_id] = -np.inf
+
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(1.0 - scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+_stores: Dict[str, NumpyVectorStore] = {}
+_stores_lock = threading.Lock()
+
+def _store(name: str) -> NumpyVectorStore:
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = NumpyVectorStore(os.path.join(VECTOR_INDEX_DIR, f"{name}.npy"))
+        return _stores[name]
+
+def _owner_store(owner_id: int) -> NumpyVectorStore:
+    return _store(f"owner_{owner_id}")
+
+
+# ---- catalog (numpy backend): vectors + product metadata aligned by row ----
+CATALOG_META_PATH = os.path.join(VECTOR_INDEX_DIR, "catalog.json")
+_catalog_meta: Optional[Tuple[int, List[dict], np.ndarray, np.ndarray]] = None  # (mtime_ns, products, genders, pieces)
+
+def _load_catalog_meta() -> Tuple[List[dict], np.ndarray, np.ndarray]:
+    global _catalog_meta
+    try:
+        mtime = os.stat(CATALOG_META_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return [], np.empty(0, dtype=object), np.empty(0, dtype=object)
+    if _catalog_meta is None or _catalog_meta[0] != mtime:
+        with open(CATALOG_META_PATH, "r", encoding="utf-8") as f:
+            products = json.load(f)
+        genders = np.array([p.get("gender") or "" for p in products], dtype=object)
+        pieces = np.array([p.get("piece_type") or "" for p in products], dtype=object)
+        _catalog_meta = (mtime, products, genders, pieces)
+    return _catalog_meta[1], _catalog_meta[2], _catalog_meta[3]
+
+def write_catalog_index(products: List[dict], vectors) -> None:
+    """Replace the numpy catalog index (used by embed_catalog.py)"""
+    os.makedirs(VECTOR_INDEX_DIR, exist_ok=True)
+    tmp_path = f"{CATALOG_META_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(products, f, ensure_ascii=False)
+    _store("catalog").replace_all(list(range(len(products))), vectors)
+    os.replace(tmp_path, CATALOG_META_PATH)
+
+
+def _catalog_dict(product) -> dict:
+    return {
+        "name": product.name,
+        "price": product.price,
+        "image_url": product.image_url,
+        "product_url": product.product_url,
+        "gender": product.gender,
+        "piece_type": product.piece_type,
+        "main_color": product.main_color,
+    }
+
+
+# ---- backend-independent API ----
+async def get_item_embedding(db, item_id: int, owner_id: int) -> Optional[List[float]]:
+    if PGVECTOR_ENABLED:
+        from .. import crud_async
+        return await crud_async.get_clothing_item_embedding(db, item_id, owner_id)
+    return _owner_store(owner_id).get(item_id)
+
+async def similar_items(db, owner_id: int, embedding: List[float], k: int = 10, exclude_id: Optional[int] = None) -> list:
+    """[(ClothingItem, cosine distance)] of the user's nearest items"""
+    from .. import crud_async
+    if PGVECTOR_ENABLED:
+        return await crud_async.get_similar_clothing_items(db, owner_id, embedding, k, exclude_id=exclude_id)
+
+    hits = _owner_store(owner_id).top_k(embedding, k, exclude_id=exclude_id)
+    if not hits:
+        return []
+    items = {item.id: item for item in await crud_async.get_clothing_items_by_ids(db, owner_id, [item_id for item_id, _ in hits])}
+    # Ids of items deleted since the index was written are simply dropped
+    return [(items[item_id], distance) for item_id, distance in hits if item_id in items]
+
+async def search_catalog(db, embedding: List[float], k: int = 10, gender: Optional[str] = None, piece_type: Optional[str] = None) -> list:
+    """[(product dict, cosine distance)] of the nearest catalog products"""
+    if PGVECTOR_ENABLED:
+        from .. import crud_async
+        matches = await crud_async.search_catalog(db, embedding, k, gender=gender, piece_type=piece_type)
+        return [(_catalog_dict(product), distance) for product, distance in matches]
+
+    products, genders, pieces = _load_catalog_meta()
+    if not products:
+        return []
+    mask = None
+    if gender:
+        mask = genders == gender.lower()
+    if piece_type:
+        piece_mask = pieces == piece_type.lower()
+        mask = piece_mask if mask is None else mask & piece_mask
+    hits = _store("catalog").top_k(embedding, k, mask=mask)
+    return [(products[row], distance) for row, distance in hits if row < len(products)]
+
+def index_item(db, owner_id: int, item_id: int, embedding: List[float]) -> None:
+    """Store a freshly computed item embedding (sync; used by Celery tasks)"""
+    if PGVECTOR_ENABLED:
+        from .. import crud
+        crud.set_clothing_item_embedding(db, item_id, embedding)
+        return
+    _owner_store(owner_id).upsert([item_id], [embedding])
+
+def remove_items(owner_id: int, item_ids: List[int]) -> None:
+    """Forget deleted items (rows, and their vectors, are already gone with pgvector)"""
+    if PGVECTOR_ENABLED or not item_ids:
+        return
+    try:
+        _owner_store(owner_id).remove(item_ids)
+    except Exception as e:
+        logger.warning(f"Failed to remove items {item_ids} from vector index of owner {owner_id}: {str(e)}")
+
+def drop_owner(owner_id: int) -> None:
+    if PGVECTOR_ENABLED:
+        return
+    _owner_store(owner_id).drop()
+
+logger.info(f"Vector backend: {VECTOR_BACKEND}")
@@ -0,0 +1,169 @@
+import os
+import json
+import uuid
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+from redis import Redis as SyncRedis
+from dotenv import load_dotenv
+
+from .ttl_cache import TTLCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WARDROBE_CACHE_TTL = int(os.getenv("WARDROBE_CACHE_TTL", 3600))
+WARDROBE_CACHE_SIZE = int(os.getenv("WARDROBE_CACHE_SIZE", 2000))
+WARDROBE_VERSION_TTL = int(os.getenv("WARDROBE_VERSION_TTL", 600))
+
+# Snapshots are immutable per (owner, version), so the process LRU never serves stale data.
+# The version is a random token in Redis, replaced after every committed write to the
+# owner's items. It expires after WARDROBE_VERSION_TTL, so a write whose bump was lost
+# (Redis down or restarted) is picked up within that time at the latest
+_local = TTLCache(maxsize=WARDROBE_CACHE_SIZE, ttl=WARDROBE_CACHE_TTL)
+_redis = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1)
+# crud.py (Celery tasks, sync routes) bumps the version without an event loop
+_sync_redis = SyncRedis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1)
+
+
+@dataclass
+class WardrobeSnapshot:
+    """
+    Everything the stylist/wardrobe endpoints need from a user's wardrobe,
+    built once per wardrobe version.
+    """
+    owner_id: int
+    version: Optional[str]
+    items: List = field(default_factory=list)  # schemas.ClothingItem (without embeddings)
+    prompt: str = ""
+    by_category: Dict[str, List[int]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.by_id = {item.id: item for item in self.items}
+
+    def category_items(self) -> Dict[str, list]:
+        return {category: [self.by_id[item_id] for item_id in ids] for category, ids in self.by_category.items()}
+
+
+def format_wardrobe_prompt(items) -> str:
+    """Compact wardrobe listing for AI prompts, one `id|category|color|name` line per item"""
+    if not items:
+        return "No clothing items found for this user."
+    return "\n".join(
+        f"{item.id}|{item.category or '-'}|{item.color or '-'}|{item.name}"
+        for item in items
+    )
+
+
+def _version_key(owner_id: int) -> str:
+    return f"wardrobe:version:{owner_id}"
+
+def _snapshot_key(owner_id: int, version: str) -> str:
+    return f"wardrobe:snapshot:{owner_id}:{version}"
+
+async def get_version(owner_id: int) -> Optional[str]:
+    """Current wardrobe version, or None if Redis is unavailable (callers then skip the caches)"""
+    key = _version_key(owner_id)
+    try:
+        version = await _redis.get(key)
+        if version is None:
+            await _redis.set(key, uuid.uuid4().hex, ex=WARDROBE_VERSION_TTL, nx=True)
+            version = await _redis.get(key)
+        return version.decode() if version else None
+    except Exception as e:
+        logger.warning(f"Wardrobe version read failed for owner {owner_id}: {str(e)}")
+        return None
+
+async def bump_version(owner_id: int):
+    """New version after a committed write to the owner's items (async paths)"""
+    try:
+        await _redis.set(_version_key(owner_id), uuid.uuid4().hex, ex=WARDROBE_VERSION_TTL)
+    except Exception as e:
+        logger.warning(f"Wardrobe version bump failed for owner {owner_id}: {str(e)}")
+
+def bump_version_sync(owner_id: int):
+    """bump_version for crud.py"""
+    try:
+        _sync_redis.set(_version_key(owner_id), uuid.uuid4().hex, ex=WARDROBE_VERSION_TTL)
+    except Exception as e:
+        logger.warning(f"Wardrobe version bump failed for owner {owner_id}: {str(e)}")
+
+
+def build_snapshot(owner_id: int, version: Optional[str], items) -> WardrobeSnapshot:
+    from .. import schemas
+
+    serialised = [
+        schemas.ClothingItem.from_orm(item).copy(update={"ai_generated_embedding": []})
+        for item in items
+    ]
+    by_category: Dict[str, List[int]] = {}
+    for item in serialised:
+        by_category.setdefault(item.category or "Other", []).append(item.id)
+    return WardrobeSnapshot(
+        owner_id=owner_id,
+        version=version,
+        items=serialised,
+        prompt=format_wardrobe_prompt(serialised),
+        by_category=by_category
+    )
+
+def _dumps(snapshot: WardrobeSnapshot) -> str:
+    return json.dumps({
+        "items": [item.dict() for item in snapshot.items],
+        "prompt": snapshot.prompt,
+        "by_category": snapshot.by_category,
+    }, default=str)
+
+def _loads(owner_id: int, version: str, data) -> WardrobeSnapshot:
+    from .. import schemas
+
+    payload = json.loads(data)
+    return WardrobeSnapshot(
+        owner_id=owner_id,
+        version=version,
+        items=[schemas.ClothingItem.parse_obj(item) for item in payload["items"]],
+        prompt=payload["prompt"],
+        by_category=payload["by_category"]
+    )
+
+
+async def peek_snapshot(owner_id: int, version: Optional[str]) -> Optional[WardrobeSnapshot]:
+    """Cached snapshot of this version from the process LRU or Redis, without touching the DB"""
+    if version is None:
+        return None
+    snapshot = _local.get((owner_id, version))
+    if snapshot is not None:
+        return snapshot
+    try:
+        data = await _redis.get(_snapshot_key(owner_id, version))
+        if data:
+            snapshot = _loads(owner_id, version, data)
+            _local.set((owner_id, version), snapshot)
+            return snapshot
+    except Exception as e:
+        logger.warning(f"Wardrobe snapshot read failed for owner {owner_id}: {str(e)}")
+    return None
+
+async def get_snapshot(db, owner_id: int, version: Optional[str] = None) -> WardrobeSnapshot:
+    """Read-through: process LRU, then Redis, then one DB query (`version` if the caller already has it)"""
+    if version is None:
+        version = await get_version(owner_id)
+    snapshot = await peek_snapshot(owner_id, version)
+    if snapshot is not None:
+        return snapshot
+
+    from .. import crud_async
+    items = await crud_async.get_all_clothing_items_by_owner(db, owner_id)
+    # Read after the version, so the items are at least as new as the key they're stored under
+    snapshot = build_snapshot(owner_id, version, items)
+    if version is None:
+        return snapshot
+    _local.set((owner_id, version), snapshot)
+    try:
+        await _redis.setex(_snapshot_key(owner_id, version), WARDROBE_CACHE_TTL, _dumps(snapshot))
+    except Exception as e:
+        logger.warning(f"Wardrobe snapshot write failed for owner {owner_id}: {str(e)}")
+    return snapshot
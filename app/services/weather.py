@@ -1,9 +1,14 @@
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 import os
+import math
+import time
+import uuid
 import requests
+import threading
 from datetime import datetime
 import redis
 import json
+import numpy as np
 from dotenv import load_dotenv
 import traceback
 load_dotenv()
@@ -20,176 +25,343 @@ redis_client = redis.Redis(
 WEATHER_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
 ALMATY_COORDS = {"lat": 43.2220, "lon": 76.8512}  # Almaty coordinates
 
+CURRENT_WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"  # 5-day / 3-hour
+# Seconds to wait for OpenWeatherMap: to connect, then for each read
+WEATHER_CONNECT_TIMEOUT = 2.0
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", 5))
+# Retries of transient failures (async client), with exponential backoff from WEATHER_BACKOFF seconds
+WEATHER_RETRIES = int(os.getenv("WEATHER_RETRIES", 2))
+WEATHER_BACKOFF = float(os.getenv("WEATHER_BACKOFF", 0.25))
+# Longest one upstream fetch can take: every attempt timing out plus the longest backoffs
+WEATHER_FETCH_BUDGET = (
+    (WEATHER_RETRIES + 1) * (WEATHER_CONNECT_TIMEOUT + WEATHER_TIMEOUT)
+    + 2 * WEATHER_BACKOFF * (2 ** WEATHER_RETRIES - 1)
+)
+
+# Coordinates are snapped to a grid so GPS jitter lands in the same cache entry
+WEATHER_GRID_DEG = float(os.getenv("WEATHER_GRID_DEG", 0.05))
+# Entries are fresh for WEATHER_FRESH_TTL, then served stale (and refreshed in
+# the background) until WEATHER_STALE_TTL
+WEATHER_FRESH_TTL = int(os.getenv("WEATHER_FRESH_TTL", 1800))
+WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", 6 * 3600))
+# Only one upstream fetch per cache key at a time; others wait for its result.
+# The lock outlives the slowest fetch and waiters stay until it would expire
+WEATHER_LOCK_TTL = math.ceil(WEATHER_FETCH_BUDGET) + 2
+WEATHER_LOCK_WAIT = float(WEATHER_LOCK_TTL)
+# Forecast slots are 3 hours apart; one within this many seconds stands in for current weather
+CURRENT_FROM_FORECAST_WINDOW = int(os.getenv("CURRENT_FROM_FORECAST_WINDOW", 90 * 60))
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+_release_script = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+def snap_coordinates(lat: float, lon: float) -> tuple:
+    """Centre of the grid cell containing (lat, lon)"""
+    step = WEATHER_GRID_DEG
+    return round(round(lat / step) * step, 4), round(round(lon / step) * step, 4)
+
 def get_weather_cache_key(lat: float, lon: float) -> str:
     """Generate cache key for weather data based on coordinates."""
+    lat, lon = snap_coordinates(lat, lon)
     return f"weather:{lat}:{lon}"
 
-def fetch_weather_by_coordinates(lat: float, lon: float) -> Optional[Dict]:
-    """Fetch current weather data from OpenWeatherMap API using coordinates."""
-    if not WEATHER_API_KEY:
-        raise ValueError("OPENWEATHERMAP_API_KEY environment variable is not set")
+def get_forecast_cache_key(lat: float, lon: float) -> str:
+    """Generate cache key for the raw forecast (all days) based on coordinates."""
+    lat, lon = snap_coordinates(lat, lon)
+    return f"forecast_raw:{lat}:{lon}"
 
-    url = "https://api.openweathermap.org/data/2.5/weather"
-    params = {
-        "lat": lat,
-        "lon": lon,
-        "appid": WEATHER_API_KEY,
-        "units": "metric"  # Use Celsius for temperature
-    }
 
+def _cache_read(cache_key: str) -> Optional[Dict]:
+    """{"data", "fetched_at"} entry, None on a miss"""
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Get city name and replace "Nur-Sultan" with "Astana"
-        city_name = data.get("name", "Unknown")
-        if city_name == "Nur-Sultan":
-            city_name = "Astana"
-        
-        # Extract relevant weather information
-        weather_data = {
-            "temperature": data["main"]["temp"],
-            "feels_like": data["main"]["feels_like"],
-            "humidity": data["main"]["humidity"],
-            "pressure": data["main"]["pressure"],
-            "description": data["weather"][0]["description"],
-            "condition": data["weather"][0]["main"],
-            "wind_speed": data["wind"]["speed"],
-            "city": city_name,
-            "country": data["sys"]["country"],
-            "coordinates": {"lat": lat, "lon": lon},
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        
-        # Store in Redis with coordinate-based key
-        cache_key = get_weather_cache_key(lat, lon)
-        redis_client.setex(cache_key, 1800, json.dumps(weather_data))  # Cache for 30 minutes
-        return weather_data
+        cached_data = redis_client.get(cache_key)
     except Exception as e:
-        print("🛑 Ошибка при получении погоды:", str(e))
-        traceback.print_exc()
+        print(f"Error retrieving cached weather data: {str(e)}")
         return None
+    if not cached_data:
+        return None
+    entry = json.loads(cached_data)
+    if "fetched_at" not in entry:
+        # Written before entries carried their age: serve it, but as stale
+        entry = {"data": entry, "fetched_at": 0}
+    return entry
 
-def get_cached_weather_by_coordinates(lat: float, lon: float) -> Optional[Dict]:
-    """Retrieve cached weather data from Redis by coordinates."""
+def _cache_write(cache_key: str, data: Dict):
     try:
-        cache_key = get_weather_cache_key(lat, lon)
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            return json.loads(cached_data)
-        return None
+        entry = {"data": data, "fetched_at": time.time()}
+        redis_client.setex(cache_key, WEATHER_STALE_TTL, json.dumps(entry))
     except Exception as e:
-        print(f"Error retrieving cached weather data: {str(e)}")
+        print(f"Error caching weather data: {str(e)}")
+
+def _acquire(cache_key: str) -> Optional[str]:
+    """Lock token if this caller should fetch, None if another fetch is in flight"""
+    token = uuid.uuid4().hex
+    try:
+        if redis_client.set(f"lock:{cache_key}", token, nx=True, ex=WEATHER_LOCK_TTL):
+            return token
         return None
+    except Exception:
+        return token  # No coordination without Redis, just fetch
 
-def fetch_weather_forecast_by_coordinates(lat: float, lon: float, days: int = 5) -> Optional[Dict]:
-    """Fetch weather forecast data from OpenWeatherMap API using coordinates."""
+def _release(cache_key: str, token: str):
+    try:
+        _release_script(keys=[f"lock:{cache_key}"], args=[token])
+    except Exception:
+        pass
+
+def _locked(cache_key: str) -> bool:
+    try:
+        return bool(redis_client.exists(f"lock:{cache_key}"))
+    except Exception:
+        return False
+
+def _fill(cache_key: str, fetch: Callable[[], Optional[Dict]], token: str) -> Optional[Dict]:
+    try:
+        data = fetch()
+        if data:
+            _cache_write(cache_key, data)
+        return data
+    finally:
+        _release(cache_key, token)
+
+def _read_through(cache_key: str, fetch: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+    """
+    Fresh entries are returned as is; stale ones are returned immediately while a
+    single background fetch refreshes them; on a miss one caller fetches and the
+    rest wait for its result instead of calling upstream too.
+    Blocks while waiting: call it from Celery or a worker thread (asyncio.to_thread),
+    never on the event loop; async code uses services/weather_async.py.
+    """
+    entry = _cache_read(cache_key)
+    if entry and time.time() - entry["fetched_at"] < WEATHER_FRESH_TTL:
+        return entry["data"]
+
+    token = _acquire(cache_key)
+    if entry:
+        if token:
+            threading.Thread(target=_fill, args=(cache_key, fetch, token), daemon=True).start()
+        return entry["data"]
+    if token:
+        return _fill(cache_key, fetch, token)
+
+    deadline = time.monotonic() + WEATHER_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        entry = _cache_read(cache_key)
+        if entry:
+            return entry["data"]
+        if not _locked(cache_key):
+            break  # The fetch failed; don't pile onto the upstream
+    return None
+
+def weather_params(lat: float, lon: float) -> Dict:
     if not WEATHER_API_KEY:
         raise ValueError("OPENWEATHERMAP_API_KEY environment variable is not set")
-
-    # OpenWeatherMap 5-day forecast API
-    url = "https://api.openweathermap.org/data/2.5/forecast"
-    params = {
+    return {
         "lat": lat,
         "lon": lon,
         "appid": WEATHER_API_KEY,
         "units": "metric"  # Use Celsius for temperature
     }
 
+def _city_name(name: str) -> str:
+    # Replace "Nur-Sultan" with "Astana"
+    return "Astana" if name == "Nur-Sultan" else name
+
+def parse_current(data: Dict, lat: float, lon: float) -> Dict:
+    """Relevant fields of an OpenWeatherMap current weather response"""
+    return {
+        "temperature": data["main"]["temp"],
+        "feels_like": data["main"]["feels_like"],
+        "humidity": data["main"]["humidity"],
+        "pressure": data["main"]["pressure"],
+        "description": data["weather"][0]["description"],
+        "condition": data["weather"][0]["main"],
+        "wind_speed": data["wind"]["speed"],
+        "city": _city_name(data.get("name", "Unknown")),
+        "country": data["sys"]["country"],
+        "coordinates": {"lat": lat, "lon": lon},
+        "last_updated": datetime.utcnow().isoformat()
+    }
+
+def parse_forecast(data: Dict, lat: float, lon: float) -> Dict:
+    """
+    OpenWeatherMap 5-day/3-hour forecast response as-is in columns (one list per
+    field), aggregated per request by aggregate_forecast.
+    """
+    items = sorted(data["list"], key=lambda item: item["dt"])
+    return {
+        "city": _city_name(data["city"]["name"]),
+        "country": data["city"]["country"],
+        "timezone": data["city"].get("timezone", 0),  # UTC offset in seconds
+        "coordinates": {"lat": lat, "lon": lon},
+        "dt": [item["dt"] for item in items],
+        "temperature": [item["main"]["temp"] for item in items],
+        "feels_like": [item["main"]["feels_like"] for item in items],
+        "humidity": [item["main"]["humidity"] for item in items],
+        "pressure": [item["main"]["pressure"] for item in items],
+        "wind_speed": [item["wind"]["speed"] for item in items],
+        "condition": [item["weather"][0]["main"] for item in items],
+        "description": [item["weather"][0]["description"] for item in items],
+        "last_updated": datetime.utcnow().isoformat()
+    }
+
+def _fetch_current(lat: float, lon: float) -> Optional[Dict]:
+    """Fetch current weather data from OpenWeatherMap API using coordinates."""
+    params = weather_params(lat, lon)
     try:
-        response = requests.get(url, params=params)
+        response = requests.get(CURRENT_WEATHER_URL, params=params, timeout=(WEATHER_CONNECT_TIMEOUT, WEATHER_TIMEOUT))
         response.raise_for_status()
-        data = response.json()
-        
-        # Get city name and replace "Nur-Sultan" with "Astana"
-        city_name = data["city"]["name"]
-        if city_name == "Nur-Sultan":
-            city_name = "Astana"
-        
-        # Process forecast data - group by day
-        forecast_by_day = {}
-        
-        for item in data["list"]:
-            # Get date from timestamp
-            date_str = datetime.fromtimestamp(item["dt"]).strftime("%Y-%m-%d")
-            
-            if date_str not in forecast_by_day:
-                forecast_by_day[date_str] = {
-                    "date": date_str,
-                    "date_formatted": datetime.fromtimestamp(item["dt"]).strftime("%A, %B %d"),
-                    "temperatures": [],
-                    "conditions": [],
-                    "descriptions": [],
-                    "humidity": [],
-                    "wind_speeds": [],
-                    "hourly_data": []
-                }
-            
-            forecast_by_day[date_str]["temperatures"].append(item["main"]["temp"])
-            forecast_by_day[date_str]["conditions"].append(item["weather"][0]["main"])
-            forecast_by_day[date_str]["descriptions"].append(item["weather"][0]["description"])
-            forecast_by_day[date_str]["humidity"].append(item["main"]["humidity"])
-            forecast_by_day[date_str]["wind_speeds"].append(item["wind"]["speed"])
-            forecast_by_day[date_str]["hourly_data"].append({
-                "time": datetime.fromtimestamp(item["dt"]).strftime("%H:%M"),
-                "temperature": item["main"]["temp"],
-                "condition": item["weather"][0]["main"],
-                "description": item["weather"][0]["description"]
-            })
-        
-        # Calculate daily averages and ranges
-        daily_forecasts = []
-        for date_str, day_data in sorted(forecast_by_day.items()):
-            temps = day_data["temperatures"]
-            daily_forecast = {
-                "date": day_data["date"],
-                "date_formatted": day_data["date_formatted"],
-                "temperature_min": round(min(temps)),
-                "temperature_max": round(max(temps)),
-                "temperature_avg": round(sum(temps) / len(temps)),
-                "condition": max(set(day_data["conditions"]), key=day_data["conditions"].count),
-                "description": max(set(day_data["descriptions"]), key=day_data["descriptions"].count),
-                "humidity_avg": round(sum(day_data["humidity"]) / len(day_data["humidity"])),
-                "wind_speed_avg": round(sum(day_data["wind_speeds"]) / len(day_data["wind_speeds"]), 1),
-                "hourly_data": day_data["hourly_data"]
-            }
-            daily_forecasts.append(daily_forecast)
-        
-        # Limit to requested number of days
-        daily_forecasts = daily_forecasts[:days]
-        
-        forecast_data = {
-            "city": city_name,
-            "country": data["city"]["country"],
-            "coordinates": {"lat": lat, "lon": lon},
-            "forecast_days": len(daily_forecasts),
-            "daily_forecasts": daily_forecasts,
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        
-        # Store in Redis with coordinate-based key
-        cache_key = f"forecast:{lat}:{lon}:{days}"
-        redis_client.setex(cache_key, 1800, json.dumps(forecast_data))  # Cache for 30 minutes
-        return forecast_data
-        
+        return parse_current(response.json(), lat, lon)
     except Exception as e:
-        print("🛑 Ошибка при получении прогноза погоды:", str(e))
+        print("🛑 Ошибка при получении погоды:", str(e))
         traceback.print_exc()
         return None
 
-def get_cached_weather_forecast_by_coordinates(lat: float, lon: float, days: int = 5) -> Optional[Dict]:
-    """Retrieve cached weather forecast data from Redis by coordinates."""
+def fetch_weather_by_coordinates(lat: float, lon: float) -> Optional[Dict]:
+    """Fetch current weather for the grid cell of (lat, lon) and cache it, bypassing the cache."""
+    lat, lon = snap_coordinates(lat, lon)
+    weather_data = _fetch_current(lat, lon)
+    if weather_data:
+        _cache_write(get_weather_cache_key(lat, lon), weather_data)
+    return weather_data
+
+def get_cached_weather_by_coordinates(lat: float, lon: float) -> Optional[Dict]:
+    """Retrieve cached (possibly stale) weather data from Redis by coordinates."""
+    entry = _cache_read(get_weather_cache_key(lat, lon))
+    return entry["data"] if entry else None
+
+def weather_by_coordinates(lat: float, lon: float) -> Optional[Dict]:
+    """Current weather for (lat, lon): cached, stale-while-revalidate, one upstream fetch per cell."""
+    lat, lon = snap_coordinates(lat, lon)
+    # A fresh forecast already has a slot close to now; no need for a second upstream call
+    entry = _cache_read(get_forecast_cache_key(lat, lon))
+    if entry and time.time() - entry["fetched_at"] < WEATHER_FRESH_TTL:
+        weather_data = current_from_forecast(entry["data"])
+        if weather_data:
+            return weather_data
+    return _read_through(get_weather_cache_key(lat, lon), lambda: _fetch_current(lat, lon))
+
+def _fetch_forecast(lat: float, lon: float) -> Optional[Dict]:
+    """Fetch the 5-day/3-hour forecast from OpenWeatherMap API using coordinates."""
+    params = weather_params(lat, lon)
     try:
-        cache_key = f"forecast:{lat}:{lon}:{days}"
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            return json.loads(cached_data)
-        return None
+        response = requests.get(FORECAST_URL, params=params, timeout=(WEATHER_CONNECT_TIMEOUT, WEATHER_TIMEOUT))
+        response.raise_for_status()
+        return parse_forecast(response.json(), lat, lon)
     except Exception as e:
-        print(f"Error retrieving cached forecast data: {str(e)}")
+        print("🛑 Ошибка при получении прогноза погоды:", str(e))
+        traceback.print_exc()
         return None
 
+def _day_mode(values, day_index: np.ndarray, n_days: int) -> np.ndarray:
+    """Most frequent value per day"""
+    labels, codes = np.unique(np.asarray(values), return_inverse=True)
+    counts = np.zeros((n_days, len(labels)), dtype=np.int64)
+    np.add.at(counts, (day_index, codes), 1)
+    return labels[counts.argmax(axis=1)]
+
+def aggregate_forecast(raw: Dict, days: int = 5) -> Dict:
+    """Per-day min/max/avg and most frequent condition for the first `days` days of a raw forecast"""
+    local_time = (np.asarray(raw["dt"], dtype=np.int64) + raw.get("timezone", 0)).astype("datetime64[s]")
+    dates = local_time.astype("datetime64[D]")
+
+    # Slots are sorted, so each day is a contiguous run starting where the date changes
+    starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]]) if len(dates) else np.array([], dtype=np.int64)
+    end = int(starts[days]) if len(starts) > days else len(dates)
+    starts = starts[:days]
+    counts = np.diff(np.r_[starts, end])
+    day_index = np.repeat(np.arange(len(starts)), counts)
+
+    daily_forecasts = []
+    if len(starts):
+        temperature = np.asarray(raw["temperature"][:end], dtype=float)
+        humidity = np.asarray(raw["humidity"][:end], dtype=float)
+        wind_speed = np.asarray(raw["wind_speed"][:end], dtype=float)
+        temperature_min = np.minimum.reduceat(temperature, starts).round()
+        temperature_max = np.maximum.reduceat(temperature, starts).round()
+        temperature_avg = (np.add.reduceat(temperature, starts) / counts).round()
+        humidity_avg = (np.add.reduceat(humidity, starts) / counts).round()
+        wind_speed_avg = (np.add.reduceat(wind_speed, starts) / counts).round(1)
+        conditions = _day_mode(raw["condition"][:end], day_index, len(starts))
+        descriptions = _day_mode(raw["description"][:end], day_index, len(starts))
+        times = np.datetime_as_string(local_time[:end], unit="m")
+
+        for i, (first, last) in enumerate(zip(starts, np.r_[starts[1:], end])):
+            day = dates[first].item()
+            daily_forecasts.append({
+                "date": day.strftime("%Y-%m-%d"),
+                "date_formatted": day.strftime("%A, %B %d"),
+                "temperature_min": int(temperature_min[i]),
+                "temperature_max": int(temperature_max[i]),
+                "temperature_avg": int(temperature_avg[i]),
+                "condition": str(conditions[i]),
+                "description": str(descriptions[i]),
+                "humidity_avg": int(humidity_avg[i]),
+                "wind_speed_avg": float(wind_speed_avg[i]),
+                "hourly_data": [
+                    {
+                        "time": times[j][-5:],
+                        "temperature": raw["temperature"][j],
+                        "condition": raw["condition"][j],
+                        "description": raw["description"][j]
+                    }
+                    for j in range(first, last)
+                ]
+            })
+
+    return {
+        "city": raw["city"],
+        "country": raw["country"],
+        "coordinates": raw["coordinates"],
+        "forecast_days": len(daily_forecasts),
+        "daily_forecasts": daily_forecasts,
+        "last_updated": raw["last_updated"]
+    }
+
+def current_from_forecast(raw: Dict) -> Optional[Dict]:
+    """Current weather from the forecast slot closest to now, None if no slot is close enough"""
+    if not raw.get("dt"):
+        return None
+    distance = np.abs(np.asarray(raw["dt"], dtype=np.int64) - int(time.time()))
+    i = int(distance.argmin())
+    if distance[i] > CURRENT_FROM_FORECAST_WINDOW:
+        return None
+    return {
+        "temperature": raw["temperature"][i],
+        "feels_like": raw["feels_like"][i],
+        "humidity": raw["humidity"][i],
+        "pressure": raw["pressure"][i],
+        "description": raw["description"][i],
+        "condition": raw["condition"][i],
+        "wind_speed": raw["wind_speed"][i],
+        "city": raw["city"],
+        "country": raw["country"],
+        "coordinates": raw["coordinates"],
+        "last_updated": raw["last_updated"]
+    }
+
+def fetch_weather_forecast_by_coordinates(lat: float, lon: float, days: int = 5) -> Optional[Dict]:
+    """Fetch the forecast for the grid cell of (lat, lon) and cache it, bypassing the cache."""
+    lat, lon = snap_coordinates(lat, lon)
+    raw = _fetch_forecast(lat, lon)
+    if not raw:
+        return None
+    _cache_write(get_forecast_cache_key(lat, lon), raw)
+    return aggregate_forecast(raw, days)
+
+def get_cached_weather_forecast_by_coordinates(lat: float, lon: float, days: int = 5) -> Optional[Dict]:
+    """Retrieve cached (possibly stale) weather forecast data from Redis by coordinates."""
+    entry = _cache_read(get_forecast_cache_key(lat, lon))
+    return aggregate_forecast(entry["data"], days) if entry else None
+
+def weather_forecast_by_coordinates(lat: float, lon: float, days: int = 5) -> Optional[Dict]:
+    """Forecast for (lat, lon): cached, stale-while-revalidate, one upstream fetch per cell."""
+    lat, lon = snap_coordinates(lat, lon)
+    raw = _read_through(get_forecast_cache_key(lat, lon), lambda: _fetch_forecast(lat, lon))
+    return aggregate_forecast(raw, days) if raw else None
+
 # Legacy functions for backward compatibility
 def fetch_weather() -> Optional[Dict]:
     """Fetch current weather data from OpenWeatherMap API for Almaty (legacy)."""
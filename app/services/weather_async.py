@@ -0,0 +1,243 @@
+"""
+Async counterparts of services/weather.py for the /weather routes.
+Celery tasks and thread-pool callers keep using the sync module; both share
+the same Redis entries, keys and parsing.
+
+Upstream calls go through one pooled httpx client with timeouts, are retried
+with exponential backoff, and stop for a while after repeated failures
+(circuit breaker). Whenever OpenWeatherMap can't answer, the last known entry
+is served, however stale.
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+
+import httpx
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from .weather import (
+    CURRENT_WEATHER_URL, FORECAST_URL, WEATHER_CONNECT_TIMEOUT, WEATHER_TIMEOUT, WEATHER_RETRIES,
+    WEATHER_BACKOFF, WEATHER_FRESH_TTL, WEATHER_STALE_TTL, WEATHER_LOCK_TTL, WEATHER_LOCK_WAIT,
+    RELEASE_LOCK_SCRIPT,
+    snap_coordinates, get_weather_cache_key, get_forecast_cache_key, weather_params,
+    parse_current, parse_forecast, aggregate_forecast, current_from_forecast
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failed calls that open the circuit, and how long it stays open
+WEATHER_BREAKER_THRESHOLD = int(os.getenv("WEATHER_BREAKER_THRESHOLD", 5))
+WEATHER_BREAKER_COOLDOWN = float(os.getenv("WEATHER_BREAKER_COOLDOWN", 30))
+
+# Same database as the sync client so both see the same entries
+redis_client = redis.Redis(
+    host=os.getenv("REDIS_HOST", "redis"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=0,
+    decode_responses=True
+)
+_release_script = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+
+_client: Optional[httpx.AsyncClient] = None
+# Background refreshes, referenced so they aren't garbage collected mid-flight
+_refreshes = set()
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Per process: after `threshold` consecutive failures calls are refused for
+    `cooldown` seconds, then a single trial call decides whether to close again.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        # A trial that never reported back (cancelled request) expires after a cooldown too
+        if self._trial_at is not None and now - self._trial_at < self.cooldown:
+            return False
+        self._trial_at = now
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self._trial_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_at = None
+
+
+breaker = CircuitBreaker(WEATHER_BREAKER_THRESHOLD, WEATHER_BREAKER_COOLDOWN)
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(WEATHER_TIMEOUT, connect=WEATHER_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+    return _client
+
+async def close():
+    """Close the pooled HTTP client (app shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+async def _upstream_get(url: str, params: Dict) -> Dict:
+    """GET with retries and backoff, guarded by the circuit breaker"""
+    if not breaker.allow():
+        raise UpstreamError("OpenWeatherMap circuit is open")
+    for attempt in range(WEATHER_RETRIES + 1):
+        try:
+            response = await _get_client().get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            breaker.success()
+            return data
+        except Exception as e:
+            if attempt < WEATHER_RETRIES and _retryable(e):
+                await asyncio.sleep(WEATHER_BACKOFF * 2 ** attempt * (1 + random.random()))
+                continue
+            breaker.failure()
+            raise UpstreamError(f"OpenWeatherMap request failed: {e!r}") from e
+
+
+async def _cache_read(cache_key: str) -> Optional[Dict]:
+    try:
+        cached_data = await redis_client.get(cache_key)
+    except Exception as e:
+        logger.warning(f"Weather cache read failed for {cache_key}: {str(e)}")
+        return None
+    if not cached_data:
+        return None
+    entry = json.loads(cached_data)
+    if "fetched_at" not in entry:
+        entry = {"data": entry, "fetched_at": 0}
+    return entry
+
+async def _cache_write(cache_key: str, data: Dict):
+    try:
+        entry = {"data": data, "fetched_at": time.time()}
+        await redis_client.setex(cache_key, WEATHER_STALE_TTL, json.dumps(entry))
+    except Exception as e:
+        logger.warning(f"Weather cache write failed for {cache_key}: {str(e)}")
+
+async def _acquire(cache_key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    try:
+        if await redis_client.set(f"lock:{cache_key}", token, nx=True, ex=WEATHER_LOCK_TTL):
+            return token
+        return None
+    except Exception:
+        return token
+
+async def _release(cache_key: str, token: str):
+    try:
+        await _release_script(keys=[f"lock:{cache_key}"], args=[token])
+    except Exception:
+        pass
+
+async def _locked(cache_key: str) -> bool:
+    try:
+        return bool(await redis_client.exists(f"lock:{cache_key}"))
+    except Exception:
+        return False
+
+
+async def _fill(cache_key: str, url: str, params: Callable[[], Dict], parse: Callable[[Dict], Dict], token: str) -> Optional[Dict]:
+    try:
+        data = parse(await _upstream_get(url, params()))
+        await _cache_write(cache_key, data)
+        return data
+    except Exception as e:
+        logger.warning(f"Weather refresh failed for {cache_key}: {str(e)}")
+        return None
+    finally:
+        await _release(cache_key, token)
+
+async def _read_through(cache_key: str, url: str, params: Callable[[], Dict], parse: Callable[[Dict], Dict]) -> Optional[Dict]:
+    """
+    Same policy as weather._read_through; stale entries are served whether or not the
+    refresh succeeds. `params` is only called to fetch, so a missing API key doesn't
+    get in the way of cached entries.
+    """
+    entry = await _cache_read(cache_key)
+    if entry and time.time() - entry["fetched_at"] < WEATHER_FRESH_TTL:
+        return entry["data"]
+
+    token = await _acquire(cache_key)
+    if entry:
+        if token:
+            task = asyncio.create_task(_fill(cache_key, url, params, parse, token))
+            _refreshes.add(task)
+            task.add_done_callback(_refreshes.discard)
+        return entry["data"]
+    if token:
+        return await _fill(cache_key, url, params, parse, token)
+
+    deadline = time.monotonic() + WEATHER_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+        entry = await _cache_read(cache_key)
+        if entry:
+            return entry["data"]
+        if not await _locked(cache_key):
+            break
+    return None
+
+
+async def weather_by_coordinates(lat: float, lon: float) -> Optional[Dict]:
+    """Current weather for (lat, lon), see weather.weather_by_coordinates"""
+    lat, lon = snap_coordinates(lat, lon)
+    entry = await _cache_read(get_forecast_cache_key(lat, lon))
+    if entry and time.time() - entry["fetched_at"] < WEATHER_FRESH_TTL:
+        weather_data = current_from_forecast(entry["data"])
+        if weather_data:
+            return weather_data
+    return await _read_through(
+        get_weather_cache_key(lat, lon), CURRENT_WEATHER_URL, lambda: weather_params(lat, lon),
+        lambda data: parse_current(data, lat, lon)
+    )
+
+async def weather_forecast_by_coordinates(lat: float, lon: float, days: int = 5) -> Optional[Dict]:
+    """Forecast for (lat, lon), see weather.weather_forecast_by_coordinates"""
+    lat, lon = snap_coordinates(lat, lon)
+    raw = await _read_through(
+        get_forecast_cache_key(lat, lon), FORECAST_URL, lambda: weather_params(lat, lon),
+        lambda data: parse_forecast(data, lat, lon)
+    )
+    return aggregate_forecast(raw, days) if raw else None
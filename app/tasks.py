@@ -11,8 +11,10 @@ import logging
 import json
 import base64
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from .database import SessionLocal
 from . import crud, models, schemas
+from .services import task_idempotency, rate_limit, embeddings, vector_index
 
 # Load environment variables
 load_dotenv()
@@ -25,12 +27,33 @@ celery_app = Celery(
     backend=os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
 )
 
+# Interactive classification and bulk uploads run on separate queues so a large
+# batch never sits in front of a single upload. Workers take one task at a time
+# so throttled bulk tasks don't pile up in a worker's prefetch buffer.
+celery_app.conf.task_routes = {
+    'app.tasks.classify_image_task': {'queue': rate_limit.INTERACTIVE},
+    'app.tasks.process_single_image_task': {'queue': rate_limit.BULK},
+    'app.tasks.process_bulk_images_task': {'queue': rate_limit.BULK},
+    'app.tasks.embed_clothing_item_task': {'queue': rate_limit.BULK},
+    'app.tasks.precompute_forecast_outfits_task': {'queue': rate_limit.BULK},
+}
+celery_app.conf.worker_prefetch_multiplier = 1
+
+# Retries caused by rate limiting are not failures, so allow plenty of them
+THROTTLE_MAX_RETRIES = 120
+# Waiting for a concurrent delivery of the same image is bounded by its claim TTL
+CLAIM_MAX_RETRIES = task_idempotency.IDEMPOTENCY_LOCK_TTL // 60 + 1
+
 # Configure Celery Beat schedule
 celery_app.conf.beat_schedule = {
     'update-weather-every-hour': {
         'task': 'app.tasks.update_weather_task',
         'schedule': crontab(minute=0),  # Run at the start of every hour
     },
+    'precompute-forecast-outfits-every-hour': {
+        'task': 'app.tasks.precompute_forecast_outfits_task',
+        'schedule': crontab(minute=5),  # After the hourly weather refresh
+    },
 }
 
 r = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), db=1)
@@ -52,6 +75,9 @@ def get_db():
 @celery_app.task(bind=True)
 def classify_image_task(self, image_bytes: bytes, user_id: int):
     key = redis_key_for_user(user_id)
+    wait = rate_limit.acquire_provider_slot(rate_limit.INTERACTIVE)
+    if wait > 0:
+        raise self.retry(countdown=wait, max_retries=THROTTLE_MAX_RETRIES)
     try:
         result = ai_classify_clothing(image_bytes)
         return result
@@ -59,22 +85,83 @@ def classify_image_task(self, image_bytes: bytes, user_id: int):
         # Удаляем task_id из Redis даже если была ошибка
         r.srem(key, self.request.id)
 
-@celery_app.task(bind=True)
-def process_single_image_task(self, image_data: dict, user_id: int, batch_id: str, image_index: int):
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None)
+def process_single_image_task(
+    self,
+    image_data: dict,
+    user_id: int,
+    batch_id: str,
+    image_index: int,
+    throttle_retries: int = 0,
+    claim_retries: int = 0
+):
     """
     Process a single image: upload to GCS, classify with AI, and add to wardrobe
-    This runs in parallel with other image processing tasks
+    This runs in parallel with other image processing tasks.
+
+    The task is idempotent per (batch_id, image_index, content hash): it is acked only
+    after it finishes, so a crashed worker's message is redelivered, and a re-run
+    returns the previous result instead of uploading/classifying/inserting again.
     """
     batch_key = redis_key_for_batch(batch_id)
+    filename = image_data.get('filename', f"image_{image_index + 1}")
+    
+    # Decode base64 file data
+    file_data = base64.b64decode(image_data['file_data'])
+    idempotency_key = task_idempotency.build_key(batch_id, image_index, task_idempotency.content_hash(file_data))
+    
+    prior_result = task_idempotency.get_result(idempotency_key)
+    if prior_result:
+        logger.info(f"Image {image_index + 1} of batch {batch_id} already processed, returning previous result")
+        # The first run may have died before counting it; counting is idempotent per image
+        update_batch_status(batch_key, prior_result, None)
+        return prior_result
+    
+    # Waiting for a concurrent delivery and throttling are counted separately (passed
+    # along in the retry kwargs), so neither uses up the other's retry budget
+    if not task_idempotency.claim(idempotency_key):
+        # Another delivery of the same image is still running
+        if claim_retries >= CLAIM_MAX_RETRIES:
+            give_up(batch_key, filename, image_index, "Image is still being processed by another worker")
+        logger.info(f"Image {image_index + 1} of batch {batch_id} is being processed elsewhere, retrying later")
+        raise self.retry(countdown=60, kwargs={"throttle_retries": throttle_retries, "claim_retries": claim_retries + 1})
     
+    # Only the delivery holding the claim spends rate-limit tokens
+    wait = rate_limit.acquire_bulk_slot(user_id)
+    if wait > 0:
+        task_idempotency.release(idempotency_key)
+        if throttle_retries >= THROTTLE_MAX_RETRIES:
+            give_up(batch_key, filename, image_index, "Rate limit wait exceeded, try again later")
+        logger.info(f"Throttling image {image_index + 1} of batch {batch_id} for {wait:.1f}s")
+        raise self.retry(countdown=wait, kwargs={"throttle_retries": throttle_retries + 1, "claim_retries": claim_retries})
+    
+    uploaded_url = None
     try:
-        filename = image_data['filename']
         content_type = image_data['content_type']
-        # Decode base64 file data
-        file_data = base64.b64decode(image_data['file_data'])
         
         logger.info(f"Processing image {image_index + 1}: {filename}")
         
+        db = SessionLocal()
+        try:
+            # The Redis result may have expired; the row is the source of truth
+            existing_item = crud.get_clothing_item_by_idempotency_key(db, user_id, idempotency_key)
+            if existing_item:
+                # Nothing left to call the provider for
+                rate_limit.refund_bulk_slot(user_id)
+                result = {
+                    "filename": filename,
+                    "status": "success",
+                    "clothing_item_id": existing_item.id,
+                    "image_url": existing_item.image_url,
+                    "classification": None,
+                    "image_index": image_index
+                }
+                task_idempotency.store_result(idempotency_key, result)
+                update_batch_status(batch_key, result, None)
+                return result
+        finally:
+            db.close()
+        
         # Validate and compress image
         is_valid, error_msg = ImageCompressionService.validate_image(file_data)
         if not is_valid:
@@ -95,6 +182,7 @@ def process_single_image_task(self, image_data: dict, user_id: int, batch_id: st
         
         if not public_url:
             raise Exception("Failed to upload to cloud storage")
+        uploaded_url = public_url
         
         # Classify with AI (this runs in parallel for each image)
         classification_result = None
@@ -103,6 +191,13 @@ def process_single_image_task(self, image_data: dict, user_id: int, batch_id: st
         except Exception as classify_error:
             logger.warning(f"Classification failed for {filename}: {str(classify_error)}")
         
+        # CLIP embedding for similarity search (local model, no API quota)
+        embedding = None
+        try:
+            embedding = embeddings.embed_image_bytes(file_data)
+        except Exception as embed_error:
+            logger.warning(f"Embedding failed for {filename}: {str(embed_error)}")
+        
         # Prepare clothing item data
         clothing_data = {
             "name": classification_result.get("name", "Unknown Item") if classification_result else "Unknown Item",
@@ -122,7 +217,28 @@ def process_single_image_task(self, image_data: dict, user_id: int, batch_id: st
         # Add to database
         db = SessionLocal()
         try:
-            clothing_item = crud.create_clothing_item(db, schemas.ClothingItemCreate(**clothing_data), user_id)
+            try:
+                clothing_item = crud.create_clothing_item(
+                    db,
+                    schemas.ClothingItemCreate(**clothing_data),
+                    user_id,
+                    idempotency_key=idempotency_key
+                )
+                uploaded_url = None
+                if embedding is not None:
+                    try:
+                        vector_index.index_item(db, user_id, clothing_item.id, embedding)
+                    except Exception as index_error:
+                        logger.warning(f"Failed to index embedding of item {clothing_item.id}: {str(index_error)}")
+            except IntegrityError:
+                # A concurrent run won the race: keep its row and drop our blob
+                db.rollback()
+                clothing_item = crud.get_clothing_item_by_idempotency_key(db, user_id, idempotency_key)
+                if not clothing_item:
+                    raise
+                gcs_uploader.delete_file(uploaded_url)
+                uploaded_url = None
+                public_url = clothing_item.image_url
             
             result = {
                 "filename": filename,
@@ -135,6 +251,8 @@ def process_single_image_task(self, image_data: dict, user_id: int, batch_id: st
             
             logger.info(f"Successfully processed {filename} -> item ID: {clothing_item.id}")
             
+            task_idempotency.store_result(idempotency_key, result)
+            
             # Update batch status
             update_batch_status(batch_key, result, None)
             
@@ -147,6 +265,11 @@ def process_single_image_task(self, image_data: dict, user_id: int, batch_id: st
         error_msg = str(e)
         logger.error(f"Failed to process {filename}: {error_msg}")
         
+        # Don't leave a blob behind for an item that was never saved
+        if uploaded_url:
+            gcs_uploader.delete_file(uploaded_url)
+        task_idempotency.release(idempotency_key)
+        
         error_result = {
             "filename": filename,
             "error": error_msg,
@@ -158,6 +281,16 @@ def process_single_image_task(self, image_data: dict, user_id: int, batch_id: st
         
         raise
 
+def give_up(batch_key: str, filename: str, image_index: int, error_msg: str):
+    """Record the image as failed in the batch status and stop retrying"""
+    logger.error(f"Giving up on {filename}: {error_msg}")
+    update_batch_status(batch_key, None, {
+        "filename": filename,
+        "error": error_msg,
+        "image_index": image_index
+    })
+    raise Exception(error_msg)
+
 def update_batch_status(batch_key: str, success_result: dict = None, error_result: dict = None):
     """Update batch processing status in Redis"""
     try:
@@ -168,6 +301,19 @@ def update_batch_status(batch_key: str, success_result: dict = None, error_resul
         else:
             return  # Batch not found
         
+        # Redelivered tasks report the same image again: count each image once,
+        # and let a later success replace an earlier failure
+        image_index = (success_result or error_result or {}).get("image_index")
+        if image_index is not None:
+            if any(item.get("image_index") == image_index for item in status["results"]):
+                return
+            failed_before = [item for item in status["errors"] if item.get("image_index") == image_index]
+            if failed_before:
+                if error_result:
+                    return
+                status["errors"] = [item for item in status["errors"] if item.get("image_index") != image_index]
+                status["failed"] -= len(failed_before)
+        
         # Update status based on result
         if success_result:
             status["results"].append(success_result)
@@ -255,6 +401,24 @@ def process_bulk_images_task(self, images_data: list, user_id: int, batch_id: st
         
         raise
 
+@celery_app.task(bind=True, max_retries=3)
+def embed_clothing_item_task(self, item_id: int):
+    """Compute the CLIP embedding of an item created or re-photographed through the API"""
+    db = SessionLocal()
+    try:
+        item = db.get(models.ClothingItem, item_id)
+        if not item or not item.image_url:
+            return None
+        
+        embedding = embeddings.embed_image_url(item.image_url)
+        if embedding is None:
+            raise self.retry(countdown=30)
+        
+        vector_index.index_item(db, item.owner_id, item_id, embedding)
+        return item_id
+    finally:
+        db.close()
+
 @celery_app.task
 def update_weather_task():
     """Celery task to update weather data."""
@@ -265,3 +429,16 @@ def update_weather_task():
         return {"status": "error", "message": "Failed to fetch weather data"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+@celery_app.task
+def precompute_forecast_outfits_task():
+    """Refresh forecasts and outfit recommendations of the most requested areas"""
+    from .services.forecast_outfits import precompute
+
+    try:
+        refreshed = precompute()
+        logger.info(f"Forecast outfits regenerated for {refreshed} area(s)")
+        return {"status": "success", "refreshed": refreshed}
+    except Exception as e:
+        logger.error(f"Forecast outfit precomputation failed: {str(e)}")
+        return {"status": "error", "message": str(e)}
@@ -0,0 +1,40 @@
+"""
+Convert the catalog CSV into the columnar store read by the API and workers
+(app/services/catalog.py). Running processes switch to the new version within
+CATALOG_CHECK_INTERVAL seconds, no restart needed.
+
+    python build_catalog.py [path/to/catalog.csv] [--keep N]
+"""
+import os
+import argparse
+import shutil
+
+import pandas as pd
+
+from app.services.catalog import CSV_FILE_PATH, CATALOG_STORE_DIR, CURRENT_FILE, write_store
+
+KEEP_VERSIONS = 3
+
+
+def prune_old_versions(keep: int):
+    # Old versions stay until workers have had time to switch; keep the newest few
+    versions = sorted(
+        name for name in os.listdir(CATALOG_STORE_DIR)
+        if os.path.isdir(os.path.join(CATALOG_STORE_DIR, name))
+    )
+    with open(os.path.join(CATALOG_STORE_DIR, CURRENT_FILE)) as f:
+        current = f.read().strip()
+    for name in versions[:-keep]:
+        if name != current:
+            shutil.rmtree(os.path.join(CATALOG_STORE_DIR, name), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("csv", nargs="?", default=CSV_FILE_PATH)
+    parser.add_argument("--keep", type=int, default=KEEP_VERSIONS, help="catalog versions to keep on disk")
+    args = parser.parse_args()
+
+    version = write_store(pd.read_csv(args.csv))
+    prune_old_versions(max(args.keep, 1))
+    print(f"✅ Catalog version {version} is now current ({CATALOG_STORE_DIR})")
@@ -0,0 +1,105 @@
+"""
+Compute CLIP embeddings of the classified.csv products for catalog matching.
+With pgvector they go to catalog_embeddings, otherwise to the numpy catalog index
+(app/services/vector_index.py). Already embedded products are reused unless --force is given.
+
+    python embed_catalog.py [--force]
+"""
+import os
+import sys
+
+import pandas as pd
+
+from app.database import SessionLocal
+from app import models
+from app.services import embeddings, vector_index
+
+CSV_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "classified.csv")
+COMMIT_EVERY = 20
+
+
+def load_products() -> list:
+    df = pd.read_csv(CSV_FILE_PATH).dropna(subset=["product_url", "image_url"])
+    df = df.drop_duplicates(subset=["product_url"])
+    return [
+        {
+            "product_url": row.product_url,
+            "name": row.name,
+            "price": float(row.price) if pd.notna(row.price) else None,
+            "image_url": row.image_url,
+            "gender": str(row.gender).lower() if pd.notna(row.gender) else None,
+            "piece_type": str(row.piece_type).lower() if pd.notna(row.piece_type) else None,
+            "main_color": row.main_color if pd.notna(row.main_color) else None,
+        }
+        for row in df.itertuples(index=False)
+    ]
+
+
+def embed_catalog_pgvector(products: list, force: bool = False):
+    from sqlalchemy.dialects.postgresql import insert
+
+    db = SessionLocal()
+    try:
+        existing = set() if force else {
+            url for (url,) in db.query(models.CatalogEmbedding.product_url)
+        }
+        done = failed = 0
+        for product in products:
+            if product["product_url"] in existing:
+                continue
+
+            embedding = embeddings.embed_image_url(product["image_url"])
+            if embedding is None:
+                failed += 1
+                continue
+
+            values = {**product, "embedding": embedding}
+            stmt = insert(models.CatalogEmbedding).values(**values)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["product_url"],
+                set_={key: stmt.excluded[key] for key in values if key != "product_url"}
+            ))
+            done += 1
+            if done % COMMIT_EVERY == 0:
+                db.commit()
+                print(f"… {done} products embedded")
+
+        db.commit()
+        print(f"✅ Embedded {done} catalog products ({failed} failed, {len(existing)} already present)")
+    finally:
+        db.close()
+
+
+def embed_catalog_numpy(products: list, force: bool = False):
+    # Reuse vectors from the current index, keyed by product URL
+    previous = {}
+    if not force:
+        old_products, _, _ = vector_index._load_catalog_meta()
+        ids, matrix = vector_index._store("catalog").load()
+        for row, vector in zip(ids, matrix):
+            if row < len(old_products):
+                previous[old_products[row]["product_url"]] = vector
+
+    kept_products, vectors = [], []
+    done = failed = 0
+    for product in products:
+        vector = previous.get(product["product_url"])
+        if vector is None:
+            vector = embeddings.embed_image_url(product["image_url"])
+            if vector is None:
+                failed += 1
+                continue
+            done += 1
+        kept_products.append(product)
+        vectors.append(vector)
+
+    vector_index.write_catalog_index(kept_products, vectors)
+    print(f"✅ Catalog index: {len(kept_products)} products ({done} embedded, {failed} failed)")
+
+
+if __name__ == "__main__":
+    force = "--force" in sys.argv
+    if embeddings.PGVECTOR_ENABLED:
+        embed_catalog_pgvector(load_products(), force)
+    else:
+        embed_catalog_numpy(load_products(), force)
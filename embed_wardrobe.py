@@ -0,0 +1,70 @@
+"""
+Backfill CLIP embeddings of wardrobe items that don't have one yet (items created
+before similarity search, or whose embedding task gave up). With pgvector they go
+to clothing_items.embedding, otherwise to the per-owner numpy index
+(app/services/vector_index.py).
+
+    python embed_wardrobe.py [--owner ID] [--force]
+"""
+import argparse
+from collections import defaultdict
+
+from app.database import SessionLocal
+from app import models
+from app.services import embeddings, vector_index
+
+PROGRESS_EVERY = 20
+
+
+def items_to_embed(db, owner_id=None, force: bool = False) -> list:
+    query = db.query(models.ClothingItem.id, models.ClothingItem.owner_id, models.ClothingItem.image_url).filter(
+        models.ClothingItem.image_url.isnot(None),
+        models.ClothingItem.image_url != ""
+    )
+    if owner_id is not None:
+        query = query.filter(models.ClothingItem.owner_id == owner_id)
+    if embeddings.PGVECTOR_ENABLED:
+        if not force:
+            query = query.filter(models.ClothingItem.embedding.is_(None))
+        return query.order_by(models.ClothingItem.id).all()
+
+    rows = query.order_by(models.ClothingItem.id).all()
+    if force:
+        return rows
+    by_owner = defaultdict(list)
+    for row in rows:
+        by_owner[row.owner_id].append(row)
+    missing = []
+    for owner, owner_rows in by_owner.items():
+        ids, _ = vector_index._owner_store(owner).load()
+        indexed = set(ids.tolist())
+        missing += [row for row in owner_rows if row.id not in indexed]
+    return missing
+
+
+def backfill(owner_id=None, force: bool = False):
+    db = SessionLocal()
+    try:
+        rows = items_to_embed(db, owner_id, force)
+        print(f"… {len(rows)} items to embed")
+        done = failed = 0
+        for row in rows:
+            embedding = embeddings.embed_image_url(row.image_url)
+            if embedding is None:
+                failed += 1
+                continue
+            vector_index.index_item(db, row.owner_id, row.id, embedding)
+            done += 1
+            if done % PROGRESS_EVERY == 0:
+                print(f"… {done} items embedded")
+        print(f"✅ Embedded {done} wardrobe items ({failed} failed)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--owner", type=int, default=None, help="only this user's items")
+    parser.add_argument("--force", action="store_true", help="re-embed items that already have an embedding")
+    args = parser.parse_args()
+    backfill(args.owner, args.force)
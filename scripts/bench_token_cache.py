@@ -0,0 +1,109 @@
+"""
+Microbenchmark of Firebase ID token verification with and without the claims
+cache (app/firebase_auth.py:verify_id_token_cached).
+
+Tokens are signed with a throwaway RSA key and verified with the same google-auth
+RS256 check firebase_admin uses, against certificates already in memory, so the
+numbers are CPU cost only (no certificate download, no network).
+
+    python -m scripts.bench_token_cache [--requests N] [--tokens N]
+"""
+import os
+import json
+import time
+import argparse
+import datetime
+
+# app.database builds its engines on import; no connection is made
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+from google.oauth2 import id_token as google_id_token
+
+from app import firebase_auth
+
+PROJECT_ID = "bench-project"
+KEY_ID = "bench-key"
+CERTS_URL = "https://bench.invalid/certs"
+
+
+def make_signer():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
+    return crypt.RSASigner.from_string(key_pem, key_id=KEY_ID), {KEY_ID: cert_pem}
+
+
+class CertsResponse:
+    status = 200
+
+    def __init__(self, certs):
+        self.data = json.dumps(certs).encode()
+        self.headers = {}
+
+
+def make_verifier(certs):
+    """RS256 verification as firebase_admin does it, with the certificates already fetched"""
+    request = lambda url, method="GET", **kwargs: CertsResponse(certs)  # noqa: E731
+
+    def verify_id_token(token):
+        return google_id_token.verify_token(token, request, audience=PROJECT_ID, certs_url=CERTS_URL)
+
+    return verify_id_token
+
+
+def make_token(signer, uid: str) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "uid": uid,
+        "iat": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+def timed(fn, tokens, requests: int) -> float:
+    """Mean microseconds per call over `requests` calls cycling through `tokens`"""
+    start = time.perf_counter()
+    for i in range(requests):
+        fn(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000, help="verifications per scenario")
+    parser.add_argument("--tokens", type=int, default=50, help="distinct tokens (users) in the mix")
+    args = parser.parse_args()
+
+    signer, certs = make_signer()
+    verify = make_verifier(certs)
+    tokens = [make_token(signer, f"user-{i}") for i in range(args.tokens)]
+    firebase_auth.auth.verify_id_token = verify
+
+    uncached = timed(verify, tokens, args.requests)
+    firebase_auth._token_cache.clear()
+    cached = timed(firebase_auth.verify_id_token_cached, tokens, args.requests)
+
+    print(f"{args.requests} verifications over {args.tokens} tokens")
+    print(f"  auth.verify_id_token:   {uncached:8.1f} µs/call")
+    print(f"  verify_id_token_cached: {cached:8.1f} µs/call ({uncached / cached:.0f}x)")
@@ -0,0 +1,84 @@
+"""
+Closed-loop HTTP load test: `--concurrency` clients send requests back to back
+for `--duration` seconds, then throughput and latency percentiles are printed.
+Run it against two builds of the API with the same data to compare them.
+
+    python -m scripts.load_test --base-url http://localhost:8000/api --token $ID_TOKEN \
+        --path /items/ --concurrency 50 --duration 30
+"""
+import os
+import time
+import asyncio
+import argparse
+from typing import Dict, List
+
+import httpx
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def worker(client: httpx.AsyncClient, paths: List[str], deadline: float, latencies: List[float], errors: Dict[str, int]):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                continue
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(base_url: str, token: str, paths: List[str], concurrency: int, duration: float, warmup: float) -> Dict:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        if warmup > 0:
+            deadline = time.perf_counter() + warmup
+            await asyncio.gather(*(worker(client, paths, deadline, [], {}) for _ in range(concurrency)))
+
+        latencies: List[float] = []
+        errors: Dict[str, int] = {}
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(worker(client, paths, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000/api")
+    parser.add_argument("--token", default=os.getenv("LOAD_TEST_TOKEN", ""), help="Firebase ID token (or LOAD_TEST_TOKEN)")
+    parser.add_argument("--path", action="append", dest="paths", help="GET path, repeatable (default /items/)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of unmeasured load first")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args.base_url, args.token, args.paths or ["/items/"], args.concurrency, args.duration, args.warmup))
+    print(
+        f"{stats['requests']} requests, {stats['rps']:.0f} req/s, "
+        f"p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms"
+    )
+    if stats["errors"]:
+        print(f"errors: {stats['errors']}")
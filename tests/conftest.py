@@ -0,0 +1,4 @@
+import os
+
+# app.database builds its engines on import; the tests bring their own async engine
+os.environ.setdefault("DATABASE_URL", "sqlite://")
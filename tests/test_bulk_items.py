@@ -0,0 +1,75 @@
+"""
+Request limits of the /clothing bulk endpoints (app/main.py). The checks run
+before any query, so no database is needed.
+
+    python -m pytest tests/test_bulk_items.py
+"""
+import os
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("torch")  # app.main mounts the try-on routes, which import torch
+
+# Checked on import by the OpenAI client and the try-on routes
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("REPLICATE_API_TOKEN", "test")
+
+from fastapi import HTTPException  # noqa: E402
+
+from app import firebase_auth, main  # noqa: E402
+from app.database import get_async_db  # noqa: E402
+from app.services.user_cache import UserSnapshot  # noqa: E402
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Send a request to the app signed in as user 1, without a database session"""
+    async def no_db():
+        yield None
+
+    monkeypatch.setitem(main.app.dependency_overrides, get_async_db, no_db)
+    monkeypatch.setitem(
+        main.app.dependency_overrides, firebase_auth.get_current_user_firebase,
+        lambda: UserSnapshot(id=1, firebase_uid="uid-1", email="1@example.com", is_premium=False)
+    )
+
+    def send(method: str, path: str, body):
+        async def request():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await http.request(method, path, json=body)
+
+        return asyncio.run(request())
+
+    return send
+
+
+def test_bulk_ids_must_be_present_and_bounded():
+    with pytest.raises(HTTPException) as empty:
+        main._check_bulk_ids([])
+    assert empty.value.status_code == 400
+
+    with pytest.raises(HTTPException) as too_many:
+        main._check_bulk_ids(list(range(main.BULK_MAX_ITEMS + 1)))
+    assert too_many.value.status_code == 400
+
+    main._check_bulk_ids(list(range(main.BULK_MAX_ITEMS)))
+
+
+def test_bulk_delete_rejects_oversized_batches(api):
+    response = api("POST", "/clothing/bulk-delete", list(range(main.BULK_MAX_ITEMS + 1)))
+    assert response.status_code == 400
+    assert str(main.BULK_MAX_ITEMS) in response.json()["detail"]
+
+
+def test_bulk_update_rejects_empty_changes(api):
+    response = api("PATCH", "/clothing/bulk-update", {"item_ids": [1, 2]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No fields to update"
+
+
+def test_bulk_update_rejects_oversized_batches(api):
+    response = api("PATCH", "/clothing/bulk-update", {"item_ids": list(range(main.BULK_MAX_ITEMS + 1)), "available": False})
+    assert response.status_code == 400
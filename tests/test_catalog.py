@@ -0,0 +1,67 @@
+"""Catalog index and its columnar store (app/services/catalog.py)"""
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from app.services import catalog  # noqa: E402
+
+ROWS = [
+    {"name": "Polo", "price": 41.99, "image_url": "https://img/1.jpg", "product_url": "https://p/1",
+     "gender": "Male", "piece_type": "top", "subtype": "polo shirt", "fit": "regular", "style": "casual",
+     "season": "summer", "main_color": "#000000", "palette_tags": "['cool', 'dark']"},
+    {"name": "Юбка миди", "price": 35.0, "image_url": "https://img/2.jpg", "product_url": "https://p/2",
+     "gender": "female", "piece_type": "bottom", "subtype": None, "fit": None, "style": "formal",
+     "season": None, "main_color": "#FFF", "palette_tags": None},
+    {"name": "Jeans", "price": 59.5, "image_url": "https://img/3.jpg", "product_url": "https://p/3",
+     "gender": "male", "piece_type": "bottom", "subtype": "jeans", "fit": "slim", "style": "casual",
+     "season": "all", "main_color": "not a colour", "palette_tags": "['light']"},
+]
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame(ROWS)
+
+
+def test_store_round_trips_items(frame, tmp_path):
+    version = catalog.write_store(frame, root=str(tmp_path))
+    stored = catalog.CatalogIndex.from_store(str(tmp_path / version))
+    in_memory = catalog.CatalogIndex.from_dataframe(frame)
+
+    assert isinstance(stored.items, catalog.StoredItems)
+    assert stored.size == in_memory.size == 3
+    assert stored.to_items(range(3)) == in_memory.to_items(range(3))
+    assert stored.item(1)["name"] == "Юбка миди"
+    assert stored.item(1)["subtype"] is None
+    assert stored.item(0)["price"] == 41.99
+
+
+def test_store_columns_are_memory_mapped(frame, tmp_path):
+    version = catalog.write_store(frame, root=str(tmp_path))
+    stored = catalog.CatalogIndex.from_store(str(tmp_path / version))
+    assert isinstance(stored.items.blob, np.memmap)
+    assert isinstance(stored.price, np.memmap)
+    assert (tmp_path / catalog.CURRENT_FILE).read_text() == version
+
+
+def test_empty_store_loads(tmp_path):
+    version = catalog.write_store(pd.DataFrame(columns=catalog.REQUIRED_COLUMNS), root=str(tmp_path))
+    stored = catalog.CatalogIndex.from_store(str(tmp_path / version))
+    assert stored.size == 0
+    assert stored.to_items(stored.rows()) == []
+
+
+def test_rows_filter_by_gender_alias_and_piece(frame):
+    index = catalog.CatalogIndex.from_dataframe(frame)
+    assert list(index.rows("men")) == [0, 2]
+    assert list(index.rows("women", "bottom")) == [1]
+    assert list(index.rows(None, "bottom")) == [1, 2]
+    assert list(index.rows("unknown-gender")) == [0, 1, 2]
+
+
+def test_colour_and_palette_columns(frame):
+    index = catalog.CatalogIndex.from_dataframe(frame)
+    assert list(index.has_color) == [True, True, False]
+    assert list(index.has_palette_tag(np.arange(3), "cool")) == [True, False, False]
+    assert list(index.matches("style", np.arange(3), ["Casual"])) == [True, False, True]
@@ -0,0 +1,175 @@
+"""
+/items keyset pagination and `fields=` (app/routes/items.py) and the bulk
+statements of app/crud_async.py, against an in-memory SQLite database.
+
+    python -m pytest tests/test_items.py
+"""
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("aiosqlite")
+pytest.importorskip("numpy")
+
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app import crud_async, firebase_auth, models, schemas  # noqa: E402
+from app.database import Base, get_async_db  # noqa: E402
+from app.routes import items  # noqa: E402
+from app.services import wardrobe_cache  # noqa: E402
+from app.services.user_cache import UserSnapshot  # noqa: E402
+
+OWNER, OTHER = 1, 2
+OWNER_IDS = list(range(1, 8))  # seeded first, so ids 1..7 belong to OWNER and 8..9 to OTHER
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    fake = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(wardrobe_cache, "_redis", fake)
+    return fake
+
+
+def run(test):
+    """Run `test(sessions)` against a fresh database holding two users and their items"""
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with sessions() as db:
+            db.add_all([
+                models.User(id=user_id, firebase_uid=f"uid-{user_id}", email=f"{user_id}@example.com")
+                for user_id in (OWNER, OTHER)
+            ])
+            db.add_all([
+                models.ClothingItem(owner_id=OWNER, name=f"Item {i}", category="Top" if i % 2 else "pants", color="black")
+                for i in OWNER_IDS
+            ])
+            db.add_all([models.ClothingItem(owner_id=OTHER, name="Theirs") for _ in range(2)])
+            await db.commit()
+        try:
+            return await test(sessions)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+def client(sessions) -> httpx.AsyncClient:
+    """The items router, signed in as OWNER"""
+    app = FastAPI()
+    app.include_router(items.router)
+
+    async def db():
+        async with sessions() as session:
+            yield session
+
+    app.dependency_overrides[get_async_db] = db
+    app.dependency_overrides[firebase_auth.get_current_user_firebase] = lambda: UserSnapshot(
+        id=OWNER, firebase_uid="uid-1", email="1@example.com", is_premium=False
+    )
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def read_all_pages(sessions, params: dict):
+    pages, cursor = [], None
+    async with client(sessions) as http:
+        while True:
+            response = await http.get("/items/", params={**params, **({"cursor": cursor} if cursor else {})})
+            assert response.status_code == 200
+            pages.append(response.json())
+            cursor = response.headers.get(items.NEXT_CURSOR_HEADER)
+            if cursor is None:
+                return pages
+
+
+def test_cursor_pages_cover_the_wardrobe_once():
+    pages = run(lambda sessions: read_all_pages(sessions, {"limit": 3}))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [item["id"] for page in pages for item in page] == OWNER_IDS
+
+
+def test_full_last_page_has_no_cursor():
+    pages = run(lambda sessions: read_all_pages(sessions, {"limit": len(OWNER_IDS)}))
+    assert len(pages) == 1
+    assert len(pages[0]) == len(OWNER_IDS)
+
+
+def test_fields_returns_only_requested_columns():
+    pages = run(lambda sessions: read_all_pages(sessions, {"limit": 4, "fields": "name,color"}))
+    rows = [row for page in pages for row in page]
+    assert [row["id"] for row in rows] == OWNER_IDS
+    assert all(set(row) == {"id", "name", "color"} for row in rows)
+
+
+def test_unknown_fields_are_rejected():
+    async def test(sessions):
+        async with client(sessions) as http:
+            return await http.get("/items/", params={"fields": "name,embedding,idempotency_key"})
+
+    response = run(test)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: embedding, idempotency_key"
+
+
+def test_offset_paging_and_category_filter():
+    async def test(sessions):
+        async with sessions() as db:
+            skipped = await crud_async.get_clothing_items_page(db, OWNER, limit=10, skip=5)
+            tops = await crud_async.get_clothing_items_page(db, OWNER, limit=10, category="TOP")
+            after = await crud_async.get_clothing_items_page(db, OWNER, limit=10, after_id=5, skip=5)
+        return [item.id for item in skipped], [item.id for item in tops], [item.id for item in after]
+
+    skipped, tops, after = run(test)
+    assert skipped == [6, 7]
+    assert tops == [1, 3, 5, 7]
+    assert after == [6, 7]  # a cursor overrides the legacy offset
+
+
+def test_bulk_update_only_touches_the_owners_items():
+    async def test(sessions):
+        async with sessions() as db:
+            updated = await crud_async.bulk_update_clothing_items(db, OWNER, [1, 2, 8], {"available": False})
+            rows = (await db.execute(select(models.ClothingItem.id, models.ClothingItem.available))).all()
+        return updated, dict(rows)
+
+    updated, available = run(test)
+    assert sorted(updated) == [1, 2]
+    assert available[1] is False and available[2] is False
+    assert available[8] is True
+
+
+def test_bulk_delete_only_removes_the_owners_items():
+    async def test(sessions):
+        async with sessions() as db:
+            deleted = await crud_async.bulk_delete_clothing_items(db, OWNER, [1, 3, 9])
+            remaining = (await db.execute(select(models.ClothingItem.id))).scalars().all()
+        return deleted, remaining
+
+    deleted, remaining = run(test)
+    assert sorted(row.id for row in deleted) == [1, 3]
+    assert 9 in remaining and 1 not in remaining
+
+
+def test_writes_replace_the_wardrobe_version():
+    async def test(sessions):
+        versions = [await wardrobe_cache.get_version(OWNER)]
+        async with sessions() as db:
+            await crud_async.create_clothing_item(db, schemas.ClothingItemCreate(name="Scarf"), OWNER)
+            versions.append(await wardrobe_cache.get_version(OWNER))
+            await crud_async.bulk_update_clothing_items(db, OWNER, [8, 9], {"available": False})
+            versions.append(await wardrobe_cache.get_version(OWNER))
+            await crud_async.bulk_delete_clothing_items(db, OWNER, [2])
+            versions.append(await wardrobe_cache.get_version(OWNER))
+        return versions
+
+    initial, created, foreign_update, deleted = run(test)
+    assert initial != created
+    assert foreign_update == created  # nothing of OWNER's changed
+    assert deleted != created
@@ -0,0 +1,101 @@
+"""
+Local outfit assembly (app/services/outfit_engine.py).
+
+    python -m pytest tests/test_outfit_engine.py
+"""
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.schemas import ClothingItem  # noqa: E402
+from app.services import outfit_engine  # noqa: E402
+from app.services.outfit_engine import OutfitContext  # noqa: E402
+
+
+def item(item_id: int, category: str, color: str = None, **fields) -> ClothingItem:
+    return ClothingItem(id=item_id, owner_id=1, name=f"{category} {item_id}", category=category, color=color, **fields)
+
+
+@pytest.mark.parametrize("category, slot", [
+    ("T-Shirt", "top"),
+    ("Winter Coats", "top"),
+    ("jeans", "bottom"),
+    ("Running Sneakers", "shoes"),
+    ("beanie", "hat"),
+    ("Leather belt", "accessories"),
+    ("Pajamas", None),
+    (None, None),
+])
+def test_slot_of(category, slot):
+    assert outfit_engine.slot_of(category) == slot
+
+
+def test_temperature_band_and_weather_tags():
+    assert outfit_engine.temperature_band(None) is None
+    assert outfit_engine.temperature_band(-3) == "very cold"
+    assert outfit_engine.temperature_band(15) == "mild"
+    assert outfit_engine.get_weather_tags("warm", "light rain") == ["summer", "warm", "hot", "rain"]
+    assert outfit_engine.get_weather_tags(None, "clear") == []
+
+
+def test_color_harmony():
+    assert outfit_engine.color_harmony("black", "red") == 1.0  # neutral
+    assert outfit_engine.color_harmony("unknown", "red") == 0.5
+    assert outfit_engine.color_harmony("#ff0000", "#ff2000") == 0.8  # analogous
+    assert outfit_engine.color_harmony("#ff0000", "#00ffff") == 0.7  # complementary
+
+
+def test_item_score_rewards_occasion_weather_and_temperature():
+    context = OutfitContext(occasion="Work", temperature=-5, conditions="snow")
+    coat = item(1, "coat", occasions=["work"], weather_suitability=["winter", "snow"])
+    shorts = item(2, "shorts", occasions=["beach"], weather_suitability=["summer"])
+    assert outfit_engine.item_score(coat, context) > 0 > outfit_engine.item_score(shorts, context)
+
+
+def test_unavailable_and_unslotted_items_are_skipped():
+    slots = outfit_engine.slot_candidates([item(1, "shirt", available=False), item(2, "pajamas")], OutfitContext())
+    assert all(not candidates for candidates in slots.values())
+
+
+def test_assemble_picks_the_best_item_per_slot():
+    context = OutfitContext(occasion="work", temperature=20)
+    wardrobe = [
+        item(1, "shirt", "white", occasions=["work"]),
+        item(2, "t-shirt", "white", occasions=["beach"]),
+        item(3, "trousers", "navy", occasions=["work"]),
+        item(4, "shorts", "navy", occasions=["beach"]),
+        item(5, "loafers", "black", occasions=["work"]),
+        item(6, "sandals", "black", occasions=["beach"]),
+        item(7, "watch", "black"),
+    ]
+    outfits = outfit_engine.assemble_outfits(wardrobe, context, n=3)
+
+    best = outfits[0]
+    assert (best.top.id, best.bottom.id, best.shoes.id) == (1, 3, 5)
+    assert [accessory.id for accessory in best.accessories] == [7]
+    assert best.hat is None  # no hat for a mild day without a fitting one
+    assert outfits == sorted(outfits, key=lambda outfit: -outfit.score)
+    # Alternatives never repeat a top/bottom pair
+    pairs = [(outfit.top.id, outfit.bottom.id) for outfit in outfits]
+    assert len(pairs) == len(set(pairs)) == 3
+
+
+def test_assemble_is_stable_on_ties():
+    wardrobe = [item(2, "shirt"), item(1, "shirt"), item(3, "jeans"), item(4, "boots")]
+    first = outfit_engine.assemble_outfits(wardrobe, OutfitContext(), n=1)[0]
+    assert first.top.id == 1
+    assert outfit_engine.assemble_outfits(list(reversed(wardrobe)), OutfitContext(), n=1)[0].top.id == 1
+
+
+def test_assemble_with_missing_slots():
+    outfits = outfit_engine.assemble_outfits([item(1, "shirt")], OutfitContext(), n=3)
+    assert len(outfits) == 1
+    assert outfits[0].items == [outfits[0].top]
+    assert outfit_engine.assemble_outfits([], OutfitContext()) == [outfit_engine.ScoredOutfit()]
+
+
+def test_describe_outfit():
+    outfit = outfit_engine.ScoredOutfit(top=item(1, "shirt"), bottom=item(2, "jeans"), shoes=item(3, "boots"))
+    tip = outfit_engine.describe_outfit(outfit, OutfitContext(temperature=2, conditions="rain"))
+    assert tip == "Pair shirt 1, jeans 2 and boots 3; layer up and keep the extremities warm, and take something water-resistant."
+    assert outfit_engine.describe_outfit(outfit_engine.ScoredOutfit(), OutfitContext()).startswith("Add a few basics")
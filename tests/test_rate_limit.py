@@ -0,0 +1,91 @@
+"""
+Token buckets of app/services/rate_limit.py, with the Lua scripts running in
+fakeredis.
+
+    python -m pytest tests/test_rate_limit.py
+"""
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from app.services import rate_limit  # noqa: E402
+
+# Slow enough that the refill between two calls of a test is negligible
+SLOW_RATE = 0.06  # per minute
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    fake = fakeredis.FakeRedis()
+    monkeypatch.setattr(rate_limit, "r", fake)
+    monkeypatch.setattr(rate_limit, "_token_bucket", fake.register_script(rate_limit._TOKEN_BUCKET_SCRIPT))
+    monkeypatch.setattr(rate_limit, "_refund", fake.register_script(rate_limit._REFUND_SCRIPT))
+    monkeypatch.setattr(rate_limit, "GEMINI_RATE_PER_MINUTE", SLOW_RATE)
+    monkeypatch.setattr(rate_limit, "GEMINI_BURST", 5)
+    monkeypatch.setattr(rate_limit, "GEMINI_INTERACTIVE_RESERVE", 2)
+    monkeypatch.setattr(rate_limit, "USER_BULK_RATE_PER_MINUTE", SLOW_RATE)
+    monkeypatch.setattr(rate_limit, "USER_BULK_BURST", 2)
+    return fake
+
+
+def tokens(fake, key: str) -> float:
+    return float(fake.hget(key, "tokens"))
+
+
+def test_burst_then_wait():
+    granted = [rate_limit.acquire("bucket", SLOW_RATE, 3) for _ in range(3)]
+    assert granted == [0, 0, 0]
+    wait = rate_limit.acquire("bucket", SLOW_RATE, 3)
+    # One token at 0.001 tokens/s
+    assert wait == pytest.approx(1000, rel=0.01)
+
+
+def test_bulk_leaves_the_interactive_reserve(fake_redis):
+    bulk = [rate_limit.acquire_provider_slot(rate_limit.BULK) for _ in range(4)]
+    assert bulk[:3] == [0, 0, 0] and bulk[3] > 0
+    assert rate_limit.acquire_provider_slot(rate_limit.INTERACTIVE) == 0
+    assert rate_limit.acquire_provider_slot(rate_limit.INTERACTIVE) == 0
+    assert rate_limit.acquire_provider_slot(rate_limit.INTERACTIVE) > 0
+
+
+def test_refund_never_exceeds_capacity(fake_redis):
+    rate_limit.acquire("bucket", SLOW_RATE, 3)
+    rate_limit.refund("bucket", 3, cost=5)
+    assert tokens(fake_redis, "bucket") == pytest.approx(3)
+    rate_limit.refund("missing", 3)
+    assert not fake_redis.exists("missing")
+
+
+def test_user_bucket_limits_bulk_uploads(fake_redis):
+    assert rate_limit.acquire_bulk_slot(1) == 0
+    assert rate_limit.acquire_bulk_slot(1) == 0
+    assert rate_limit.acquire_bulk_slot(1) > 0
+    # Another user has their own budget
+    assert rate_limit.acquire_bulk_slot(2) == 0
+
+
+def test_throttled_provider_gives_the_user_token_back(fake_redis):
+    for _ in range(3):
+        rate_limit.acquire_provider_slot(rate_limit.BULK)
+    user_key = rate_limit._user_bulk_key(1)
+
+    assert rate_limit.acquire_bulk_slot(1) > 0
+    assert tokens(fake_redis, user_key) == pytest.approx(2, abs=0.01)
+
+
+def test_refund_bulk_slot_restores_both_buckets(fake_redis):
+    assert rate_limit.acquire_bulk_slot(1) == 0
+    rate_limit.refund_bulk_slot(1)
+    assert tokens(fake_redis, rate_limit._user_bulk_key(1)) == pytest.approx(2, abs=0.01)
+    assert tokens(fake_redis, rate_limit._PROVIDER_KEY) == pytest.approx(5, abs=0.01)
+
+
+def test_fails_open_without_redis(monkeypatch):
+    def unavailable(**kwargs):
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(rate_limit, "_token_bucket", unavailable)
+    monkeypatch.setattr(rate_limit, "_refund", unavailable)
+    assert rate_limit.acquire_bulk_slot(1) == 0
+    rate_limit.refund_bulk_slot(1)
@@ -0,0 +1,26 @@
+"""Request schemas of the clothing item endpoints (app/schemas.py)"""
+import pytest
+
+pytest.importorskip("pydantic")
+
+from pydantic import ValidationError  # noqa: E402
+
+from app import schemas  # noqa: E402
+
+
+@pytest.mark.parametrize("field", ["name", "store_name", "tags", "occasions", "weather_suitability"])
+def test_patch_rejects_null_for_required_fields(field):
+    with pytest.raises(ValidationError, match=f"{field} cannot be null"):
+        schemas.ClothingItemUpdate(**{field: None})
+
+
+def test_patch_keeps_only_sent_fields():
+    update = schemas.ClothingItemUpdate(name="Coat", brand=None)
+    assert update.dict(exclude_unset=True) == {"name": "Coat", "brand": None}
+
+
+def test_bulk_update_rejects_null_tag_lists():
+    with pytest.raises(ValidationError, match="tags cannot be null"):
+        schemas.ClothingItemBulkUpdate(item_ids=[1], tags=None)
+    changes = schemas.ClothingItemBulkUpdate(item_ids=[1], category=None)
+    assert changes.dict(exclude_unset=True, exclude={"item_ids"}) == {"category": None}
@@ -0,0 +1,77 @@
+"""
+Wardrobe helpers of /stylist/suggest-outfit (app/routes/stylist.py).
+
+    python -m pytest tests/test_stylist.py
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("google.generativeai")
+
+from app.routes import stylist  # noqa: E402
+from app.schemas import ClothingItem  # noqa: E402
+from app.services import wardrobe_cache  # noqa: E402
+
+
+def item(item_id: int, category: str, **fields) -> ClothingItem:
+    return ClothingItem(id=item_id, owner_id=1, name=f"{category} {item_id}", category=category, **fields)
+
+
+WARDROBE = [
+    item(1, "shirt", occasions=["work"], weather_suitability=["mild"]),
+    item(2, "jeans", occasions=["casual"], weather_suitability=["mild", "cold"]),
+    item(3, "sneakers", occasions=["casual", "work"]),
+    item(4, "cap", occasions=["casual"], weather_suitability=["warm"]),
+    item(5, "pajamas"),
+]
+
+
+@pytest.fixture
+def index():
+    return stylist.WardrobeIndex(WARDROBE)
+
+
+@pytest.mark.parametrize("item_id, slot, expected", [
+    (1, "top", 1),
+    ("2", "bottom", 2),  # the model may answer with a string id
+    (1, "bottom", None),  # item from another slot
+    (5, "top", None),  # not slottable
+    (99, "top", None),  # not in the wardrobe
+    ("abc", "top", None),
+    (None, "hat", None),
+])
+def test_resolve(index, item_id, slot, expected):
+    resolved = index.resolve(item_id, slot)
+    assert (resolved.id if resolved else None) == expected
+
+
+def test_index_groups_items_by_slot(index):
+    assert [item.id for item in index.by_slot["top"]] == [1]
+    assert [item.id for item in index.by_slot["hat"]] == [4]
+    assert 5 not in index.slot_by_id
+
+
+def test_filter_matching_items():
+    assert [item.id for item in stylist.filter_matching_items(WARDROBE, ["work"], None)] == [1, 3]
+    assert [item.id for item in stylist.filter_matching_items(WARDROBE, ["casual"], ["cold", "warm"])] == [2, 4]
+    assert stylist.filter_matching_items(WARDROBE, None, []) == WARDROBE
+
+
+def test_covers_basic_outfit():
+    assert stylist.covers_basic_outfit(WARDROBE)
+    assert not stylist.covers_basic_outfit(WARDROBE[:2])
+
+
+def test_compose_outfit_uses_a_cached_snapshot_without_the_database(monkeypatch):
+    monkeypatch.setattr(wardrobe_cache, "_local", wardrobe_cache.TTLCache(maxsize=10, ttl=60))
+    snapshot = wardrobe_cache.WardrobeSnapshot(owner_id=1, version="v1", items=WARDROBE)
+    wardrobe_cache._local.set((1, "v1"), snapshot)
+
+    response = asyncio.run(stylist.compose_outfit(
+        None, 1, "work", "casual", "engine", False, 18.0, "clear", "18°C, clear", wardrobe_version="v1"
+    ))
+    # The work/mild subset lacks a bottom, so the whole wardrobe is used
+    assert response.available_items == [item.name for item in WARDROBE]
+    assert (response.outfit.top.id, response.outfit.bottom.id, response.outfit.shoes.id) == (1, 2, 3)
@@ -0,0 +1,101 @@
+"""
+Idempotent claim of bulk-upload images (app/services/task_idempotency.py) and
+the order in which process_single_image_task claims an image and takes a
+rate-limit slot (app/tasks.py), on fakeredis.
+
+    python -m pytest tests/test_task_idempotency.py
+"""
+import base64
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.services import task_idempotency  # noqa: E402
+
+KEY = task_idempotency.build_key("batch-1", 0, task_idempotency.content_hash(b"image"))
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    fake = fakeredis.FakeRedis()
+    monkeypatch.setattr(task_idempotency, "r", fake)
+    return fake
+
+
+def test_only_one_delivery_holds_the_claim(fake_redis):
+    assert task_idempotency.claim(KEY)
+    assert not task_idempotency.claim(KEY)
+    assert 0 < fake_redis.ttl(task_idempotency._lock_key(KEY)) <= task_idempotency.IDEMPOTENCY_LOCK_TTL
+
+
+def test_release_lets_a_retry_claim_again():
+    assert task_idempotency.claim(KEY)
+    task_idempotency.release(KEY)
+    assert task_idempotency.claim(KEY)
+
+
+def test_stored_result_short_circuits_and_drops_the_claim(fake_redis):
+    assert task_idempotency.claim(KEY)
+    task_idempotency.store_result(KEY, {"status": "success", "clothing_item_id": 7})
+    assert task_idempotency.get_result(KEY) == {"status": "success", "clothing_item_id": 7}
+    assert not fake_redis.exists(task_idempotency._lock_key(KEY))
+
+
+def test_claim_fails_open_without_redis(monkeypatch):
+    class Down:
+        def set(self, *args, **kwargs):
+            raise ConnectionError("redis is down")
+
+        def get(self, *args, **kwargs):
+            raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(task_idempotency, "r", Down())
+    assert task_idempotency.claim(KEY)
+    assert task_idempotency.get_result(KEY) is None
+
+
+class TestProcessSingleImage:
+    """The claim comes first; only its holder spends rate-limit tokens"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, monkeypatch):
+        celery = pytest.importorskip("celery")
+        pytest.importorskip("google.generativeai")
+        from app import tasks
+
+        self.tasks = tasks
+        self.retry = celery.exceptions.Retry
+        self.slots = []
+        self.statuses = []
+        self.wait = 0.0
+
+        def acquire_bulk_slot(user_id):
+            self.slots.append(user_id)
+            return self.wait
+
+        monkeypatch.setattr(tasks.rate_limit, "acquire_bulk_slot", acquire_bulk_slot)
+        monkeypatch.setattr(tasks, "update_batch_status", lambda key, success, error: self.statuses.append((success, error)))
+
+    def run_task(self):
+        image = {"filename": "shirt.jpg", "content_type": "image/jpeg", "file_data": base64.b64encode(b"image").decode()}
+        return self.tasks.process_single_image_task(image, 1, "batch-1", 0)
+
+    def test_previous_result_is_returned_without_a_slot(self):
+        task_idempotency.store_result(KEY, {"status": "success", "clothing_item_id": 7})
+        assert self.run_task() == {"status": "success", "clothing_item_id": 7}
+        assert self.slots == []
+        assert self.statuses == [({"status": "success", "clothing_item_id": 7}, None)]
+
+    def test_concurrent_delivery_retries_without_a_slot(self):
+        assert task_idempotency.claim(KEY)
+        with pytest.raises(self.retry):
+            self.run_task()
+        assert self.slots == []
+
+    def test_throttled_delivery_releases_its_claim(self):
+        self.wait = 5.0
+        with pytest.raises(self.retry):
+            self.run_task()
+        assert self.slots == [1]
+        assert task_idempotency.claim(KEY)
@@ -0,0 +1,92 @@
+"""
+Forecast columns and their per-day aggregation (app/services/weather.py).
+
+    python -m pytest tests/test_weather.py
+"""
+import calendar
+import datetime
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("redis")
+pytest.importorskip("requests")
+
+from app.services import weather  # noqa: E402
+
+TIMEZONE = 5 * 3600  # UTC+5
+# 3-hour slots from 15:00 local on March 1st: three on the 1st, eight on the 2nd
+FIRST_SLOT = calendar.timegm(datetime.datetime(2024, 3, 1, 15).timetuple()) - TIMEZONE
+TEMPERATURES = [10.0, 12.0, 8.0, 1.0, 0.0, 2.0, 6.0, 9.0, 7.0, 4.0, 3.0]
+CONDITIONS = ["Rain", "Rain", "Clouds", "Clear", "Clear", "Clear", "Clouds", "Clouds", "Clear", "Clear", "Snow"]
+
+
+def owm_response() -> dict:
+    """OpenWeatherMap forecast payload, slots deliberately out of order"""
+    slots = [
+        {
+            "dt": FIRST_SLOT + i * 3 * 3600,
+            "main": {"temp": temperature, "feels_like": temperature - 2, "humidity": 50 + i, "pressure": 1010},
+            "wind": {"speed": 2.0},
+            "weather": [{"main": condition, "description": condition.lower()}],
+        }
+        for i, (temperature, condition) in enumerate(zip(TEMPERATURES, CONDITIONS))
+    ]
+    return {"list": slots[::-1], "city": {"name": "Almaty", "country": "KZ", "timezone": TIMEZONE}}
+
+
+@pytest.fixture
+def raw():
+    return weather.parse_forecast(owm_response(), 43.25, 76.95)
+
+
+def test_days_follow_local_time(raw):
+    forecast = weather.aggregate_forecast(raw, days=5)
+    days = forecast["daily_forecasts"]
+
+    assert forecast["forecast_days"] == 2
+    assert [day["date"] for day in days] == ["2024-03-01", "2024-03-02"]
+    assert [len(day["hourly_data"]) for day in days] == [3, 8]
+    assert days[0]["hourly_data"][0]["time"] == "15:00"
+    assert days[1]["hourly_data"][0]["time"] == "00:00"
+    assert days[0]["date_formatted"] == "Friday, March 01"
+
+
+def test_daily_aggregates(raw):
+    first, second = weather.aggregate_forecast(raw)["daily_forecasts"]
+
+    assert (first["temperature_min"], first["temperature_max"], first["temperature_avg"]) == (8, 12, 10)
+    assert (second["temperature_min"], second["temperature_max"], second["temperature_avg"]) == (0, 9, 4)
+    assert first["condition"] == "Rain"
+    assert second["condition"] == "Clear"
+    assert first["humidity_avg"] == 51
+    assert second["wind_speed_avg"] == 2.0
+
+
+def test_days_limit_truncates(raw):
+    forecast = weather.aggregate_forecast(raw, days=1)
+    assert forecast["forecast_days"] == 1
+    assert len(forecast["daily_forecasts"][0]["hourly_data"]) == 3
+
+
+def test_empty_forecast(raw):
+    empty = {**raw, **{column: [] for column in ("dt", "temperature", "feels_like", "humidity", "pressure",
+                                                  "wind_speed", "condition", "description")}}
+    forecast = weather.aggregate_forecast(empty)
+    assert forecast["forecast_days"] == 0
+    assert forecast["daily_forecasts"] == []
+
+
+def test_current_from_closest_slot(raw, monkeypatch):
+    monkeypatch.setattr(weather.time, "time", lambda: FIRST_SLOT + 4 * 3 * 3600 + 1000)
+    current = weather.current_from_forecast(raw)
+    assert current["temperature"] == 0.0
+    assert current["feels_like"] == -2.0
+    assert current["condition"] == "Clear"
+    assert current["city"] == "Almaty"
+
+
+def test_no_current_outside_the_window(raw, monkeypatch):
+    monkeypatch.setattr(weather.time, "time", lambda: FIRST_SLOT - weather.CURRENT_FROM_FORECAST_WINDOW - 1)
+    assert weather.current_from_forecast(raw) is None
+    assert weather.current_from_forecast({**raw, "dt": []}) is None
@@ -0,0 +1,213 @@
+"""
+services/weather_async.py against a fake OpenWeatherMap (httpx.MockTransport)
+and an in-memory Redis.
+
+    python -m pytest tests/test_weather_async.py
+"""
+import json
+import time
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("redis")
+pytest.importorskip("numpy")
+pytest.importorskip("requests")
+
+from app.services import weather, weather_async  # noqa: E402
+
+CURRENT = {
+    "main": {"temp": 12.5, "feels_like": 11.0, "humidity": 40, "pressure": 1012},
+    "weather": [{"main": "Clear", "description": "clear sky"}],
+    "wind": {"speed": 3.0},
+    "name": "Almaty",
+    "sys": {"country": "KZ"},
+}
+
+
+class FakeRedis:
+    """The few commands weather_async uses, kept in a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def release(self, keys, args):
+        if self.data.get(keys[0]) == args[0]:
+            del self.data[keys[0]]
+            return 1
+        return 0
+
+
+class Upstream:
+    """Fake OpenWeatherMap answering with the queued status codes, then 200"""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status != 200:
+            return httpx.Response(status, json={"message": "unavailable"})
+        return httpx.Response(200, json=CURRENT)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(weather_async, "redis_client", fake)
+    monkeypatch.setattr(weather_async, "_release_script", fake.release)
+    return fake
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays requested by _upstream_get, without actually sleeping"""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(weather_async.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(weather_async.random, "random", lambda: 0.0)
+    return delays
+
+
+@pytest.fixture(autouse=True)
+def setup(monkeypatch):
+    monkeypatch.setattr(weather, "WEATHER_API_KEY", "test-key")
+    monkeypatch.setattr(weather_async, "WEATHER_RETRIES", 2)
+    monkeypatch.setattr(weather_async, "WEATHER_BACKOFF", 0.25)
+    monkeypatch.setattr(weather_async, "breaker", weather_async.CircuitBreaker(threshold=2, cooldown=30))
+
+
+def run(upstream, coro_fn):
+    async def main():
+        weather_async._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        try:
+            result = await coro_fn()
+            if weather_async._refreshes:
+                await asyncio.gather(*weather_async._refreshes)
+            return result
+        finally:
+            await weather_async.close()
+
+    return asyncio.run(main())
+
+
+def stale_entry(fake, lat, lon, data):
+    lat, lon = weather.snap_coordinates(lat, lon)
+    entry = {"data": data, "fetched_at": time.time() - weather.WEATHER_FRESH_TTL - 60}
+    fake.data[weather.get_weather_cache_key(lat, lon)] = json.dumps(entry)
+
+
+def test_transient_errors_are_retried_with_backoff(fake_redis, sleeps):
+    upstream = Upstream(503, 429)
+    data = run(upstream, lambda: weather_async.weather_by_coordinates(43.22, 76.85))
+
+    assert data["temperature"] == 12.5
+    assert upstream.calls == 3
+    assert sleeps == [0.25, 0.5]
+    assert weather_async.breaker.failures == 0
+
+
+def test_client_errors_are_not_retried(fake_redis, sleeps):
+    upstream = Upstream(401)
+    assert run(upstream, lambda: weather_async.weather_by_coordinates(43.22, 76.85)) is None
+    assert upstream.calls == 1
+    assert sleeps == []
+
+
+def test_exhausted_retries_count_as_one_breaker_failure(fake_redis, sleeps):
+    upstream = Upstream(500, 500, 500)
+    with pytest.raises(weather_async.UpstreamError):
+        run(upstream, lambda: weather_async._upstream_get(weather.CURRENT_WEATHER_URL, {}))
+    assert upstream.calls == 3
+    assert weather_async.breaker.failures == 1
+    assert weather_async.breaker.opened_at is None
+
+
+def test_breaker_opens_half_opens_and_closes(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(weather_async.time, "monotonic", lambda: now[0])
+    breaker = weather_async.CircuitBreaker(threshold=2, cooldown=30)
+
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()  # open
+
+    now[0] += 31
+    assert breaker.allow()  # half-open: one trial call
+    assert not breaker.allow()
+    breaker.failure()  # the trial failed, open again
+    assert not breaker.allow()
+
+    now[0] += 31
+    assert breaker.allow()
+    breaker.success()  # the trial succeeded, closed
+    assert breaker.allow() and breaker.allow()
+    assert breaker.failures == 0
+
+
+def test_open_breaker_skips_upstream(fake_redis, sleeps):
+    weather_async.breaker.failure()
+    weather_async.breaker.failure()
+    upstream = Upstream()
+    assert run(upstream, lambda: weather_async.weather_by_coordinates(43.22, 76.85)) is None
+    assert upstream.calls == 0
+
+
+def test_stale_entry_served_while_breaker_open(fake_redis, sleeps):
+    stale = {"temperature": -3.0, "city": "Almaty"}
+    stale_entry(fake_redis, 43.22, 76.85, stale)
+    weather_async.breaker.failure()
+    weather_async.breaker.failure()
+    upstream = Upstream()
+
+    assert run(upstream, lambda: weather_async.weather_by_coordinates(43.22, 76.85)) == stale
+    assert upstream.calls == 0
+    # The failed background refresh released its lock and kept the entry
+    assert not [key for key in fake_redis.data if key.startswith("lock:")]
+    assert len(fake_redis.data) == 1
+
+
+def test_stale_entry_refreshed_in_background(fake_redis, sleeps):
+    stale_entry(fake_redis, 43.22, 76.85, {"temperature": -3.0})
+    upstream = Upstream()
+
+    assert run(upstream, lambda: weather_async.weather_by_coordinates(43.22, 76.85)) == {"temperature": -3.0}
+    assert upstream.calls == 1
+    assert run(upstream, lambda: weather_async.weather_by_coordinates(43.22, 76.85))["temperature"] == 12.5
+
+
+def test_cached_entry_served_without_api_key(fake_redis, sleeps, monkeypatch):
+    monkeypatch.setattr(weather, "WEATHER_API_KEY", None)
+    stale_entry(fake_redis, 43.22, 76.85, {"temperature": -3.0})
+    upstream = Upstream()
+
+    assert run(upstream, lambda: weather_async.weather_by_coordinates(43.22, 76.85)) == {"temperature": -3.0}
+    assert upstream.calls == 0
+
+
+def test_lock_outlives_a_fill_with_retries():
+    attempts = (weather.WEATHER_RETRIES + 1) * (weather.WEATHER_CONNECT_TIMEOUT + weather.WEATHER_TIMEOUT)
+    assert weather.WEATHER_LOCK_TTL > attempts
+    assert weather.WEATHER_LOCK_WAIT >= weather.WEATHER_FETCH_BUDGET